@@ -1,6 +1,11 @@
 import streamlit as st
 from documentos import DocumentUploader
 from busqueda import ClaudeAPI
+from examen import GeneradorExamen
+from metricas import METRICAS, servir_desde_entorno
+
+# Endpoint de métricas si METRICAS_PUERTO está definido (una vez por proceso)
+servir_desde_entorno()
 
 # Configurar la página
 st.set_page_config(page_title="Generador de Exámenes con IA", page_icon="📝", layout="wide")
@@ -73,8 +78,36 @@ st.markdown(
 )
 
 # ========== Instancias ==========
-doc_uploader = DocumentUploader()
-claude_api = ClaudeAPI()
+# Se guardan en la sesión para que sobrevivan a los reruns de Streamlit:
+# los documentos ya extraídos y el índice FAISS no se vuelven a construir.
+# El cliente de Bedrock se comparte entre sesiones (ver recursos.py).
+if "doc_uploader" not in st.session_state:
+    st.session_state["doc_uploader"] = DocumentUploader()
+    st.session_state["claude_api"] = ClaudeAPI()
+doc_uploader = st.session_state["doc_uploader"]
+claude_api = st.session_state["claude_api"]
+
+# ========== Funciones auxiliares ==========
+def mostrar_pregunta(i, question, answer, tipo_preguntas):
+    st.write(f"**Pregunta {i + 1}:** {question}")
+    # Dependiendo del tipo de pregunta, mostramos la respuesta de forma distinta
+    if tipo_preguntas == "Desarrollo":
+        # Mostrar respuesta larga
+        st.write(f"**Respuesta (Desarrollo):** {answer}")
+
+    elif tipo_preguntas == "Verdadero/Falso":
+        # Insertar un radio button para que el usuario elija
+        seleccion = st.radio(
+            "¿Verdadero o Falso?",
+            ["Verdadero", "Falso"],
+            key=f"vf_{i}"
+        )
+        if seleccion:
+            st.success(f"**Respuesta Correcta:** {answer}")
+
+    elif tipo_preguntas == "Preguntas Cortas":
+        # Mostrar respuesta breve
+        st.write(f"**Respuesta (Corta):** {answer}")
 
 # ========== Layout en tres columnas ==========
 col1, col2, col3 = st.columns([1.2, 2, 1.2])
@@ -105,19 +138,26 @@ with col2:
         accept_multiple_files=True,
         type=['pdf', 'txt', 'docx', 'pptx']
     )
+    # Sincronizamos con los archivos subidos; solo se extraen los nuevos (en paralelo)
+    resultados_carga = doc_uploader.sincronizar(uploaded_files or [])
     if uploaded_files:
-        for file in uploaded_files:
-            try:
-                doc_uploader.add_document(file)
+        for nombre, error in resultados_carga:
+            if error is None:
                 st.markdown(
-                    f'<div class="success">✅ {file.name} cargado correctamente.</div>',
+                    f'<div class="success">✅ {nombre} cargado correctamente.</div>',
                     unsafe_allow_html=True
                 )
-            except Exception as e:
+            else:
                 st.markdown(
-                    f'<div class="error">❌ Error al procesar {file.name}: {e}</div>',
+                    f'<div class="error">❌ Error al procesar {nombre}: {error}</div>',
                     unsafe_allow_html=True
                 )
+        if doc_uploader.cache is not None:
+            stats = doc_uploader.cache.estadisticas()
+            st.caption(
+                f"Caché de extracción: {stats['hits']} archivos sin volver a procesar "
+                f"({stats['segundos_ahorrados']:.1f} s ahorrados)."
+            )
 
     # Botón para generar preguntas
     if st.button("🚀 Generar Preguntas"):
@@ -145,42 +185,55 @@ with col2:
             st.info(f"Generando preguntas de tipo '{tipo_preguntas}' sobre '{prompt_tema}'...")
 
             try:
-                # Generar preguntas y respuestas con Claude
-                questions, answers = claude_api.generar_preguntas(
-                    full_text,
-                    prompt_tema,
-                    tipo_preguntas.lower()  # "desarrollo", "verdadero/falso" o "preguntas cortas"
+                argumentos = dict(
+                    full_text=full_text,
+                    tema=prompt_tema,
+                    tipo=tipo_preguntas.lower(),  # "desarrollo", "verdadero/falso" o "preguntas cortas"
+                    documentos=doc_uploader.get_documents_info(),
+                    # Con "Temas concretos" buscamos en el índice los chunks del tema
+                    consulta=tema_concreto if ambito_preguntas == "Temas concretos" else None,
+                    # Servir preguntas ya generadas para la misma petición o pedir otras nuevas
+                    usar_cache=st.session_state.get("usar_cache", True)
                 )
 
-                if questions:
-                    st.subheader("📋 Preguntas Generadas")
-
-                    for i, question in enumerate(questions):
-                        st.write(f"**Pregunta {i + 1}:** {question}")
-                        # Dependiendo del tipo de pregunta, mostramos la respuesta de forma distinta
-                        if tipo_preguntas == "Desarrollo":
-                            # Mostrar respuesta larga
-                            st.write(f"**Respuesta (Desarrollo):** {answers[i]}")
-
-                        elif tipo_preguntas == "Verdadero/Falso":
-                            # Insertar un radio button para que el usuario elija
-                            seleccion = st.radio(
-                                "¿Verdadero o Falso?",
-                                ["Verdadero", "Falso"],
-                                key=f"vf_{i}"
-                            )
-                            if seleccion:
-                                st.success(f"**Respuesta Correcta:** {answers[i]}")
-
-                        elif tipo_preguntas == "Preguntas Cortas":
-                            # Mostrar respuesta breve
-                            st.write(f"**Respuesta (Corta):** {answers[i]}")
-
+                questions = []
+                if st.session_state.get("streaming", True):
+                    # Cada pregunta se muestra en cuanto Claude la termina
+                    for question, answer in claude_api.generar_preguntas_stream(**argumentos):
+                        if not questions:
+                            st.subheader("📋 Preguntas Generadas")
+                        mostrar_pregunta(len(questions), question, answer, tipo_preguntas)
+                        questions.append(question)
+                    if claude_api.ultimo_origen == "claude" and claude_api.tiempos_primera_pregunta:
+                        st.caption(f"Primera pregunta en {claude_api.tiempos_primera_pregunta[-1]:.1f} s.")
                 else:
+                    # Generar preguntas y respuestas con Claude
+                    questions, answers = claude_api.generar_preguntas(**argumentos)
+                    if questions:
+                        st.subheader("📋 Preguntas Generadas")
+                        for i, question in enumerate(questions):
+                            mostrar_pregunta(i, question, answers[i], tipo_preguntas)
+
+                if not questions:
                     st.markdown(
                         '<div class="warning">⚠️ No se pudieron generar preguntas. Verifica los documentos o el tema.</div>',
                         unsafe_allow_html=True
                     )
+                elif claude_api.ultimo_origen == "local":
+                    st.markdown(
+                        '<div class="warning">⚠️ No se pudo contactar con Claude: estas preguntas se han '
+                        'generado en local a partir del texto y pueden ser de menor calidad.</div>',
+                        unsafe_allow_html=True
+                    )
+
+                # Ahorro de llamadas de embeddings gracias a la caché
+                cache = claude_api.faiss_manager.embedding_cache
+                if cache is not None:
+                    stats = cache.estadisticas()
+                    st.caption(
+                        f"Caché de embeddings: {stats['hits']} aciertos, {stats['misses']} fallos "
+                        f"({stats['hit_rate']:.0%} de chunks sin llamar a Bedrock)."
+                    )
             except Exception as e:
                 st.markdown(
                     f'<div class="error">❌ Error al generar preguntas: {e}</div>',
@@ -192,6 +245,52 @@ with col2:
                 unsafe_allow_html=True
             )
 
+    # Examen completo: muchas preguntas en paralelo sobre todo el temario o varios temas
+    st.subheader("📚 Examen completo")
+    n_preguntas_examen = st.number_input(
+        "Número de preguntas del examen", min_value=5, max_value=200, value=50, step=5
+    )
+    if st.button("📚 Generar examen completo"):
+        if doc_uploader.get_documents():
+            ambito_preguntas = st.session_state.get("ambito_preguntas", "Todo el temario")
+            tema_concreto = st.session_state.get("tema_concreto", "")
+            tipo_preguntas = st.session_state.get("tipo_preguntas", "Desarrollo")
+            # Varios temas separados por comas
+            temas = None
+            if ambito_preguntas == "Temas concretos" and tema_concreto:
+                temas = [t.strip() for t in tema_concreto.split(",") if t.strip()]
+
+            generador = GeneradorExamen(claude_api)
+            with st.spinner(f"Generando un examen de {n_preguntas_examen} preguntas..."):
+                try:
+                    questions, answers = generador.generar_examen(
+                        doc_uploader.get_documents_info(),
+                        tipo_preguntas.lower(),
+                        n_preguntas=int(n_preguntas_examen),
+                        temas=temas
+                    )
+                except Exception as e:
+                    questions, answers = [], []
+                    st.markdown(
+                        f'<div class="error">❌ Error al generar el examen: {e}</div>',
+                        unsafe_allow_html=True
+                    )
+            if questions and generador.faltantes:
+                st.markdown(
+                    f'<div class="warning">⚠️ Solo se han podido generar {len(questions)} preguntas '
+                    f'distintas de las {int(n_preguntas_examen)} pedidas.</div>',
+                    unsafe_allow_html=True
+                )
+            if questions:
+                st.subheader("📋 Examen Generado")
+                for i, question in enumerate(questions):
+                    mostrar_pregunta(i, question, answers[i], tipo_preguntas)
+        else:
+            st.markdown(
+                '<div class="warning">⚠️ Primero sube documentos.</div>',
+                unsafe_allow_html=True
+            )
+
 # ---------- Columna Derecha ----------
 with col3:
     st.markdown('<div class="right-config">', unsafe_allow_html=True)
@@ -215,4 +314,29 @@ with col3:
         key="tipo_preguntas"
     )
 
+    # Mostrar cada pregunta en cuanto está lista
+    st.checkbox("⚡ Mostrar las preguntas a medida que se generan", value=True, key="streaming")
+    # Reutilizar preguntas ya generadas (más rápido y sin coste) o generar otras
+    st.checkbox("♻️ Reutilizar preguntas ya generadas", value=True, key="usar_cache")
+
     st.markdown('</div>', unsafe_allow_html=True)
+
+    # Panel de diagnóstico: dónde se va el tiempo (extracción, embeddings, FAISS, Claude)
+    with st.expander("🛠️ Diagnóstico"):
+        resumen = METRICAS.resumen()
+        for nombre, valor in sorted(resumen["valores"].items()):
+            st.write(f"`{nombre}`: {valor:.2f}" if isinstance(valor, float) else f"`{nombre}`: {valor}")
+        st.write("**Tiempos por tramo**")
+        st.dataframe([
+            {"tramo": h["nombre"], "llamadas": h["n"], "total_s": round(h["suma"], 3),
+             "media_ms": round(1000 * h["media"], 1)}
+            for h in resumen["histogramas"] if h["nombre"].endswith("_segundos")
+        ])
+        st.write("**Últimos spans**")
+        st.dataframe([
+            {"nombre": s["nombre"], "padre": s["padre"], "ms": s["duracion_ms"],
+             "atributos": str(s["atributos"]), "error": s.get("error", "")}
+            for s in reversed(METRICAS.ultimos_spans(30))
+        ])
+        st.download_button("Descargar métricas (Prometheus)", METRICAS.prometheus(),
+                           file_name="metricas.txt")
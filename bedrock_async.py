@@ -0,0 +1,135 @@
+# bedrock_async.py
+
+import asyncio
+import io
+import json
+import random
+from urllib.parse import quote
+
+import aiohttp
+import boto3
+from botocore.auth import SigV4Auth
+from botocore.awsrequest import AWSRequest
+from botocore.exceptions import ClientError
+
+from embedding_pipeline import es_throttling
+
+class AsyncBedrockClient:
+    """
+    Cliente asíncrono mínimo de 'bedrock-runtime' (solo `invoke_model`)
+    sobre aiohttp, para servir cientos de generaciones a la vez sin un hilo
+    bloqueado por petición.
+
+    - Pool de conexiones keep-alive compartido (`max_conexiones`).
+    - `max_concurrencia` peticiones en vuelo como mucho (semáforo).
+    - Timeouts de conexión y totales; cancelar la tarea cancela la petición.
+    - Reintentos con backoff ante throttling, como EmbeddingPipeline.
+    - Firma SigV4 con las credenciales de boto3. Con `endpoint_url` se puede
+      apuntar a otro servidor, p.ej. el de `fake_bedrock.servir_stub`; si no
+      hay credenciales las peticiones van sin firmar.
+
+    Devuelve lo mismo que boto3 ({"body": objeto con .read()}), así el código
+    que interpreta la respuesta es el mismo en las dos variantes.
+    """
+    def __init__(self, region_name="us-east-1", endpoint_url=None, max_conexiones=100,
+                 max_concurrencia=100, timeout=120, connect_timeout=10, max_retries=3,
+                 backoff_base=0.5):
+        self.region_name = region_name
+        self.endpoint_url = (endpoint_url or f"https://bedrock-runtime.{region_name}.amazonaws.com").rstrip("/")
+        self.max_conexiones = max_conexiones
+        self.max_concurrencia = max_concurrencia
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self._credenciales = boto3.session.Session().get_credentials()
+        self._session = None
+        self._semaforo = None
+        self._loop = None
+
+    async def invoke_model(self, modelId, body, accept="application/json",
+                           contentType="application/json", timeout=None):
+        """
+        POST /model/{modelId}/invoke. `timeout` (segundos) limita esta
+        llamada, reintentos incluidos.
+        """
+        if timeout is not None:
+            return await asyncio.wait_for(self.invoke_model(modelId, body, accept, contentType), timeout)
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        url = f"{self.endpoint_url}/model/{quote(modelId, safe='')}/invoke"
+        intento = 0
+        while True:
+            try:
+                datos = await self._post(url, body, {"Content-Type": contentType, "Accept": accept})
+                return {"body": io.BytesIO(datos)}
+            except ClientError as e:
+                if not es_throttling(e) or intento >= self.max_retries:
+                    raise
+                intento += 1
+                await asyncio.sleep(self.backoff_base * (2 ** (intento - 1)) * random.uniform(0.5, 1.0))
+
+    async def close(self):
+        await self._cerrar_session()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _post(self, url, body, headers):
+        session = await self._obtener_session()
+        async with self._semaforo:
+            # Se firma al salir de la cola: la firma SigV4 lleva la hora
+            headers = self._firmar(url, body, headers)
+            async with session.post(url, data=body, headers=headers) as respuesta:
+                datos = await respuesta.read()
+                if respuesta.status >= 400:
+                    raise _error(respuesta, datos)
+                return datos
+
+    async def _obtener_session(self):
+        """
+        La sesión de aiohttp va ligada al event loop: se crea en el que esté
+        en marcha. Si se cambia de loop (p.ej. varios asyncio.run), la
+        anterior se cierra antes de crear la nueva.
+        """
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._loop is not loop:
+            await self._cerrar_session()
+            conector = aiohttp.TCPConnector(limit=self.max_conexiones, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=conector, timeout=self.timeout)
+            self._semaforo = asyncio.Semaphore(self.max_concurrencia)
+            self._loop = loop
+        return self._session
+
+    async def _cerrar_session(self):
+        session, loop = self._session, self._loop
+        self._session = None
+        if session is None or session.closed:
+            return
+        if loop is not asyncio.get_running_loop() and loop.is_running():
+            # Su loop sigue en marcha en otro hilo: que la cierre él
+            await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(session.close(), loop))
+        else:
+            await session.close()
+
+    def _firmar(self, url, body, headers):
+        if self._credenciales is None:
+            return headers
+        peticion = AWSRequest(method="POST", url=url, data=body, headers=headers)
+        SigV4Auth(self._credenciales.get_frozen_credentials(), "bedrock", self.region_name).add_auth(peticion)
+        return dict(peticion.headers.items())
+
+def _error(respuesta, datos):
+    """Convierte una respuesta de error HTTP en el mismo ClientError que lanzaría boto3."""
+    codigo = respuesta.headers.get("x-amzn-ErrorType", "").split(":")[0]
+    if not codigo:
+        codigo = {429: "ThrottlingException", 503: "ServiceUnavailableException"}.get(
+            respuesta.status, f"HTTP{respuesta.status}")
+    try:
+        mensaje = json.loads(datos).get("message", "")
+    except ValueError:
+        mensaje = datos[:200].decode("utf-8", "replace")
+    return ClientError({"Error": {"Code": codigo, "Message": mensaje},
+                        "ResponseMetadata": {"HTTPStatusCode": respuesta.status}}, "InvokeModel")
@@ -0,0 +1,110 @@
+# benchmark_indices.py
+#
+# Compara los tipos de índice de index_factory frente a la búsqueda exacta:
+# recall@k, consultas por segundo y memoria, también con los vectores
+# guardados en fp16/sq8 y con la dimensión reducida por PCA. Uso:
+#
+#   python benchmark_indices.py --n 200000 --dim 1024 --k 10
+#   python benchmark_indices.py --vectores embeddings.npy --json resultados.json
+
+import argparse
+import json
+import time
+
+import faiss
+import numpy as np
+
+from index_factory import crear_indice, entrenar, ajustar_busqueda, memoria_indice
+
+def datos_sinteticos(n, dim, n_consultas, n_clusters=256, seed=0):
+    """Vectores agrupados en clusters (más realista que ruido uniforme)."""
+    rng = np.random.default_rng(seed)
+    centros = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    asignacion = rng.integers(0, n_clusters, n + n_consultas)
+    datos = centros[asignacion] + 0.5 * rng.standard_normal((n + n_consultas, dim)).astype(np.float32)
+    faiss.normalize_L2(datos)
+    return datos[:n], datos[n:]
+
+def recall_at_k(encontrados, verdad):
+    """Fracción de los k vecinos exactos que aparecen en el resultado."""
+    aciertos = sum(len(set(e) & set(v)) for e, v in zip(encontrados, verdad))
+    return aciertos / verdad.size
+
+def medir(nombre, index, base, consultas, verdad, k, **params):
+    ajustar_busqueda(index, **params)
+    t0 = time.perf_counter()
+    _, ids = index.search(consultas, k)
+    segundos = time.perf_counter() - t0
+    return {
+        "indice": nombre,
+        **{p: v for p, v in params.items() if v is not None},
+        "recall_at_k": round(recall_at_k(ids, verdad), 4),
+        "qps": round(len(consultas) / segundos, 1),
+        "memoria_mb": round(memoria_indice(index) / 2**20, 2),
+        "bytes_por_vector": round(memoria_indice(index) / len(base), 1),
+    }
+
+def construir(tipo, base, **kwargs):
+    index = crear_indice(tipo, base.shape[1], n_entrenamiento=len(base), **kwargs)
+    t0 = time.perf_counter()
+    entrenar(index, base)
+    index.add_with_ids(base, np.arange(len(base), dtype=np.int64))
+    return index, time.perf_counter() - t0
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de índices FAISS")
+    parser.add_argument("--n", type=int, default=100000, help="número de vectores sintéticos")
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--consultas", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--pq-m", type=int, default=64)
+    parser.add_argument("--pca-dim", type=int, default=256, help="dimensión reducida (0 = no probar PCA)")
+    parser.add_argument("--vectores", help="fichero .npy con embeddings reales (N, dim)")
+    parser.add_argument("--json", help="fichero donde guardar los resultados")
+    args = parser.parse_args()
+
+    if args.vectores:
+        datos = np.load(args.vectores).astype(np.float32)
+        faiss.normalize_L2(datos)
+        base, consultas = datos[:-args.consultas], datos[-args.consultas:]
+    else:
+        base, consultas = datos_sinteticos(args.n, args.dim, args.consultas)
+
+    # Referencia: búsqueda exacta
+    flat, t_flat = construir("flat", base)
+    _, verdad = flat.search(consultas, args.k)
+    resultados = [dict(medir("flat", flat, base, consultas, verdad, args.k), construccion_s=round(t_flat, 2))]
+
+    configuraciones = [
+        ("ivf_flat", {"nlist": args.nlist}, [{"nprobe": p} for p in (1, 8, 32, 128)]),
+        ("ivf_pq", {"nlist": args.nlist, "pq_m": args.pq_m}, [{"nprobe": p} for p in (1, 8, 32, 128)]),
+        ("hnsw", {}, [{"ef_search": ef} for ef in (16, 64, 256)]),
+        # Almacenamiento compacto: 2 (fp16) o 1 (sq8) byte por dimensión
+        ("flat", {"almacenamiento": "fp16"}, [{}]),
+        ("flat", {"almacenamiento": "sq8"}, [{}]),
+        ("ivf_flat", {"nlist": args.nlist, "almacenamiento": "sq8"}, [{"nprobe": p} for p in (8, 32)]),
+        ("hnsw", {"almacenamiento": "sq8"}, [{"ef_search": ef} for ef in (64, 256)]),
+    ]
+    if args.pca_dim and args.pca_dim < base.shape[1]:
+        configuraciones += [
+            ("flat", {"pca_dim": args.pca_dim}, [{}]),
+            ("flat", {"pca_dim": args.pca_dim, "almacenamiento": "sq8"}, [{}]),
+            ("hnsw", {"pca_dim": args.pca_dim, "almacenamiento": "fp16"}, [{"ef_search": ef} for ef in (64, 256)]),
+        ]
+    for tipo, kwargs_creacion, barrido in configuraciones:
+        index, t_construccion = construir(tipo, base, **kwargs_creacion)
+        for params in barrido:
+            fila = medir(tipo, index, base, consultas, verdad, args.k, **params)
+            fila.update({p: v for p, v in kwargs_creacion.items() if p in ("almacenamiento", "pca_dim")})
+            fila["construccion_s"] = round(t_construccion, 2)
+            resultados.append(fila)
+
+    for fila in resultados:
+        print(json.dumps(fila, ensure_ascii=False))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+# benchmark_pipeline.py
+#
+# Mide el pipeline completo (extracción → chunking → índice → búsqueda →
+# generación) sin red: Bedrock se sustituye por fake_bedrock.FakeBedrockClient.
+# Los resultados salen en JSON para comparar commits. Uso:
+#
+#   python benchmark_pipeline.py --json resultados.json
+#   python benchmark_pipeline.py --paginas 10 100 --latencia 0.02 --tasa-errores 0.05
+#   python benchmark_pipeline.py --comparar anterior.json --tolerancia 0.2
+
+import argparse
+import io
+import json
+import platform
+import random
+import statistics
+import subprocess
+import time
+
+from busqueda import ClaudeAPI
+from datos_sinteticos import PALABRAS, crear_docx, crear_pdf, crear_pptx, frase, paginas_sinteticas
+from documentos import DocumentUploader
+from faiss_manager import FAISSManager
+from fake_bedrock import FakeBedrockClient
+
+# ---------- Datos sintéticos ----------
+
+class ArchivoMemoria(io.BytesIO):
+    """Imita el UploadedFile de Streamlit (bytes + nombre)."""
+    def __init__(self, nombre, datos):
+        super().__init__(datos)
+        self.name = nombre
+
+CREADORES = {"pdf": crear_pdf, "docx": crear_docx, "pptx": crear_pptx}
+
+# ---------- Medidas ----------
+
+def percentiles(valores):
+    valores = sorted(valores)
+    if not valores:
+        return {}
+    return {
+        "p50_ms": round(1000 * valores[len(valores) // 2], 2),
+        "p99_ms": round(1000 * valores[min(len(valores) - 1, int(len(valores) * 0.99))], 2),
+        "media_ms": round(1000 * statistics.mean(valores), 2),
+    }
+
+def bench_extraccion(tamanos, max_workers):
+    resultados = []
+    for formato, crear in CREADORES.items():
+        for n_paginas in tamanos:
+            try:
+                datos = crear(paginas_sinteticas(n_paginas, seed=n_paginas))
+            except ImportError as e:
+                resultados.append({"formato": formato, "paginas": n_paginas, "error": str(e)})
+                continue
+            fila = {"formato": formato, "paginas": n_paginas, "bytes": len(datos)}
+            for modo in ("serie", "paralelo"):
+                uploader = DocumentUploader(cache=None)
+                archivo = ArchivoMemoria(f"bench.{formato}", datos)
+                t0 = time.perf_counter()
+                if modo == "serie":
+                    uploader.add_document(archivo)
+                else:
+                    uploader.add_documents([archivo], max_workers=max_workers)
+                segundos = time.perf_counter() - t0
+                fila[f"{modo}_s"] = round(segundos, 4)
+                fila[f"{modo}_mb_s"] = round(len(datos) / 2**20 / segundos, 2)
+            fila["caracteres"] = len(uploader.get_concatenated_text())
+            resultados.append(fila)
+    return resultados
+
+def bench_chunking(manager, texto, repeticiones=3):
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        chunks = manager.chunk_text(texto)
+        tiempos.append(time.perf_counter() - t0)
+    mejor = min(tiempos)
+    return {
+        "caracteres": len(texto),
+        "chunks": len(chunks),
+        "segundos": round(mejor, 4),
+        "mb_s": round(len(texto) / 2**20 / mejor, 2),
+    }
+
+def bench_indexado(manager, cliente, documentos):
+    llamadas = cliente.llamadas
+    t0 = time.perf_counter()
+    manager.create_faiss_index(documentos)
+    segundos = time.perf_counter() - t0
+    return {
+        "documentos": len(documentos),
+        "chunks": len(manager.chunks),
+        "segundos": round(segundos, 3),
+        "chunks_s": round(len(manager.chunks) / segundos, 1),
+        "llamadas_embeddings": cliente.llamadas - llamadas,
+        "errores_simulados": cliente.errores,
+    }
+
+def bench_recuperacion(manager, consultas, k):
+    resultados = {}
+    for nombre, buscar in (
+        ("faiss", lambda q: manager.search(q, k=k)),
+        ("faiss_mmr", lambda q: manager.search(q, k=k, mmr=True)),
+        ("bm25", lambda q: manager.search_lexical(q, k=k)),
+        ("hibrida", lambda q: manager.search_hybrid(q, k=k)),
+    ):
+        tiempos = []
+        for consulta in consultas:
+            t0 = time.perf_counter()
+            buscar(consulta)
+            tiempos.append(time.perf_counter() - t0)
+        resultados[nombre] = {"qps": round(len(tiempos) / sum(tiempos), 1), **percentiles(tiempos)}
+    # Todas las consultas en una sola llamada a index.search
+    t0 = time.perf_counter()
+    manager.search(list(consultas), k=k)
+    resultados["faiss_lote"] = {"qps": round(len(consultas) / (time.perf_counter() - t0), 1)}
+    return resultados
+
+def bench_parseo(claude_api, n_preguntas, repeticiones=5):
+    rng = random.Random(1)
+    texto = "\n".join(
+        f"Pregunta: {frase(rng)}?\nRespuesta: {frase(rng)}\n{frase(rng)}" for _ in range(n_preguntas)
+    )
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        questions, _ = claude_api._parse_questions_and_answers(texto)
+        tiempos.append(time.perf_counter() - t0)
+    mejor = min(tiempos)
+    return {
+        "preguntas": len(questions),
+        "preguntas_s": round(len(questions) / mejor, 1),
+        "mb_s": round(len(texto) / 2**20 / mejor, 2),
+    }
+
+def bench_generacion(claude_api, texto, documentos, temas, repeticiones):
+    resultados = {}
+    for nombre, consulta in (("aleatorio", lambda i: None), ("por_tema", lambda i: temas[i % len(temas)])):
+        tiempos = []
+        for i in range(repeticiones):
+            t0 = time.perf_counter()
+            claude_api.generar_preguntas(texto, "el temario", "preguntas cortas",
+                                         documentos=documentos, consulta=consulta(i), usar_cache=False)
+            tiempos.append(time.perf_counter() - t0)
+        resultados[nombre] = percentiles(tiempos)
+    return resultados
+
+# ---------- Comparación entre commits ----------
+
+# Sufijos de las métricas que se comparan: rendimiento (más es mejor) y tiempos
+_MAS_ES_MEJOR = ("qps", "mb_s", "chunks_s", "preguntas_s")
+_MENOS_ES_MEJOR = ("_ms", "segundos", "serie_s", "paralelo_s")
+
+def _planas(datos, prefijo=""):
+    if isinstance(datos, dict):
+        for clave, valor in datos.items():
+            yield from _planas(valor, f"{prefijo}.{clave}" if prefijo else clave)
+    elif isinstance(datos, list):
+        for i, valor in enumerate(datos):
+            yield from _planas(valor, f"{prefijo}[{i}]")
+    elif isinstance(datos, (int, float)) and not isinstance(datos, bool):
+        yield prefijo, datos
+
+def comparar(anterior, actual, tolerancia):
+    """Métricas que empeoran más de `tolerancia` (fracción) respecto a `anterior`."""
+    previas = dict(_planas(anterior["resultados"]))
+    regresiones = []
+    for metrica, valor in _planas(actual["resultados"]):
+        previo = previas.get(metrica)
+        if not previo:
+            continue
+        cambio = (valor - previo) / previo
+        if metrica.endswith(_MAS_ES_MEJOR):
+            empeora = cambio < -tolerancia
+        elif metrica.endswith(_MENOS_ES_MEJOR):
+            empeora = cambio > tolerancia
+        else:
+            continue
+        if empeora:
+            regresiones.append({"metrica": metrica, "antes": previo, "ahora": valor,
+                                "cambio": round(cambio, 3)})
+    return regresiones
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del pipeline sin red")
+    parser.add_argument("--paginas", type=int, nargs="+", default=[10, 100],
+                        help="tamaños (páginas) de los documentos de extracción")
+    parser.add_argument("--documentos", type=int, default=5, help="documentos a indexar")
+    parser.add_argument("--paginas-por-documento", type=int, default=40)
+    parser.add_argument("--consultas", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--generaciones", type=int, default=20)
+    parser.add_argument("--latencia", type=float, default=0.0, help="segundos por llamada a Bedrock")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--tasa-errores", type=float, default=0.0, help="probabilidad de throttling")
+    parser.add_argument("--index-type", default="flat")
+    parser.add_argument("--max-workers", type=int, default=None)
+    parser.add_argument("--sin-extraccion", action="store_true", help="omite la extracción (sin PyPDF2/docx/pptx)")
+    parser.add_argument("--json", help="fichero donde guardar los resultados")
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="empeoramiento admitido (0.2 = 20 %%)")
+    args = parser.parse_args()
+
+    cliente = FakeBedrockClient(latencia=args.latencia, jitter=args.jitter, tasa_errores=args.tasa_errores)
+    # Sin cachés en disco: cada ejecución mide el trabajo completo
+    manager = FAISSManager(cache_dir=None, index_dir=None, bedrock_client=cliente,
+                           index_type=args.index_type)
+    claude_api = ClaudeAPI(bedrock_client=cliente, faiss_manager=manager, cache_dir=None)
+
+    documentos = []
+    for i in range(args.documentos):
+        paginas = paginas_sinteticas(args.paginas_por_documento, seed=1000 + i)
+        limites, offset = [], 0
+        for pagina in paginas:
+            limites.append(offset)
+            offset += len(pagina) + 1
+        documentos.append({"nombre": f"doc{i}.pdf", "texto": "\n".join(paginas), "paginas": limites})
+    texto = " ".join(d["texto"] for d in documentos)
+    rng = random.Random(7)
+    consultas = [" ".join(rng.sample(PALABRAS, 3)) for _ in range(args.consultas)]
+
+    resultados = {}
+    if not args.sin_extraccion:
+        resultados["extraccion"] = bench_extraccion(args.paginas, args.max_workers)
+    resultados["chunking"] = bench_chunking(manager, texto)
+    resultados["indexado"] = bench_indexado(manager, cliente, documentos)
+    # Registra la huella de estos documentos: la generación no vuelve a indexar
+    manager.sync_documents(documentos)
+    resultados["recuperacion"] = bench_recuperacion(manager, consultas, args.k)
+    resultados["parseo"] = bench_parseo(claude_api, n_preguntas=1000)
+    resultados["generacion"] = bench_generacion(claude_api, texto, documentos, consultas, args.generaciones)
+
+    salida = {
+        "commit": _commit(),
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "parametros": vars(args),
+        "resultados": resultados,
+    }
+    print(json.dumps(salida, indent=2, ensure_ascii=False))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(salida, f, indent=2, ensure_ascii=False)
+
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            regresiones = comparar(json.load(f), salida, args.tolerancia)
+        for r in regresiones:
+            print(f"REGRESIÓN {r['metrica']}: {r['antes']} → {r['ahora']} ({r['cambio']:+.0%})")
+        if regresiones:
+            raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+# bm25.py
+
+import math
+import re
+import unicodedata
+from array import array
+from collections import Counter
+
+import numpy as np
+
+# Palabras vacías más frecuentes en español (no aportan a la búsqueda léxica)
+STOPWORDS = set("""
+a al algo algunas algunos ante antes como con contra cual cuando de del desde donde durante e el
+ella ellas ellos en entre era eran es esa esas ese eso esos esta estas este esto estos fue fueron
+ha han hasta hay la las le les lo los mas me mi mientras muy nada ni no nos o os otra otras otro
+otros para pero poco por porque que quien se sea ser si sin sobre son su sus tambien tan te tiene
+tienen todo todos tu un una uno unos y ya
+""".split())
+
+_TOKEN = re.compile(r"\w+")
+
+def tokenizar(texto):
+    """Minúsculas, sin tildes y sin palabras vacías. Conserva números ("14", "1978")."""
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return [t for t in _TOKEN.findall(texto) if t not in STOPWORDS]
+
+class BM25Index:
+    """
+    Índice invertido BM25 en memoria.
+
+    Cada término tiene su lista de postings en dos arrays compactos (ids de
+    chunk y frecuencias). Se actualiza de forma incremental: `add` añade al
+    final de las listas y `remove` marca los ids como borrados; las listas
+    se compactan cuando los borrados superan un 25 %.
+    """
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings = {}     # término -> (array('q') ids, array('I') frecuencias)
+        self._longitudes = {}   # id -> número de tokens
+        self._suma_longitudes = 0
+        self._borrados = set()
+
+    def __len__(self):
+        return len(self._longitudes)
+
+    def add(self, ids, textos):
+        for chunk_id, texto in zip(ids, textos):
+            chunk_id = int(chunk_id)
+            if chunk_id in self._longitudes:
+                continue
+            self._borrados.discard(chunk_id)
+            tokens = tokenizar(texto)
+            self._longitudes[chunk_id] = len(tokens)
+            self._suma_longitudes += len(tokens)
+            for termino, tf in Counter(tokens).items():
+                lista = self._postings.get(termino)
+                if lista is None:
+                    lista = self._postings[termino] = (array('q'), array('I'))
+                lista[0].append(chunk_id)
+                lista[1].append(tf)
+
+    def remove(self, ids):
+        for chunk_id in ids:
+            chunk_id = int(chunk_id)
+            longitud = self._longitudes.pop(chunk_id, None)
+            if longitud is not None:
+                self._suma_longitudes -= longitud
+                self._borrados.add(chunk_id)
+        if len(self._borrados) > 0.25 * max(len(self._longitudes), 1):
+            self._compactar()
+
+    def search(self, query, k=10):
+        """Retorna [(id, puntuación)] de los `k` chunks con mayor BM25."""
+        n = len(self._longitudes)
+        if not n:
+            return []
+        media = self._suma_longitudes / n
+        puntuaciones = {}
+        for termino in set(tokenizar(query)):
+            lista = self._postings.get(termino)
+            if lista is None:
+                continue
+            ids, tfs = lista
+            df = len(ids) - sum(1 for i in ids if i in self._borrados) if self._borrados else len(ids)
+            if not df:
+                continue
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for chunk_id, tf in zip(ids, tfs):
+                longitud = self._longitudes.get(chunk_id)
+                if longitud is None:
+                    continue  # borrado
+                norm = tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * longitud / media))
+                puntuaciones[chunk_id] = puntuaciones.get(chunk_id, 0.0) + idf * norm
+        mejores = sorted(puntuaciones.items(), key=lambda x: x[1], reverse=True)
+        return mejores[:k]
+
+    def a_arrays(self):
+        """
+        El índice como arrays de numpy, para guardarlo junto al índice FAISS
+        (ver `desde_arrays`): términos separados por saltos de línea, los
+        postings de todos los términos seguidos y los tokens de cada chunk.
+        """
+        self._compactar()
+        terminos = list(self._postings)
+        offsets = np.zeros(len(terminos) + 1, dtype=np.int64)
+        if terminos:
+            np.cumsum([len(self._postings[t][0]) for t in terminos], out=offsets[1:])
+        ids = np.empty(offsets[-1], dtype=np.int64)
+        tfs = np.empty(offsets[-1], dtype=np.uint32)
+        for j, termino in enumerate(terminos):
+            ids[offsets[j]:offsets[j + 1]] = self._postings[termino][0]
+            tfs[offsets[j]:offsets[j + 1]] = self._postings[termino][1]
+        return {
+            "terminos": np.frombuffer("\n".join(terminos).encode("utf-8"), dtype=np.uint8),
+            "offsets": offsets,
+            "ids": ids,
+            "tfs": tfs,
+            "chunks": np.fromiter(self._longitudes, dtype=np.int64, count=len(self._longitudes)),
+            "longitudes": np.fromiter(self._longitudes.values(), dtype=np.int64, count=len(self._longitudes)),
+        }
+
+    @classmethod
+    def desde_arrays(cls, arrays, k1=1.5, b=0.75):
+        """Reconstruye un índice guardado con `a_arrays` sin volver a tokenizar los chunks."""
+        indice = cls(k1=k1, b=b)
+        texto = arrays["terminos"].tobytes().decode("utf-8")
+        terminos = texto.split("\n") if texto else []
+        offsets = arrays["offsets"]
+        ids = arrays["ids"].astype(np.int64, copy=False)
+        tfs = arrays["tfs"].astype(np.uint32, copy=False)
+        for j, termino in enumerate(terminos):
+            lista = (array('q'), array('I'))
+            lista[0].frombytes(ids[offsets[j]:offsets[j + 1]].tobytes())
+            lista[1].frombytes(tfs[offsets[j]:offsets[j + 1]].tobytes())
+            indice._postings[termino] = lista
+        indice._longitudes = dict(zip(arrays["chunks"].tolist(), arrays["longitudes"].tolist()))
+        indice._suma_longitudes = sum(indice._longitudes.values())
+        return indice
+
+    def _compactar(self):
+        """Quita de las listas los postings de ids borrados."""
+        for termino in list(self._postings):
+            ids, tfs = self._postings[termino]
+            conservar = [j for j, i in enumerate(ids) if i not in self._borrados]
+            if not conservar:
+                del self._postings[termino]
+            elif len(conservar) < len(ids):
+                self._postings[termino] = (array('q', (ids[j] for j in conservar)),
+                                           array('I', (tfs[j] for j in conservar)))
+        self._borrados.clear()
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Fusiona varias listas ordenadas de ids: puntuación = Σ 1 / (k + posición).
+    Retorna [(id, puntuación)] de mayor a menor.
+    """
+    puntuaciones = {}
+    for ranking in rankings:
+        for posicion, chunk_id in enumerate(ranking, start=1):
+            puntuaciones[chunk_id] = puntuaciones.get(chunk_id, 0.0) + 1.0 / (k + posicion)
+    return sorted(puntuaciones.items(), key=lambda x: x[1], reverse=True)
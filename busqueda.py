@@ -1,93 +1,487 @@
 # busqueda.py
 
+import asyncio
 import json
-import boto3
+import threading
+import time
+from contextlib import contextmanager
+from chunker import empaquetar_contexto, recortar_tokens
+from embedding_pipeline import TokenBucket
 from faiss_manager import FAISSManager
+from manager import ExamManager
+from metricas import METRICAS
+from recursos import get_bedrock_client, get_response_cache
 
 class ClaudeAPI:
-    def __init__(self):
-        self.bedrock_client = boto3.client('bedrock-runtime', region_name='us-east-1')
-        print("Cliente de Bedrock inicializado.")
-        
-        self.faiss_manager = FAISSManager()
-        self.index_created = False
+    CLAUDE_MODEL_ID = "anthropic.claude-3-5-sonnet-20240620-v1:0"
+    # Tokens de salida aproximados por pregunta + respuesta, según el tipo
+    TOKENS_POR_PREGUNTA = {"desarrollo": 220, "verdadero/falso": 70, "preguntas cortas": 110}
+
+    def __init__(self, bedrock_client=None, faiss_manager=None,
+                 cache_dir=".cache/respuestas", cache_semantico=True,
+                 presupuesto_contexto=1500, preguntas_por_llamada=5, rate=2.0):
+        # Cliente compartido por todo el proceso (ver recursos.py)
+        self.bedrock_client = bedrock_client or get_bedrock_client()
+
+        self.faiss_manager = faiss_manager or FAISSManager(bedrock_client=self.bedrock_client)
+        # Caché de preguntas generadas (cache_dir=None la desactiva). Con
+        # cache_semantico también acierta con temas parecidos (embeddings de Cohere).
+        self.response_cache = get_response_cache(cache_dir) if cache_dir else None
+        self.cache_semantico = cache_semantico
+        # Generación local (sin coste) si Bedrock falla; usar_fallback_local=False la desactiva
+        self.fallback_local = ExamManager()
+        self.usar_fallback_local = True
+        self.tiempos_primera_pregunta = []  # segundos hasta la primera pregunta (streaming)
+        self.ultimo_origen = None  # de dónde salieron las últimas preguntas: "cache", "claude" o "local"
+        # Con las variantes async varias generaciones comparten el índice a la
+        # vez: las búsquedas en paralelo, la sincronización en exclusiva
+        self._lock_indice = _LockLecturaEscritura()
+        # Tokens de contenido que se meten en el prompt y preguntas por llamada
+        # (max_tokens de la respuesta se ajusta a las preguntas pedidas)
+        self.presupuesto_contexto = presupuesto_contexto
+        self.preguntas_por_llamada = preguntas_por_llamada
+        # Llamadas a Claude por segundo de las generaciones en lote (examen.GeneradorExamen);
+        # uno por ClaudeAPI, así varios exámenes seguidos no se saltan el límite
+        self.rate_limiter = TokenBucket(rate) if rate else None
 
-    def generar_preguntas(self, full_text, tema, tipo):
+    def generar_preguntas(self, full_text, tema, tipo, documentos=None, consulta=None, k=3,
+                          usar_cache=True):
         """
         Genera preguntas y respuestas usando Claude en Bedrock.
+        `documentos` es la lista de DocumentUploader.get_documents_info() (o de
+        textos); si se pasa, el índice se mantiene sincronizado documento a documento.
+        `consulta` es el tema concreto a buscar: si se indica, el contexto son
+        los `k` chunks más relevantes (y diversos) en vez de uno aleatorio.
+        Con `usar_cache=False` se generan preguntas nuevas aunque haya otras
+        guardadas para la misma petición (el resultado se guarda igualmente).
         """
-        # Si no hemos creado el índice FAISS aún
-        if not self.index_created:
-            # Pasamos la lista de documentos. En tu caso, solo uno concatenado,
-            # pero podrías usar varios si así lo deseas.
-            self.faiss_manager.create_faiss_index([full_text])
-            self.index_created = True
-
-        # Tomamos un chunk aleatorio
-        random_chunk = self.faiss_manager.get_random_chunk()
-        if not random_chunk:
-            print("No se pudo obtener un chunk aleatorio. Usando fallback de 8000 chars.")
-            random_chunk = full_text[:8000]
-
-        # Construimos el prompt con ese chunk
-        prompt = (
-            f"Genera preguntas del tipo '{tipo}' sobre el tema '{tema}' utilizando el siguiente contenido:\n\n"
-            f"{random_chunk}\n\n"
-            "Formato de salida:\n"
-            "Pregunta: [Aquí va la pregunta]\n"
-            "Respuesta: [Aquí va la respuesta]"
-        )
-
-        body = json.dumps({
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 1000,
-            "temperature": 0.7,
-            "messages": [{"role": "user", "content": prompt}]
-        })
+        with METRICAS.span("generar_preguntas", tipo=tipo, consulta=bool(consulta)) as span:
+            contexto, chunk_ids = self._elegir_contexto_o_texto(full_text, documentos, consulta, k)
+            tema_vec = self._tema_vec(consulta)
+            cacheado = self._leer_cache(chunk_ids, tipo, tema, tema_vec) if usar_cache else None
+            if cacheado is not None:
+                (questions, answers), origen = cacheado, "cache"
+            else:
+                try:
+                    questions, answers = self.generar_desde_contexto(contexto, tema, tipo)
+                    origen = "claude"
+                except Exception as e:
+                    print(f"Error al invocar a Claude: {e}")
+                    questions, answers = self._generar_local(contexto, tipo)
+                    origen = "local"
+                else:
+                    self._guardar_cache(chunk_ids, tipo, tema, questions, answers, tema_vec)
+            self.ultimo_origen = origen
+            span.update(origen=origen, preguntas=len(questions))
+            METRICAS.contador("preguntas_generadas_total", len(questions), origen=origen)
+        return questions, answers
 
-        try:
+    def generar_desde_contexto(self, contexto, tema, tipo, n_preguntas=None):
+        """
+        Una llamada a Claude con el contexto dado. A diferencia de
+        `generar_preguntas`, no captura los errores (p.ej. para reintentar
+        ante throttling). Retorna (questions, answers).
+        """
+        body = self._body_preguntas(contexto, tema, tipo, n_preguntas)
+        with METRICAS.span("claude", contexto_caracteres=len(contexto)) as span:
             response = self.bedrock_client.invoke_model(
-                modelId="anthropic.claude-3-5-sonnet-20240620-v1:0",
+                modelId=self.CLAUDE_MODEL_ID,
                 accept="application/json",
                 contentType="application/json",
                 body=body
             )
 
             response_body = json.loads(response['body'].read())
-            content = response_body.get('content', '')
+            uso = self._contar_tokens(response_body.get('usage'))
+            span.update(uso)
+        content = response_body.get('content', '')
+
+        # Procesar preguntas y respuestas
+        questions, answers = self._parse_questions_and_answers(content)
+        self._registrar_uso(uso, len(questions))
+        return questions, answers
+
+    async def generar_preguntas_async(self, full_text, tema, tipo, documentos=None, consulta=None,
+                                      k=3, usar_cache=True, timeout=None):
+        """
+        Variante asíncrona de `generar_preguntas` (mismos argumentos): la
+        llamada a Claude usa el cliente asíncrono, así un solo proceso puede
+        tener cientos de generaciones en vuelo. `timeout` (segundos) limita
+        la llamada a Claude; si se agota, o falla, se generan en local.
+        Cancelar la tarea cancela la petición.
+        """
+        with METRICAS.span("generar_preguntas_async", tipo=tipo, consulta=bool(consulta)) as span:
+            # El embedding de la consulta va por el cliente asíncrono; sincronizar
+            # el índice y buscar es trabajo local/bloqueante: a un hilo. Si hay
+            # documentos nuevos, sus embeddings se piden desde ese hilo (boto3).
+            vector = await self._vector_consulta_async(consulta)
+            contexto, chunk_ids = await asyncio.to_thread(
+                self._elegir_contexto_o_texto, full_text, documentos, consulta, k, vector)
+            tema_vec = vector if self.cache_semantico and self.response_cache is not None else None
+            cacheado = self._leer_cache(chunk_ids, tipo, tema, tema_vec) if usar_cache else None
+            if cacheado is not None:
+                (questions, answers), origen = cacheado, "cache"
+            else:
+                try:
+                    questions, answers = await asyncio.wait_for(
+                        self.generar_desde_contexto_async(contexto, tema, tipo), timeout)
+                    origen = "claude"
+                except Exception as e:
+                    print(f"Error al invocar a Claude: {e!r}")
+                    questions, answers = self._generar_local(contexto, tipo)
+                    origen = "local"
+                else:
+                    self._guardar_cache(chunk_ids, tipo, tema, questions, answers, tema_vec)
+            self.ultimo_origen = origen
+            span.update(origen=origen, preguntas=len(questions))
+            METRICAS.contador("preguntas_generadas_total", len(questions), origen=origen)
+        return questions, answers
+
+    async def generar_desde_contexto_async(self, contexto, tema, tipo, n_preguntas=None):
+        """Variante asíncrona de `generar_desde_contexto` (no captura los errores)."""
+        body = self._body_preguntas(contexto, tema, tipo, n_preguntas)
+        with METRICAS.span("claude_async", contexto_caracteres=len(contexto)) as span:
+            response = await self.faiss_manager.async_client.invoke_model(
+                modelId=self.CLAUDE_MODEL_ID,
+                accept="application/json",
+                contentType="application/json",
+                body=body
+            )
+            response_body = json.loads(response['body'].read())
+            uso = self._contar_tokens(response_body.get('usage'))
+            span.update(uso)
+        questions, answers = self._parse_questions_and_answers(response_body.get('content', ''))
+        self._registrar_uso(uso, len(questions))
+        return questions, answers
 
-            # Procesar preguntas y respuestas
-            questions, answers = self._parse_questions_and_answers(content)
-            return questions, answers
+    def generar_preguntas_stream(self, full_text, tema, tipo, documentos=None, consulta=None, k=3,
+                                 usar_cache=True):
+        """
+        Igual que `generar_preguntas`, pero en streaming: es un generador que
+        devuelve cada (pregunta, respuesta) en cuanto Claude la termina, sin
+        esperar a la respuesta completa. Guarda el tiempo hasta la primera
+        pregunta en `self.tiempos_primera_pregunta`.
+        """
+        inicio = time.perf_counter()
+        contexto, chunk_ids = self._elegir_contexto_o_texto(full_text, documentos, consulta, k)
+        tema_vec = self._tema_vec(consulta)
+        cacheado = self._leer_cache(chunk_ids, tipo, tema, tema_vec) if usar_cache else None
+        if cacheado is not None:
+            # No cuenta para el tiempo hasta la primera pregunta: solo mide llamadas a Claude
+            self.ultimo_origen = "cache"
+            yield from zip(*cacheado)
+            return
 
+        body = self._body_preguntas(contexto, tema, tipo)
+        parser = IncrementalQAParser()
+        primera = True
+        generadas = []
+        uso = {}
+
+        try:
+            response = self.bedrock_client.invoke_model_with_response_stream(
+                modelId=self.CLAUDE_MODEL_ID,
+                accept="application/json",
+                contentType="application/json",
+                body=body
+            )
+            for event in response['body']:
+                chunk = event.get('chunk')
+                if not chunk:
+                    continue
+                datos = json.loads(chunk['bytes'])
+                if datos.get('type') == 'message_start':
+                    uso.update(self._contar_tokens(datos.get('message', {}).get('usage')))
+                elif datos.get('type') == 'message_delta':
+                    uso.update(self._contar_tokens(datos.get('usage')))
+                if datos.get('type') != 'content_block_delta':
+                    continue
+                for par in parser.feed(datos.get('delta', {}).get('text', '')):
+                    if primera:
+                        self._registrar_primera_pregunta(inicio)
+                        primera = False
+                    generadas.append(par)
+                    yield par
         except Exception as e:
             print(f"Error al invocar a Claude: {e}")
+            error = True
+        else:
+            error = False
+
+        # Lo que quede en el buffer (la última pregunta, o todo si hubo un error)
+        for par in parser.close():
+            if primera:
+                self._registrar_primera_pregunta(inicio)
+                primera = False
+            generadas.append(par)
+            yield par
+
+        METRICAS.observar("generar_preguntas_stream_segundos", time.perf_counter() - inicio)
+        METRICAS.contador("preguntas_generadas_total", len(generadas), origen="claude")
+        self.ultimo_origen = "claude"
+        if generadas and not error:
+            self._registrar_uso(uso, len(generadas))
+            questions, answers = map(list, zip(*generadas))
+            self._guardar_cache(chunk_ids, tipo, tema, questions, answers, tema_vec)
+        elif error and not generadas:
+            self.ultimo_origen = "local"
+            locales = self._generar_local(contexto, tipo)
+            METRICAS.contador("preguntas_generadas_total", len(locales[0]), origen="local")
+            yield from zip(*locales)
+
+    def _registrar_primera_pregunta(self, inicio):
+        segundos = time.perf_counter() - inicio
+        self.tiempos_primera_pregunta.append(segundos)
+        METRICAS.observar("primera_pregunta_segundos", segundos)
+        print(f"Primera pregunta en {segundos:.2f} s.")
+
+    @staticmethod
+    def _contar_tokens(usage):
+        """Suma los tokens de entrada/salida que informa Bedrock en `usage`."""
+        tokens = {}
+        for campo in ("input_tokens", "output_tokens"):
+            if usage and usage.get(campo):
+                tokens[campo] = usage[campo]
+                METRICAS.contador("claude_tokens_total", usage[campo], tipo=campo.split("_")[0])
+        return tokens
+
+    def _registrar_uso(self, tokens, n_preguntas):
+        """
+        Coste por pregunta de una llamada, en las métricas (los tokens de
+        entrada/salida ya van en el span y en claude_tokens_total).
+        """
+        if not tokens or not n_preguntas:
+            return
+        por_pregunta = (tokens.get("input_tokens", 0) + tokens.get("output_tokens", 0)) / n_preguntas
+        METRICAS.observar("claude_tokens_por_pregunta", por_pregunta,
+                          buckets=(50, 100, 200, 400, 800, 1600, 3200))
+
+    def _generar_local(self, contexto, tipo, count=5):
+        """Preguntas generadas en local a partir del contexto (ver ExamManager)."""
+        if not self.usar_fallback_local:
             return [], []
+        print("Usando generación local de preguntas.")
+        return self.fallback_local.generar_lote(contexto, tipo, count)
 
-    def _parse_questions_and_answers(self, content):
-        # Igual que antes
-        questions, answers = [], []
-        current_answer = []
-        capturing_answer = False
+    def _tema_vec(self, consulta):
+        """Embedding del tema para la caché semántica (ya está en la caché de embeddings)."""
+        if not (consulta and self.cache_semantico and self.response_cache is not None):
+            return None
+        try:
+            return self.faiss_manager.generate_embeddings([consulta], input_type="search_query")[0]
+        except Exception as e:
+            print(f"No se pudo obtener el embedding del tema: {e}")
+            return None
+
+    async def _vector_consulta_async(self, consulta):
+        """Embedding de la consulta, para buscar y para la caché semántica."""
+        if not consulta:
+            return None
+        try:
+            vecs = await self.faiss_manager.generate_embeddings_async([consulta], input_type="search_query")
+            return vecs[0]
+        except Exception as e:
+            print(f"No se pudo obtener el embedding del tema: {e!r}")
+            return None
+
+    def _leer_cache(self, chunk_ids, tipo, tema, tema_vec):
+        # Sin chunk_ids el contexto es aleatorio (o el fallback): no se cachea
+        if self.response_cache is None or self.faiss_manager.huella is None or chunk_ids is None:
+            return None
+        return self.response_cache.obtener(self.faiss_manager.huella, chunk_ids, tipo, tema, tema_vec)
+
+    def _guardar_cache(self, chunk_ids, tipo, tema, questions, answers, tema_vec):
+        if self.response_cache is None or self.faiss_manager.huella is None or chunk_ids is None:
+            return
+        self.response_cache.guardar(self.faiss_manager.huella, chunk_ids, tipo, tema,
+                                    questions, answers, tema_vec)
+
+    def _elegir_contexto_o_texto(self, full_text, documentos, consulta, k, vector=None):
+        """
+        Como `_elegir_contexto`, pero si el índice no se puede usar (p.ej.
+        un índice de disco ilegible) el contexto es el principio del texto,
+        para que la generación local siga funcionando. Si lo que falla son
+        los embeddings, el índice sigue buscando con BM25.
+        """
+        try:
+            return self._elegir_contexto(full_text, documentos, consulta, k, vector)
+        except Exception as e:
+            print(f"No se pudo usar el índice: {e!r}. Usando el principio del texto.")
+            return recortar_tokens(full_text, self.presupuesto_contexto), None
+
+    def _elegir_contexto(self, full_text, documentos, consulta, k, vector=None):
+        """
+        Sincroniza el índice y elige el contenido que irá en el prompt.
+        `vector` es el embedding de `consulta` si ya se tiene.
+        Retorna (contexto, chunk_ids); chunk_ids es None si el contexto no
+        sale de una búsqueda (chunk aleatorio o fallback).
+        """
+        # Sin `documentos` usamos el texto concatenado como un único documento.
+        return self.con_indice(documentos or [full_text],
+                               lambda: self._contexto_del_indice(full_text, consulta, k, vector))
+
+    def con_indice(self, documentos, funcion):
+        """
+        Sincroniza el índice FAISS con `documentos` y devuelve `funcion()`,
+        que lo consulta. Se carga de disco si ya se creó antes y, si no,
+        solo se indexan los nuevos. Todo acceso al índice compartido pasa
+        por aquí (también examen.GeneradorExamen): si ya está sincronizado
+        (lo normal) se consulta en paralelo con otras generaciones; si no,
+        se sincroniza y se consulta sin que nadie más lo toque.
+        """
+        with self._lock_indice.leer():
+            if self.faiss_manager.sincronizado(documentos):
+                return funcion()
+        with self._lock_indice.escribir():
+            with METRICAS.span("sync_documents"):
+                self.faiss_manager.sync_documents(documentos)
+            return funcion()
+
+    def _contexto_del_indice(self, full_text, consulta, k, vector=None):
+        if consulta:
+            # Tomamos los chunks más relevantes para el tema (FAISS + BM25;
+            # sin red para los embeddings, solo BM25) que quepan en el presupuesto
+            with METRICAS.span("busqueda", k=k):
+                relevantes = self.faiss_manager.search_hybrid(consulta, k=k, mmr=True, vector=vector)
+            if relevantes:
+                contexto, usados = empaquetar_contexto([r["text"] for r in relevantes],
+                                                       self.presupuesto_contexto)
+                return contexto, [relevantes[i]["id"] for i in usados]
+
+        # Sin tema: chunks variados del temario (el primero al azar) hasta
+        # llenar el presupuesto de tokens
+        n_candidatos = max(1, self.presupuesto_contexto // max(self.faiss_manager.max_tokens // 2, 1))
+        candidatos = self.faiss_manager.diverse_chunks(n_candidatos)
+        if candidatos:
+            contexto, _ = empaquetar_contexto([c["text"] for c in candidatos], self.presupuesto_contexto)
+            return contexto, None
+        print("No se pudo obtener ningún chunk. Usando el principio del texto.")
+        return recortar_tokens(full_text, self.presupuesto_contexto), None
 
+    def _construir_prompt(self, contexto, tema, tipo, n_preguntas=None):
+        cuantas = f"{n_preguntas or self.preguntas_por_llamada} preguntas"
+        return (
+            f"Genera {cuantas} del tipo '{tipo}' sobre el tema '{tema}' utilizando el siguiente contenido:\n\n"
+            f"{contexto}\n\n"
+            "Formato de salida:\n"
+            "Pregunta: [Aquí va la pregunta]\n"
+            "Respuesta: [Aquí va la respuesta]"
+        )
+
+    def _body_preguntas(self, contexto, tema, tipo, n_preguntas=None):
+        """Body de la petición con `max_tokens` proporcional a las preguntas pedidas."""
+        n_preguntas = n_preguntas or self.preguntas_por_llamada
+        max_tokens = min(4096, 150 + n_preguntas * self.TOKENS_POR_PREGUNTA.get(tipo, 150))
+        return self._body(self._construir_prompt(contexto, tema, tipo, n_preguntas), max_tokens)
+
+    def _body(self, prompt, max_tokens=1000):
+        return json.dumps({
+            "anthropic_version": "bedrock-2023-05-31",
+            "max_tokens": max_tokens,
+            "temperature": 0.7,
+            "messages": [{"role": "user", "content": prompt}]
+        })
+
+    def _parse_questions_and_answers(self, content):
+        """
+        Pares pregunta/respuesta de la respuesta completa de Claude. Usa el
+        mismo IncrementalQAParser que el streaming, así las dos variantes dan
+        lo mismo (una pregunta sin respuesta queda con respuesta "").
+        """
         if isinstance(content, list):
             content = "\n".join([item['text'] for item in content if isinstance(item, dict) and 'text' in item])
+        parser = IncrementalQAParser()
+        pares = parser.feed(content) + parser.close()
+        return [q for q, _ in pares], [a for _, a in pares]
 
-        for line in content.split("\n"):
-            if line.startswith("Pregunta:"):
-                if capturing_answer and current_answer:
-                    answers.append(" ".join(current_answer).strip()) 
-                    current_answer = []
-                questions.append(line.replace("Pregunta:", "").strip())
-                capturing_answer = True 
+class IncrementalQAParser:
+    """
+    Analiza las respuestas de Claude ("Pregunta: ..." / "Respuesta: ...")
+    a trozos, tal como llegan en streaming, y devuelve cada par
+    (pregunta, respuesta) cuando está completo, es decir, cuando empieza la
+    siguiente "Pregunta:" o al cerrar. `_parse_questions_and_answers` lo usa
+    con el texto entero.
+    """
+    def __init__(self):
+        self._buffer = ""      # línea incompleta
+        self._pregunta = None
+        self._respuesta = []
 
-            elif line.startswith("Respuesta:"):
-                current_answer = [line.replace("Respuesta:", "").strip()]
+    def feed(self, texto):
+        """Añade texto y devuelve la lista de pares que se han completado."""
+        self._buffer += texto
+        *lineas, self._buffer = self._buffer.split("\n")
+        completos = []
+        for line in lineas:
+            par = self._linea(line)
+            if par is not None:
+                completos.append(par)
+        return completos
 
-            elif capturing_answer:
-                current_answer.append(line.strip())
+    def close(self):
+        """Procesa lo que queda y devuelve los últimos pares."""
+        completos = []
+        if self._buffer:
+            par = self._linea(self._buffer)
+            self._buffer = ""
+            if par is not None:
+                completos.append(par)
+        if self._pregunta is not None:
+            completos.append((self._pregunta, " ".join(self._respuesta).strip()))
+            self._pregunta, self._respuesta = None, []
+        return completos
 
-        if capturing_answer and current_answer:
-            answers.append(" ".join(current_answer).strip())
+    def _linea(self, line):
+        if line.startswith("Pregunta:"):
+            anterior = None
+            if self._pregunta is not None:
+                anterior = (self._pregunta, " ".join(self._respuesta).strip())
+            self._pregunta = line.replace("Pregunta:", "").strip()
+            self._respuesta = []
+            return anterior
+        elif line.startswith("Respuesta:"):
+            self._respuesta = [line.replace("Respuesta:", "").strip()]
+        elif self._pregunta is not None:
+            self._respuesta.append(line.strip())
+        return None
 
-        return questions, answers
+class _LockLecturaEscritura:
+    """
+    Varios lectores a la vez o un solo escritor. Los escritores que esperan
+    tienen preferencia, así un flujo continuo de búsquedas no deja el índice
+    sin sincronizar. No es reentrante.
+    """
+    def __init__(self):
+        self._condicion = threading.Condition()
+        self._lectores = 0
+        self._escribiendo = False
+        self._escritores_esperando = 0
+
+    @contextmanager
+    def leer(self):
+        with self._condicion:
+            while self._escribiendo or self._escritores_esperando:
+                self._condicion.wait()
+            self._lectores += 1
+        try:
+            yield
+        finally:
+            with self._condicion:
+                self._lectores -= 1
+                if not self._lectores:
+                    self._condicion.notify_all()
+
+    @contextmanager
+    def escribir(self):
+        with self._condicion:
+            self._escritores_esperando += 1
+            while self._escribiendo or self._lectores:
+                self._condicion.wait()
+            self._escritores_esperando -= 1
+            self._escribiendo = True
+        try:
+            yield
+        finally:
+            with self._condicion:
+                self._escribiendo = False
+                self._condicion.notify_all()
@@ -0,0 +1,177 @@
+# cache_respuestas.py
+
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+def normalizar_tema(tema):
+    """Minúsculas, sin tildes, sin signos y con espacios simples."""
+    tema = unicodedata.normalize("NFKD", tema or "")
+    tema = "".join(c for c in tema if not unicodedata.combining(c)).lower()
+    return " ".join(re.sub(r"[^\w\s]", " ", tema).split())
+
+class ResponseCache:
+    """
+    Caché de preguntas/respuestas generadas por Claude.
+
+    Clave: (huella de documentos, ids de los chunks del contexto, tipo,
+    tema normalizado). Opcionalmente, si se pasa el embedding del tema,
+    también acierta con temas parecidos (similitud coseno >= `umbral`)
+    sobre los mismos documentos y tipo.
+
+    - `ttl`: segundos que vale una entrada; `max_entradas`: tamaño (LRU).
+    - `prob_regenerar`: probabilidad de ignorar un acierto para generar
+      preguntas nuevas (variedad). Cada clave guarda hasta `max_variantes`
+      juegos de preguntas y se sirve uno al azar.
+    - `directorio`: nivel en disco (un JSON por clave); None lo desactiva.
+    """
+    def __init__(self, directorio=".cache/respuestas", ttl=7 * 24 * 3600, max_entradas=2000,
+                 umbral=0.9, prob_regenerar=0.0, max_variantes=3):
+        self.directorio = directorio
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self.umbral = umbral
+        self.prob_regenerar = prob_regenerar
+        self.max_variantes = max_variantes
+        self.hits = 0
+        self.hits_semanticos = 0
+        self.misses = 0
+        self._entradas = OrderedDict()  # clave -> entrada (dict)
+        self._lock = threading.Lock()
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+            self._cargar_disco()
+
+    @staticmethod
+    def clave(huella, chunk_ids, tipo, tema):
+        partes = [huella, ",".join(map(str, chunk_ids or [])), tipo, normalizar_tema(tema)]
+        return hashlib.sha256("\x00".join(partes).encode("utf-8")).hexdigest()
+
+    def obtener(self, huella, chunk_ids, tipo, tema, tema_vec=None):
+        """
+        Devuelve (questions, answers) de la caché o None. Con `chunk_ids=None`
+        (contexto al azar) nunca acierta: servir siempre lo mismo quitaría la
+        variedad que busca el contexto aleatorio.
+        """
+        if chunk_ids is None:
+            return None
+        ahora = time.time()
+        with self._lock:
+            entrada = self._vigente(self.clave(huella, chunk_ids, tipo, tema), ahora)
+            if entrada is None:
+                entrada = self._buscar(huella, tipo, tema_vec, ahora)
+            if entrada is None or (self.prob_regenerar and random.random() < self.prob_regenerar):
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entradas.move_to_end(entrada["clave"])
+            questions, answers = random.choice(entrada["variantes"])
+            return list(questions), list(answers)
+
+    def guardar(self, huella, chunk_ids, tipo, tema, questions, answers, tema_vec=None):
+        if not questions or chunk_ids is None:
+            return
+        clave = self.clave(huella, chunk_ids, tipo, tema)
+        with self._lock:
+            entrada = self._vigente(clave, time.time())
+            if entrada is None:
+                entrada = {
+                    "clave": clave,
+                    "huella": huella,
+                    "chunk_ids": list(chunk_ids),
+                    "tipo": tipo,
+                    "tema": normalizar_tema(tema),
+                    "tema_vec": None if tema_vec is None else np.asarray(tema_vec, dtype=np.float32).tolist(),
+                    "variantes": [],
+                }
+            entrada["creado"] = time.time()
+            entrada["variantes"] = (entrada["variantes"] + [[list(questions), list(answers)]])[-self.max_variantes:]
+            self._entradas[clave] = entrada
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                vieja, _ = self._entradas.popitem(last=False)
+                self._borrar_disco(vieja)
+        self._escribir_disco(entrada)
+
+    def estadisticas(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "hits_semanticos": self.hits_semanticos,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entradas": len(self._entradas),
+        }
+
+    def _vigente(self, clave, ahora):
+        entrada = self._entradas.get(clave)
+        if entrada is not None and ahora - entrada["creado"] > self.ttl:
+            del self._entradas[clave]
+            self._borrar_disco(clave)
+            return None
+        return entrada
+
+    def _buscar(self, huella, tipo, tema_vec, ahora):
+        """Busca por tema parecido (embedding) sobre los mismos documentos y tipo."""
+        if tema_vec is None:
+            return None
+        tema_vec = np.asarray(tema_vec, dtype=np.float32)
+        tema_vec = tema_vec / (np.linalg.norm(tema_vec) or 1.0)
+        mejor, mejor_sim = None, self.umbral
+        for clave in list(self._entradas):
+            entrada = self._vigente(clave, ahora)
+            if entrada is None or entrada["huella"] != huella or entrada["tipo"] != tipo:
+                continue
+            if entrada["tema_vec"] is not None:
+                vec = np.asarray(entrada["tema_vec"], dtype=np.float32)
+                sim = float(vec @ tema_vec) / (np.linalg.norm(vec) or 1.0)
+                if sim >= mejor_sim:
+                    mejor, mejor_sim = entrada, sim
+        if mejor is not None:
+            self.hits_semanticos += 1
+        return mejor
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, clave + ".json")
+
+    def _escribir_disco(self, entrada):
+        if not self.directorio:
+            return
+        ruta = self._ruta(entrada["clave"])
+        tmp = ruta + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entrada, f, ensure_ascii=False)
+        os.replace(tmp, ruta)
+
+    def _borrar_disco(self, clave):
+        if self.directorio:
+            try:
+                os.remove(self._ruta(clave))
+            except OSError:
+                pass
+
+    def _cargar_disco(self):
+        ahora = time.time()
+        entradas = []
+        for fichero in os.listdir(self.directorio):
+            if not fichero.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directorio, fichero), "r", encoding="utf-8") as f:
+                    entrada = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if ahora - entrada.get("creado", 0) <= self.ttl:
+                entradas.append(entrada)
+            else:
+                self._borrar_disco(fichero[:-len(".json")])
+        for entrada in sorted(entradas, key=lambda e: e["creado"])[-self.max_entradas:]:
+            self._entradas[entrada["clave"]] = entrada
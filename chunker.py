@@ -0,0 +1,144 @@
+# chunker.py
+
+import re
+
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+_PARRAFO = re.compile(r"\n\s*\n")
+# Fin de frase: . ! ? ; seguido de espacio y de mayúscula, número o signo de apertura
+_FRASE = re.compile(r"(?<=[.!?;])\s+(?=[A-ZÁÉÍÓÚÑ¿¡\"«(0-9])")
+
+def estimar_tokens(texto):
+    """Aproximación barata del número de tokens (palabras + signos)."""
+    return len(_TOKEN.findall(texto))
+
+def _frases(texto, inicio, fin):
+    """
+    Trozos (inicio, fin) de texto[inicio:fin] cortados por párrafos
+    y frases, sin incluir los espacios de los bordes.
+    """
+    for parrafo in _segmentos(texto, inicio, fin, _PARRAFO):
+        yield from _segmentos(texto, parrafo[0], parrafo[1], _FRASE)
+
+def _segmentos(texto, inicio, fin, separador):
+    pos = inicio
+    for m in separador.finditer(texto, inicio, fin):
+        yield from _recortar(texto, pos, m.start())
+        pos = m.end()
+    yield from _recortar(texto, pos, fin)
+
+def _recortar(texto, inicio, fin):
+    while inicio < fin and texto[inicio].isspace():
+        inicio += 1
+    while fin > inicio and texto[fin - 1].isspace():
+        fin -= 1
+    if fin > inicio:
+        yield inicio, fin
+
+def _partir(texto, inicio, fin, max_tokens, max_chars):
+    """Parte una frase demasiado larga por palabras."""
+    trozo_inicio = inicio
+    tokens = 0
+    for m in re.finditer(r"\S+", texto[inicio:fin]):
+        a, b = inicio + m.start(), inicio + m.end()
+        t = estimar_tokens(m.group())
+        if tokens and (tokens + t > max_tokens or b - trozo_inicio > max_chars):
+            yield trozo_inicio, prev_fin, tokens
+            trozo_inicio, tokens = a, 0
+        # Una "palabra" más larga que max_chars (p.ej. una URL enorme) se corta a lo bruto
+        while b - trozo_inicio > max_chars:
+            yield trozo_inicio, trozo_inicio + max_chars, estimar_tokens(texto[trozo_inicio:trozo_inicio + max_chars])
+            trozo_inicio = a = trozo_inicio + max_chars
+            t = estimar_tokens(texto[a:b])
+        tokens += t
+        prev_fin = b
+    if tokens:
+        yield trozo_inicio, prev_fin, tokens
+
+def chunk_documento(texto, limites=None, max_tokens=400, overlap_tokens=40, max_chars=2048):
+    """
+    Divide un documento en chunks respetando párrafos, frases y páginas.
+
+    texto:   texto completo del documento.
+    limites: offsets de inicio de cada página/diapositiva en `texto`
+             (None = una sola página).
+    Cada chunk acumula frases completas hasta `max_tokens` (y nunca más de
+    `max_chars` caracteres, el límite de Cohere). Se cierra también al
+    cambiar de página si ya va por la mitad del presupuesto, para no mezclar
+    páginas sin necesidad; las páginas cortas (diapositivas) se agrupan.
+    Las últimas frases de un chunk (hasta `overlap_tokens`) se repiten al
+    principio del siguiente.
+
+    Retorna: lista de (inicio, fin, pagina) con offsets en `texto`;
+    el texto del chunk es texto[inicio:fin].
+    """
+    limites = list(limites) if limites else [0]
+    fronteras = limites[1:] + [len(texto)]
+
+    # 1) Frases de todas las páginas: (inicio, fin, tokens, pagina)
+    frases = []
+    for pagina, (a, b) in enumerate(zip(limites, fronteras)):
+        for inicio, fin in _frases(texto, a, b):
+            tokens = estimar_tokens(texto[inicio:fin])
+            if tokens > max_tokens or fin - inicio > max_chars:
+                frases.extend((x, y, t, pagina) for x, y, t in _partir(texto, inicio, fin, max_tokens, max_chars))
+            else:
+                frases.append((inicio, fin, tokens, pagina))
+
+    # 2) Empaquetar frases en chunks
+    chunks = []
+    actual = []  # frases del chunk en curso
+    tokens = 0
+
+    def cerrar():
+        chunks.append((actual[0][0], actual[-1][1], actual[0][3]))
+
+    for frase in frases:
+        inicio, fin, t, pagina = frase
+        if actual:
+            cambio_pagina = pagina != actual[-1][3] and tokens >= max_tokens // 2
+            excede = tokens + t > max_tokens or fin - actual[0][0] > max_chars
+            if cambio_pagina or excede:
+                cerrar()
+                # Solapamiento: arrastramos las últimas frases (de la misma página),
+                # nunca el chunk entero
+                solape, t_solape = [], 0
+                if overlap_tokens and not cambio_pagina:
+                    for previa in reversed(actual[1:]):
+                        if t_solape + previa[2] > overlap_tokens or fin - previa[0] > max_chars:
+                            break
+                        solape.insert(0, previa)
+                        t_solape += previa[2]
+                    if t_solape + t > max_tokens:
+                        solape, t_solape = [], 0
+                actual, tokens = solape, t_solape
+        actual.append(frase)
+        tokens += t
+
+    if actual:
+        cerrar()
+    return chunks
+
+def recortar_tokens(texto, max_tokens):
+    """Prefijo de `texto` con como mucho `max_tokens` tokens (cortando en un token entero)."""
+    for i, m in enumerate(_TOKEN.finditer(texto)):
+        if i == max_tokens:
+            return texto[:m.start()].rstrip()
+    return texto
+
+def empaquetar_contexto(textos, presupuesto_tokens, separador="\n\n"):
+    """
+    Elige, en el orden dado (p.ej. de más a menos relevante), los textos
+    que caben en `presupuesto_tokens`; los que no caben se saltan y se
+    prueba con los siguientes. Si ni el primero cabe, se recorta.
+
+    Retorna (contexto, posiciones de los textos usados).
+    """
+    elegidos, usados = [], 0
+    for i, texto in enumerate(textos):
+        tokens = estimar_tokens(texto)
+        if usados + tokens <= presupuesto_tokens:
+            elegidos.append(i)
+            usados += tokens
+    if not elegidos and textos:
+        return recortar_tokens(textos[0], presupuesto_tokens), [0]
+    return separador.join(textos[i] for i in elegidos), elegidos
@@ -0,0 +1,91 @@
+# datos_sinteticos.py
+#
+# Documentos de prueba generados al azar (con semilla): texto por páginas y
+# los mismos en PDF, DOCX o PPTX. Los usan benchmark_pipeline.py y tests/.
+
+import io
+import random
+
+PALABRAS = (
+    "sistema proceso memoria datos modelo red capa entrada salida funcion valor tiempo "
+    "articulo ley derecho norma tribunal estado principio fuente capital mercado precio "
+    "energia fuerza masa velocidad celula gen proteina reaccion acido enzima historia "
+    "siglo guerra reino imperio autor obra teoria metodo analisis resultado variable"
+).split()
+
+def frase(rng):
+    n = rng.randint(8, 20)
+    texto = " ".join(rng.choice(PALABRAS) for _ in range(n))
+    return texto.capitalize() + " " + str(rng.randint(1, 300)) + "."
+
+def paginas_sinteticas(n_paginas, frases_por_pagina=25, seed=0):
+    """Lista de páginas de texto (solo ASCII, para que el PDF sea trivial)."""
+    rng = random.Random(seed)
+    return [" ".join(frase(rng) for _ in range(frases_por_pagina)) for _ in range(n_paginas)]
+
+def _lineas(texto, ancho=90):
+    linea = ""
+    for palabra in texto.split():
+        if linea and len(linea) + len(palabra) + 1 > ancho:
+            yield linea
+            linea = palabra
+        else:
+            linea = f"{linea} {palabra}" if linea else palabra
+    if linea:
+        yield linea
+
+def crear_pdf(paginas):
+    """PDF mínimo (una fuente Helvetica, texto plano por página) escrito a mano."""
+    objetos = []  # cuerpo de cada objeto; el número es la posición + 1
+    n = len(paginas)
+    ids_pagina = [4 + 2 * i for i in range(n)]
+    objetos.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    kids = " ".join(f"{i} 0 R" for i in ids_pagina)
+    objetos.append(f"<< /Type /Pages /Kids [{kids}] /Count {n} >>".encode())
+    objetos.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for i, texto in enumerate(paginas):
+        lineas = "".join(
+            "(" + l.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ") Tj T* "
+            for l in _lineas(texto)
+        )
+        contenido = f"BT /F1 10 Tf 12 TL 40 800 Td {lineas}ET".encode("latin-1")
+        objetos.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {ids_pagina[i] + 1} 0 R >>".encode()
+        )
+        objetos.append(b"<< /Length %d >>\nstream\n" % len(contenido) + contenido + b"\nendstream")
+
+    salida = io.BytesIO()
+    salida.write(b"%PDF-1.4\n")
+    offsets = []
+    for numero, cuerpo in enumerate(objetos, start=1):
+        offsets.append(salida.tell())
+        salida.write(b"%d 0 obj\n" % numero + cuerpo + b"\nendobj\n")
+    xref = salida.tell()
+    salida.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objetos) + 1))
+    for offset in offsets:
+        salida.write(b"%010d 00000 n \n" % offset)
+    salida.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objetos) + 1, xref))
+    return salida.getvalue()
+
+def crear_docx(paginas):
+    from docx import Document
+    doc = Document()
+    for texto in paginas:
+        for parrafo in texto.split(". "):
+            doc.add_paragraph(parrafo)
+    salida = io.BytesIO()
+    doc.save(salida)
+    return salida.getvalue()
+
+def crear_pptx(paginas):
+    from pptx import Presentation
+    from pptx.util import Inches
+    presentacion = Presentation()
+    for texto in paginas:
+        slide = presentacion.slides.add_slide(presentacion.slide_layouts[6])
+        caja = slide.shapes.add_textbox(Inches(0.5), Inches(0.5), Inches(9), Inches(6))
+        caja.text_frame.text = texto[:1500]  # una diapositiva lleva menos texto
+    salida = io.BytesIO()
+    presentacion.save(salida)
+    return salida.getvalue()
@@ -0,0 +1,99 @@
+# dedup.py
+
+import zlib
+
+import numpy as np
+
+from bm25 import tokenizar
+
+# Primo < 2^32: (a * h + b) cabe en uint64 con a, b, h < _PRIMO
+_PRIMO = np.uint64(4294967291)
+
+def shingles(texto, n=4):
+    """Grupos de `n` palabras seguidas (normalizadas como en BM25), como hashes de 32 bits."""
+    palabras = tokenizar(texto)
+    if not palabras:
+        return set()
+    if len(palabras) < n:
+        return {zlib.crc32(" ".join(palabras).encode("utf-8"))}
+    return {zlib.crc32(" ".join(palabras[i:i + n]).encode("utf-8")) for i in range(len(palabras) - n + 1)}
+
+class Deduplicador:
+    """
+    Detección de chunks casi repetidos con MinHash + LSH.
+
+    Cada chunk se resume en una firma de `num_perm` mínimos de hash sobre
+    sus shingles; la fracción de posiciones iguales entre dos firmas estima
+    la similitud de Jaccard. Las firmas se reparten en `bandas` bandas y
+    solo se comparan los chunks que coinciden en alguna (LSH), así buscar
+    no depende del número de chunks indexados.
+
+    Un chunk es duplicado de otro si la similitud estimada es >= `umbral`
+    (p.ej. la misma diapositiva exportada a PPTX y a PDF, o una versión
+    nueva de unos apuntes con pocos cambios).
+    """
+    def __init__(self, umbral=0.8, num_perm=128, bandas=32, n_shingle=4, seed=1):
+        if num_perm % bandas:
+            raise ValueError("num_perm debe ser múltiplo de bandas")
+        self.umbral = umbral
+        self.num_perm = num_perm
+        self.bandas = bandas
+        self.filas = num_perm // bandas
+        self.n_shingle = n_shingle
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, int(_PRIMO), num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, int(_PRIMO), num_perm, dtype=np.uint64)
+        self._firmas = {}   # chunk_id -> firma
+        self._cubos = {}    # (banda, bytes de la banda) -> set de chunk_ids
+
+    def __len__(self):
+        return len(self._firmas)
+
+    def firma(self, texto):
+        """Firma MinHash de `texto` (None si no tiene palabras)."""
+        hashes = shingles(texto, self.n_shingle)
+        if not hashes:
+            return None
+        h = np.fromiter(hashes, dtype=np.uint64, count=len(hashes)) % _PRIMO
+        return ((self._a[:, None] * h[None, :] + self._b[:, None]) % _PRIMO).min(axis=1)
+
+    def buscar(self, firma):
+        """(chunk_id, similitud) del chunk indexado más parecido por encima del umbral, o None."""
+        if firma is None:
+            return None
+        candidatos = set()
+        for clave in self._claves(firma):
+            candidatos.update(self._cubos.get(clave, ()))
+        mejor = None
+        for chunk_id in candidatos:
+            similitud = float(np.mean(self._firmas[chunk_id] == firma))
+            if similitud >= self.umbral and (mejor is None or similitud > mejor[1]):
+                mejor = (chunk_id, similitud)
+        return mejor
+
+    def agregar(self, chunk_id, firma):
+        if firma is None:
+            return
+        self._firmas[chunk_id] = firma
+        for clave in self._claves(firma):
+            self._cubos.setdefault(clave, set()).add(chunk_id)
+
+    def agregar_textos(self, chunk_ids, textos):
+        for chunk_id, texto in zip(chunk_ids, textos):
+            self.agregar(chunk_id, self.firma(texto))
+
+    def eliminar(self, chunk_ids):
+        for chunk_id in chunk_ids:
+            firma = self._firmas.pop(chunk_id, None)
+            if firma is None:
+                continue
+            for clave in self._claves(firma):
+                cubo = self._cubos.get(clave)
+                if cubo is not None:
+                    cubo.discard(chunk_id)
+                    if not cubo:
+                        del self._cubos[clave]
+
+    def _claves(self, firma):
+        return [(banda, firma[banda * self.filas:(banda + 1) * self.filas].tobytes())
+                for banda in range(self.bandas)]
@@ -1,58 +1,161 @@
 # documentos.py
 
-from PyPDF2 import PdfReader
-from docx import Document
-from pptx import Presentation
+import time
+from array import array
+
+from extraccion import (
+    iter_texto, iter_paginas_pdf, iter_parrafos_docx, iter_diapositivas_pptx, extraer_documentos,
+    huella_bytes, limpiar_paginas, CACHE_EXTRACCION,
+)
+from metricas import METRICAS, recolector_cache
+
+METRICAS.registrar_recolector(recolector_cache("extraccion", CACHE_EXTRACCION))
 
 class DocumentUploader:
-    def __init__(self):
+    def __init__(self, cache=CACHE_EXTRACCION):
         self.documents = []
+        self.hashes = []   # hash del archivo de cada documento (misma posición que documents)
+        self.nombres = []  # nombre del archivo de cada documento
+        self.limites = []  # offsets de inicio de cada página/diapositiva en el texto
+        self.cache = cache  # caché de extracción (None la desactiva)
+        self.duplicados = 0
 
     def add_document(self, file):
         """Leer documento y guardar su texto"""
         try:
-            if file.name.endswith(".pdf"):
-                text = self._extract_text_from_pdf(file)
-            elif file.name.endswith(".docx"):
-                text = self._extract_text_from_docx(file)
-            elif file.name.endswith(".pptx"):
-                text = self._extract_text_from_pptx(file)
-            else:
-                raise ValueError("Formato de archivo no soportado.")
-            self.documents.append(text)
+            with METRICAS.span("extraccion", formato=file.name.rsplit(".", 1)[-1]) as span:
+                datos = self._leer_bytes(file)
+                span["bytes"] = len(datos)
+                huella = huella_bytes(datos)
+                if huella in self.hashes:
+                    # Mismo archivo ya cargado (p.ej. en un rerun de Streamlit)
+                    self.duplicados += 1
+                    span["duplicado"] = True
+                    return
+                unidades = self.cache.obtener(huella) if self.cache is not None else None
+                span["cache"] = unidades is not None
+                if unidades is None:
+                    t0 = time.perf_counter()
+                    unidades = list(iter_texto(file.name, datos))
+                    if self.cache is not None:
+                        self.cache.guardar(huella, unidades, time.perf_counter() - t0)
+                self._registrar(file.name, huella, unidades)
+                span["unidades"] = len(unidades)
+                span["caracteres"] = len(self.documents[-1])
+                METRICAS.contador("extraccion_bytes_total", len(datos))
+                METRICAS.contador("extraccion_caracteres_total", len(self.documents[-1]))
         except Exception as e:
             raise ValueError(f"Error al procesar el archivo {file.name}: {e}")
 
+    def add_documents(self, files, max_workers=None):
+        """
+        Leer varios documentos en paralelo (pool de procesos).
+        Los archivos ya cargados se ignoran y los que están en la caché de
+        extracción no se vuelven a procesar.
+        Retorna una lista de (nombre, error) con error=None si se cargó bien.
+        """
+        resultado = []
+        pendientes = []  # (nombre, datos, huella)
+        for file in files:
+            datos = self._leer_bytes(file)
+            huella = huella_bytes(datos)
+            if huella in self.hashes or any(h == huella for _, _, h in pendientes):
+                self.duplicados += 1
+                resultado.append((file.name, None))
+                continue
+            unidades = self.cache.obtener(huella) if self.cache is not None else None
+            if unidades is not None:
+                self._registrar(file.name, huella, unidades)
+                resultado.append((file.name, None))
+            else:
+                pendientes.append((file.name, datos, huella))
+
+        archivos = [(nombre, datos) for nombre, datos, _ in pendientes]
+        if not archivos:
+            return resultado
+        with METRICAS.span("extraccion_lote", archivos=len(archivos),
+                           bytes=sum(len(datos) for _, datos in archivos)) as span:
+            span["errores"] = 0
+            # Cada documento se registra en cuanto está extraído, sin esperar al resto
+            extraidos = extraer_documentos(archivos, max_workers=max_workers)
+            for (_, _, huella), (nombre, unidades, error, segundos) in zip(pendientes, extraidos):
+                if error is None:
+                    if self.cache is not None:
+                        self.cache.guardar(huella, unidades, segundos)
+                    self._registrar(nombre, huella, unidades)
+                    METRICAS.contador("extraccion_caracteres_total", len(self.documents[-1]))
+                    METRICAS.observar("extraccion_archivo_segundos", segundos)
+                    resultado.append((nombre, None))
+                else:
+                    span["errores"] += 1
+                    resultado.append((nombre, ValueError(f"Error al procesar el archivo {nombre}: {error}")))
+        METRICAS.contador("extraccion_bytes_total", span["bytes"])
+        return resultado
+
+    def sincronizar(self, files, max_workers=None):
+        """
+        Deja cargados exactamente estos archivos: quita los documentos cuyo
+        archivo ya no está y añade los nuevos. Pensado para un DocumentUploader
+        que vive en la sesión de Streamlit entre reruns.
+        """
+        actuales = {huella_bytes(self._leer_bytes(file)) for file in files}
+        for i in reversed(range(len(self.hashes))):
+            if self.hashes[i] not in actuales:
+                self.remove_document(i)
+        return self.add_documents(files, max_workers=max_workers)
+
+    def remove_document(self, posicion):
+        """Quitar el documento en la posición indicada"""
+        for lista in (self.documents, self.hashes, self.nombres, self.limites):
+            del lista[posicion]
+
+    def _registrar(self, nombre, huella, unidades):
+        """Guarda el texto de un documento y dónde empieza cada página."""
+        if nombre.lower().endswith(".pdf"):
+            # Sin números de página ni cabeceras/pies repetidos: no aportan
+            # nada a las preguntas y gastan tokens en cada prompt
+            unidades = limpiar_paginas(unidades)
+        limites = array('q')
+        offset = 0
+        for unidad in unidades:
+            limites.append(offset)
+            offset += len(unidad) + 1
+        # Unimos las páginas/diapositivas al final (evita el `text +=` cuadrático)
+        self.documents.append("\n".join(unidades))
+        self.hashes.append(huella)
+        self.nombres.append(nombre)
+        self.limites.append(limites)
+
+    def _leer_bytes(self, file):
+        """Contenido del archivo en bytes (UploadedFile de Streamlit o fichero abierto)."""
+        if hasattr(file, "getvalue"):
+            return file.getvalue()
+        file.seek(0)
+        return file.read()
+
     def _extract_text_from_pdf(self, file):
         """Extraer texto de un archivo PDF"""
-        from PyPDF2 import PdfReader
-        reader = PdfReader(file)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() or ""  # Agrega el texto extraído de cada página
-        return text
+        return "\n".join(iter_paginas_pdf(file))
 
     def _extract_text_from_docx(self, file):
         """Extraer texto de un archivo DOCX"""
-        from docx import Document
-        doc = Document(file)
-        return "\n".join([para.text for para in doc.paragraphs])
+        return "\n".join(iter_parrafos_docx(file))
 
     def _extract_text_from_pptx(self, file):
         """Extraer texto de un archivo PPTX"""
-        from pptx import Presentation
-        presentation = Presentation(file)
-        text = ""
-        for slide in presentation.slides:
-            for shape in slide.shapes:
-                if shape.has_text_frame:
-                    text += shape.text + "\n"
-        return text
+        return "\n".join(iter_diapositivas_pptx(file))
 
     def get_documents(self):
         """Retornar lista de documentos cargados"""
         return self.documents
 
+    def get_documents_info(self):
+        """Documentos con su nombre y los límites de página, para FAISSManager"""
+        return [
+            {"nombre": nombre, "texto": texto, "paginas": limites}
+            for nombre, texto, limites in zip(self.nombres, self.documents, self.limites)
+        ]
+
     def get_concatenated_text(self):
         """Concatenar texto de todos los documentos"""
-        return " ".join(self.documents)
\ No newline at end of file
+        return " ".join(self.documents)
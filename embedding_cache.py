@@ -0,0 +1,276 @@
+# embedding_cache.py
+
+import atexit
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Cada fila del fichero guarda el sha256 de su clave junto al vector
+_BYTES_CLAVE = 32
+
+@contextmanager
+def _bloqueo_entre_procesos(ruta):
+    """Bloqueo exclusivo sobre el fichero `ruta`, compartido por todos los procesos."""
+    with open(ruta, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+class EmbeddingCache:
+    """
+    Caché persistente de embeddings direccionada por contenido.
+
+    Cada entrada se identifica por el hash del texto del chunk junto con el
+    modelo y el `input_type`. Los vectores se guardan en un fichero mapeado
+    en memoria (`embeddings.bin`), cada uno en una fila junto al hash de su
+    clave, y el orden LRU en `index.json`. Cuando se supera `max_entradas`
+    se expulsa la entrada menos usada y se reutiliza su fila.
+
+    La clave guardada en la fila es la que vale: se comprueba al leer, así
+    una fila reutilizada (por LRU antes de un `flush`, o por otro proceso)
+    nunca devuelve el vector de otro texto. Las escrituras se hacen con un
+    bloqueo entre procesos, de modo que la app y procesar_directorio.py
+    pueden compartir el mismo directorio.
+    """
+    # Versión de los ficheros; con otra, la caché se reinicia
+    FORMATO = 2
+
+    def __init__(self, directorio=".cache/embeddings", max_entradas=50000):
+        self.directorio = directorio
+        self.max_entradas = max_entradas
+        self.hits = 0
+        self.misses = 0
+        self.dim = None
+
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()  # clave -> fila (la última es la más reciente)
+        self._libres = []               # filas del fichero que no están en uso
+        self._filas = None              # np.memmap de (clave, vector), ver `_tipo_fila`
+        self._capacidad = 0
+        self._sucio = False
+
+        os.makedirs(directorio, exist_ok=True)
+        self._ruta_indice = os.path.join(directorio, "index.json")
+        self._ruta_filas = os.path.join(directorio, "embeddings.bin")
+        self._ruta_bloqueo = os.path.join(directorio, ".lock")
+        with _bloqueo_entre_procesos(self._ruta_bloqueo):
+            self._cargar()
+        atexit.register(self.flush)
+
+    @staticmethod
+    def clave(texto, modelo, input_type):
+        """Hash del contenido que identifica un embedding."""
+        h = hashlib.sha256()
+        h.update(modelo.encode("utf-8"))
+        h.update(b"\x00")
+        h.update(input_type.encode("utf-8"))
+        h.update(b"\x00")
+        h.update(texto.encode("utf-8"))
+        return h.hexdigest()
+
+    def obtener(self, claves):
+        """
+        Devuelve una lista con el vector (np.float32) de cada clave,
+        o None en las posiciones que no están en caché.
+        """
+        resultado = []
+        with self._lock:
+            for clave in claves:
+                fila = self._entradas.get(clave)
+                vector = None
+                if fila is not None:
+                    # Primero el vector y después la clave: si otro proceso
+                    # reescribe la fila mientras tanto, la clave ya no coincide
+                    vector = np.array(self._filas["vector"][fila])
+                    if self._filas["clave"][fila].tobytes() != bytes.fromhex(clave):
+                        del self._entradas[clave]
+                        vector = None
+                if vector is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+                    self._entradas.move_to_end(clave)
+                resultado.append(vector)
+        return resultado
+
+    def guardar(self, claves, vectores):
+        """Guarda los vectores (N, dim) asociados a cada clave (de `EmbeddingCache.clave`)."""
+        vectores = np.asarray(vectores, dtype=np.float32)
+        if len(claves) == 0:
+            return
+        with self._lock, _bloqueo_entre_procesos(self._ruta_bloqueo):
+            if self.dim != vectores.shape[1]:
+                # Puede que otro proceso la haya creado después de abrirla nosotros
+                self._cargar()
+                if self.dim != vectores.shape[1]:
+                    self._reiniciar(vectores.shape[1])
+            for clave, vector in zip(claves, vectores):
+                digest = np.frombuffer(bytes.fromhex(clave), dtype=np.uint8)
+                fila = self._entradas.get(clave)
+                if fila is None or not np.array_equal(self._filas["clave"][fila], digest):
+                    self._entradas.pop(clave, None)
+                    fila = self._reservar_fila()
+                    self._entradas[clave] = fila
+                else:
+                    self._entradas.move_to_end(clave)
+                # Se borra la clave antes de escribir el vector y se pone al final:
+                # si el proceso muere a medias, la fila no casa con ninguna clave
+                self._filas["clave"][fila] = 0
+                self._filas["vector"][fila] = vector
+                self._filas["clave"][fila] = digest
+            self._sucio = True
+
+    def flush(self):
+        """Escribe a disco los vectores y el orden LRU si hay cambios pendientes."""
+        with self._lock:
+            if not self._sucio or self._filas is None:
+                return
+            with _bloqueo_entre_procesos(self._ruta_bloqueo):
+                self._filas.flush()
+                self._escribir_indice()
+            self._sucio = False
+
+    def estadisticas(self):
+        """Contadores de aciertos y fallos para medir el ahorro de llamadas."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entradas": len(self._entradas),
+        }
+
+    def _tipo_fila(self):
+        return np.dtype([("clave", np.uint8, (_BYTES_CLAVE,)), ("vector", np.float32, (self.dim,))])
+
+    def _escribir_indice(self):
+        datos = {"formato": self.FORMATO, "dim": self.dim, "entradas": list(self._entradas)}
+        tmp = self._ruta_indice + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(datos, f)
+        os.replace(tmp, self._ruta_indice)
+
+    def _cargar(self):
+        """
+        Mapea el fichero de filas y rehace clave -> fila con las claves de
+        cada fila. De `index.json` solo se toma el orden LRU: si el proceso
+        murió sin `flush`, las filas escritas después siguen valiendo.
+        """
+        self.dim = None
+        self._entradas = OrderedDict()
+        self._libres = []
+        self._filas = None
+        self._capacidad = 0
+        if not (os.path.exists(self._ruta_indice) and os.path.exists(self._ruta_filas)):
+            return
+        try:
+            with open(self._ruta_indice, "r", encoding="utf-8") as f:
+                datos = json.load(f)
+            if datos.get("formato") != self.FORMATO:
+                raise ValueError(f"formato {datos.get('formato')}, se esperaba {self.FORMATO}")
+            dim, orden = datos["dim"], datos["entradas"]
+        except (ValueError, KeyError, OSError) as e:
+            print(f"Caché de embeddings inválida, se reinicia: {e}")
+            return
+
+        self.dim = dim
+        capacidad = os.path.getsize(self._ruta_filas) // self._tipo_fila().itemsize
+        if not capacidad:
+            return
+        self._filas = np.memmap(self._ruta_filas, dtype=self._tipo_fila(), mode="r+", shape=(capacidad,))
+        self._capacidad = capacidad
+        claves = self._filas["clave"]
+        por_clave = {}
+        for fila in np.flatnonzero(claves.any(axis=1)):
+            clave = claves[fila].tobytes().hex()
+            if clave in por_clave:
+                claves[fila] = 0  # dos procesos guardaron el mismo texto
+            else:
+                por_clave[clave] = int(fila)
+        # Orden de index.json; las guardadas después del último flush, al final
+        self._entradas = OrderedDict((clave, por_clave.pop(clave)) for clave in orden if clave in por_clave)
+        self._entradas.update(por_clave)
+        self._libres = [int(fila) for fila in np.flatnonzero(~claves.any(axis=1))[::-1]]
+
+        # Si se ha reducido max_entradas, expulsamos las más antiguas
+        while len(self._entradas) > self.max_entradas:
+            _, fila = self._entradas.popitem(last=False)
+            claves[fila] = 0
+            self._libres.append(fila)
+
+    def _reiniciar(self, dim):
+        """Vacía la caché (p.ej. al cambiar la dimensión de los embeddings)."""
+        self.dim = dim
+        self._entradas.clear()
+        self._libres = []
+        self._capacidad = 0
+        self._filas = None
+        # vectors.f32 es el fichero del formato anterior
+        for ruta in (self._ruta_filas, os.path.join(self.directorio, "vectors.f32")):
+            if os.path.exists(ruta):
+                os.remove(ruta)
+        self._crecer()
+        # index.json ya con la dimensión, para que otros procesos no la reinicien
+        self._escribir_indice()
+
+    def _reservar_fila(self):
+        """
+        Devuelve una fila libre, creciendo el fichero o expulsando por LRU.
+        Una fila libre para nosotros pero con clave es de otro proceso: se
+        adopta como entrada (su vector es válido) y se busca otra.
+        """
+        while True:
+            while self._libres:
+                fila = self._libres.pop()
+                digest = self._filas["clave"][fila]
+                if not digest.any():
+                    return fila
+                clave = digest.tobytes().hex()
+                if clave not in self._entradas and len(self._entradas) < self.max_entradas:
+                    self._entradas[clave] = fila
+                    self._entradas.move_to_end(clave, last=False)
+            if self._capacidad < self.max_entradas:
+                self._crecer()
+            else:
+                _, fila = self._entradas.popitem(last=False)
+                return fila
+
+    def _crecer(self):
+        """
+        Duplica la capacidad del fichero (hasta `max_entradas`). Si otro
+        proceso ya lo ha hecho crecer más, se mapea entero.
+        """
+        tipo = self._tipo_fila()
+        nueva = min(max(1024, self._capacidad * 2), self.max_entradas)
+        if self._filas is not None:
+            self._filas.flush()
+        self._filas = None
+        with open(self._ruta_filas, "ab") as f:
+            existentes = f.seek(0, os.SEEK_END) // tipo.itemsize
+            if existentes < nueva:
+                f.truncate(nueva * tipo.itemsize)
+        nueva = max(nueva, existentes)
+        self._filas = np.memmap(self._ruta_filas, dtype=tipo, mode="r+", shape=(nueva,))
+        self._libres.extend(range(nueva - 1, self._capacidad - 1, -1))
+        self._capacidad = nueva
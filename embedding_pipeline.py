@@ -0,0 +1,187 @@
+# embedding_pipeline.py
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from metricas import METRICAS
+
+# Códigos de error de Bedrock que indican que debemos frenar y reintentar
+ERRORES_REINTENTABLES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+    "InternalServerException",
+}
+
+def es_throttling(error):
+    """True si la excepción es un error de Bedrock que merece reintento."""
+    respuesta = getattr(error, "response", None)
+    if isinstance(respuesta, dict):
+        codigo = respuesta.get("Error", {}).get("Code", "")
+        if codigo in ERRORES_REINTENTABLES:
+            return True
+    return type(error).__name__ in ERRORES_REINTENTABLES
+
+class TokenBucket:
+    """
+    Limitador de ritmo: `rate` peticiones por segundo con ráfagas de
+    hasta `capacity`. `acquire` bloquea hasta que hay un token.
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, rate))
+        self._tokens = self.capacity
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, n=1):
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (ahora - self._ultimo) * self.rate)
+                self._ultimo = ahora
+                if self._tokens >= n:
+                    self._tokens -= n
+                    return
+                espera = (n - self._tokens) / self.rate
+            time.sleep(espera)
+
+class EmbeddingPipeline:
+    """
+    Genera embeddings de muchos textos lanzando varios lotes a la vez.
+
+    - Los lotes se ejecutan en un pool de hilos acotado (`max_workers`).
+    - La concurrencia efectiva es adaptativa (AIMD): sube gradualmente con
+      los lotes correctos y se reduce a la mitad cuando Bedrock responde con
+      throttling.
+    - Un token bucket limita las peticiones por segundo.
+    - Los errores de throttling se reintentan con backoff exponencial y jitter.
+    - Los resultados se devuelven en el mismo orden que los textos, escritos
+      directamente en un único array reservado de antemano (sin concatenar
+      los lotes al final, que duplicaría el pico de memoria).
+    - El rendimiento se consulta con `estadisticas()` y queda en las métricas
+      (`embedding_lote_segundos`, `embedding_reintentos_total`).
+
+    `embed_fn(textos)` debe devolver un np.array (len(textos), dim), p.ej.
+    `FAISSManager.generate_embeddings`.
+    """
+    def __init__(self, embed_fn, batch_size=16, max_workers=8, min_workers=1,
+                 rate=20.0, max_retries=6, backoff_base=0.5, backoff_max=20.0):
+        self.embed_fn = embed_fn
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.min_workers = min_workers
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limiter = TokenBucket(rate) if rate else None
+
+        self._limite = float(max(min_workers, max_workers // 2 or 1))
+        self._en_curso = 0
+        self._cond = threading.Condition()
+
+        self._latencias = []
+        self._chunks = 0
+        self._segundos = 0.0
+        self.reintentos = 0
+
+    def embed(self, texts, out=None):
+        """
+        Devuelve los embeddings de `texts` en orden, shape (len(texts), dim).
+        `out` es un array float32 (len(texts), dim) ya reservado donde
+        escribirlos; si no se pasa, se reserva al llegar el primer lote.
+        """
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        buffer = _Buffer(len(texts), out)
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futuros = [
+                pool.submit(self._procesar_lote, texts[i:i + self.batch_size], i, buffer)
+                for i in range(0, len(texts), self.batch_size)
+            ]
+            for f in futuros:
+                f.result()  # propaga el primer error
+
+        self._segundos += time.perf_counter() - inicio
+        self._chunks += len(texts)
+        return buffer.array
+
+    def estadisticas(self):
+        """Rendimiento acumulado: chunks/s y latencia p50/p99 por lote."""
+        latencias = np.array(self._latencias) * 1000 if self._latencias else np.zeros(1)
+        return {
+            "chunks": self._chunks,
+            "lotes": len(self._latencias),
+            "chunks_por_segundo": self._chunks / self._segundos if self._segundos else 0.0,
+            "p50_lote_ms": float(np.percentile(latencias, 50)),
+            "p99_lote_ms": float(np.percentile(latencias, 99)),
+            "reintentos": self.reintentos,
+            "concurrencia": int(self._limite),
+        }
+
+    def _procesar_lote(self, lote, posicion, buffer):
+        intento = 0
+        while True:
+            self._entrar()
+            try:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.acquire()
+                t0 = time.perf_counter()
+                resultado = self.embed_fn(lote)
+                latencia = time.perf_counter() - t0
+            except Exception as e:
+                self._salir(throttling=es_throttling(e))
+                if not es_throttling(e) or intento >= self.max_retries:
+                    raise
+                intento += 1
+                with self._cond:
+                    self.reintentos += 1
+                METRICAS.contador("embedding_reintentos_total")
+                espera = min(self.backoff_max, self.backoff_base * (2 ** (intento - 1)))
+                time.sleep(espera * random.uniform(0.5, 1.0))
+                continue
+            self._salir(throttling=False)
+            with self._cond:
+                self._latencias.append(latencia)
+            METRICAS.observar("embedding_lote_segundos", latencia)
+            # Cada lote va a su sitio; el array del lote se libera enseguida
+            buffer.escribir(posicion, resultado)
+            return
+
+    def _entrar(self):
+        """Espera a que haya hueco según el límite de concurrencia actual."""
+        with self._cond:
+            while self._en_curso >= int(self._limite):
+                self._cond.wait()
+            self._en_curso += 1
+
+    def _salir(self, throttling):
+        """Libera el hueco y ajusta el límite (AIMD)."""
+        with self._cond:
+            self._en_curso -= 1
+            if throttling:
+                self._limite = max(float(self.min_workers), self._limite / 2)
+            else:
+                self._limite = min(float(self.max_workers), self._limite + 1.0 / self._limite)
+            self._cond.notify_all()
+
+class _Buffer:
+    """Array de salida de `EmbeddingPipeline.embed`, reservado con el primer lote (ahí se conoce la dimensión)."""
+    def __init__(self, n, array=None):
+        self.n = n
+        self.array = array
+        self._lock = threading.Lock()
+
+    def escribir(self, posicion, vectores):
+        if self.array is None:
+            with self._lock:
+                if self.array is None:
+                    self.array = np.empty((self.n, vectores.shape[1]), dtype=np.float32)
+        self.array[posicion:posicion + len(vectores)] = vectores
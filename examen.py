@@ -0,0 +1,167 @@
+# examen.py
+
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import faiss
+import numpy as np
+
+from embedding_pipeline import es_throttling
+from metricas import METRICAS
+
+class GeneradorExamen:
+    """
+    Genera un examen completo con muchas llamadas a Claude en paralelo
+    (fan-out) y une los resultados quitando preguntas casi repetidas (fan-in).
+
+    Usa el ClaudeAPI (y su FAISSManager) ya configurado: los chunks salen
+    del índice FAISS, bien los más diversos del temario o los más
+    relevantes para cada tema.
+
+    El límite de ritmo es el del ClaudeAPI (`claude_api.rate_limiter`), que
+    comparten todos los generadores que lo usan.
+    """
+    def __init__(self, claude_api, max_workers=8, max_retries=5, backoff_base=1.0):
+        self.claude_api = claude_api
+        self.faiss_manager = claude_api.faiss_manager
+        self.max_workers = max_workers
+        self.rate_limiter = claude_api.rate_limiter
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self._lock = threading.Lock()
+        self.errores = 0
+        self.faltantes = 0  # preguntas que faltaron para llegar a n_preguntas en el último examen
+
+    def generar_examen(self, documentos, tipo, n_preguntas=50, temas=None,
+                       preguntas_por_llamada=5, umbral_duplicado=0.92, margen=1.3, max_rondas=3):
+        """
+        documentos: DocumentUploader.get_documents_info() (o lista de textos).
+        tipo: "desarrollo", "verdadero/falso" o "preguntas cortas".
+        temas: lista de temas; si se indica, el contexto de cada llamada son
+               los chunks más relevantes de cada tema. Si no, chunks diversos
+               de todo el temario.
+        Se piden `margen` veces más preguntas de las necesarias para cubrir
+        las que se descartan por duplicadas. Si aun así faltan (p.ej. un
+        temario con pocos chunks), se hacen más rondas, hasta `max_rondas`,
+        reutilizando los contextos; las que sigan faltando quedan en
+        `self.faltantes`.
+
+        Retorna: (questions, answers) con como mucho `n_preguntas` elementos.
+        """
+        self.faltantes = n_preguntas
+        n_llamadas = max(1, math.ceil(n_preguntas * margen / preguntas_por_llamada))
+
+        # 1) Elegir el contexto de cada llamada, con el índice sincronizado
+        # y bloqueado por el ClaudeAPI (lo comparten otras generaciones)
+        contextos = self.claude_api.con_indice(
+            documentos, lambda: self._elegir_contextos(temas, n_llamadas))
+        if not contextos:
+            return [], []
+
+        questions, answers = [], []
+        siguiente = 0
+        for ronda in range(max_rondas):
+            faltan = n_preguntas - len(questions)
+            if faltan <= 0:
+                break
+            # Con menos contextos que llamadas se vuelve a empezar por el primero
+            n_llamadas = max(1, math.ceil(faltan * margen / preguntas_por_llamada))
+            tareas = [contextos[(siguiente + i) % len(contextos)] for i in range(n_llamadas)]
+            siguiente += n_llamadas
+
+            # 2) Fan-out: llamadas concurrentes en un pool acotado
+            inicio = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                futuros = [
+                    pool.submit(self._llamar, contexto, tema, tipo, preguntas_por_llamada)
+                    for contexto, tema in tareas
+                ]
+                parciales = [f.result() for f in futuros]
+            print(f"Examen (ronda {ronda + 1}): {len(tareas)} llamadas en "
+                  f"{time.perf_counter() - inicio:.1f} s ({self.errores} con error).")
+
+            # 3) Fan-in: unir y quitar duplicados (también con las de rondas anteriores)
+            for qs, ans in parciales:
+                # Emparejamos por posición (si falta una respuesta se descarta la pregunta)
+                for q, a in zip(qs, ans):
+                    if not a:
+                        continue
+                    questions.append(q)
+                    answers.append(a)
+            questions, answers = self._deduplicar(questions, answers, umbral_duplicado)
+
+        self.faltantes = max(0, n_preguntas - len(questions))
+        if self.faltantes:
+            print(f"Examen: faltan {self.faltantes} de {n_preguntas} preguntas "
+                  f"tras {max_rondas} rondas.")
+        return questions[:n_preguntas], answers[:n_preguntas]
+
+    def _elegir_contextos(self, temas, n_llamadas):
+        """(contexto, tema) de cada llamada: los chunks más relevantes de cada tema o chunks diversos."""
+        if temas:
+            por_tema = max(1, math.ceil(n_llamadas / len(temas)))
+            # FAISS + BM25 (solo BM25 si no hay embeddings), como en busqueda.py
+            return [(c["text"], f"el tema: {tema}") for tema in temas
+                    for c in self.faiss_manager.search_hybrid(tema, k=por_tema, mmr=True)]
+        chunks = self.faiss_manager.diverse_chunks(n_llamadas)
+        return [(c["text"], "todo el contenido del documento") for c in chunks]
+
+    def llamar(self, contexto, tema, tipo, n_preguntas):
+        """
+        Una llamada a Claude con límite de ritmo y reintentos ante throttling.
+        Si falla después de los reintentos, lanza la excepción.
+        """
+        intento = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            try:
+                return self.claude_api.generar_desde_contexto(contexto, tema, tipo, n_preguntas)
+            except Exception as e:
+                if es_throttling(e) and intento < self.max_retries:
+                    intento += 1
+                    time.sleep(self.backoff_base * (2 ** (intento - 1)) * random.uniform(0.5, 1.0))
+                    continue
+                raise
+
+    def _llamar(self, contexto, tema, tipo, n_preguntas):
+        """Como `llamar`, pero un error cuenta en `self.errores` y devuelve ([], [])."""
+        try:
+            return self.llamar(contexto, tema, tipo, n_preguntas)
+        except Exception as e:
+            print(f"Error al invocar a Claude: {e}")
+            with self._lock:
+                self.errores += 1
+            return [], []
+
+    def _deduplicar(self, questions, answers, umbral):
+        """
+        Quita las preguntas cuyo embedding tiene similitud coseno >= `umbral`
+        con alguna pregunta ya aceptada (se conserva la primera). Si no se
+        pueden calcular los embeddings, se devuelven todas sin deduplicar:
+        mejor alguna repetida que perder las que ya ha generado Claude.
+        """
+        if len(questions) < 2:
+            return questions, answers
+        try:
+            # Cohere admite como mucho 96 textos por llamada
+            vecs = np.vstack([
+                self.faiss_manager.generate_embeddings(questions[i:i + 96], input_type="clustering")
+                for i in range(0, len(questions), 96)
+            ]).astype(np.float32)
+        except Exception as e:
+            print(f"Examen: no se pudieron deduplicar las preguntas: {e!r}")
+            METRICAS.contador("examen_dedup_errores_total")
+            return questions, answers
+        faiss.normalize_L2(vecs)
+
+        aceptadas = []
+        for i in range(len(questions)):
+            if aceptadas and float((vecs[aceptadas] @ vecs[i]).max()) >= umbral:
+                continue
+            aceptadas.append(i)
+        print(f"Examen: {len(questions) - len(aceptadas)} preguntas duplicadas descartadas.")
+        return [questions[i] for i in aceptadas], [answers[i] for i in aceptadas]
@@ -0,0 +1,374 @@
+# extraccion.py
+
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+EXTENSIONES = (".pdf", ".docx", ".pptx")
+
+def _como_fichero(datos):
+    """Acepta bytes o un objeto tipo fichero (p.ej. UploadedFile de Streamlit)."""
+    if isinstance(datos, (bytes, bytearray, memoryview)):
+        return io.BytesIO(datos)
+    return datos
+
+def iter_paginas_pdf(datos, inicio=0, fin=None):
+    """
+    Genera el texto de cada página del PDF (de `inicio` a `fin`). `datos`
+    puede ser también la ruta del fichero: se lee del disco según se
+    necesita, página a página.
+    """
+    from PyPDF2 import PdfReader
+    if isinstance(datos, (str, os.PathLike)):
+        with open(datos, "rb") as f:
+            yield from iter_paginas_pdf(f, inicio, fin)
+        return
+    reader = PdfReader(_como_fichero(datos))
+    n_paginas = len(reader.pages)
+    for i in range(inicio, n_paginas if fin is None else min(fin, n_paginas)):
+        yield reader.pages[i].extract_text() or ""
+
+def iter_parrafos_docx(datos):
+    """Genera el texto de cada párrafo del DOCX."""
+    from docx import Document
+    doc = Document(_como_fichero(datos))
+    for para in doc.paragraphs:
+        yield para.text
+
+def iter_diapositivas_pptx(datos):
+    """Genera el texto de cada diapositiva del PPTX."""
+    from pptx import Presentation
+    presentation = Presentation(_como_fichero(datos))
+    for slide in presentation.slides:
+        yield "\n".join(shape.text for shape in slide.shapes if shape.has_text_frame)
+
+def iter_texto(nombre, datos):
+    """Genera el texto del documento por unidades (página, párrafo o diapositiva)."""
+    if nombre.endswith(".pdf"):
+        return iter_paginas_pdf(datos)
+    elif nombre.endswith(".docx"):
+        return iter_parrafos_docx(datos)
+    elif nombre.endswith(".pptx"):
+        return iter_diapositivas_pptx(datos)
+    raise ValueError("Formato de archivo no soportado.")
+
+# "12", "- 12 -", "Página 3", "pág. 3 de 10", "3/10"
+_NUMERO_PAGINA = re.compile(r"^\W*(p[aá]g(ina)?\.?\s*)?(\d+)(\s*(de|of|/)\s*\d+)?\W*$", re.IGNORECASE)
+
+def _patron_linea(linea):
+    """La línea sin números, para reconocer cabeceras como "Tema 3 - página 12"."""
+    return re.sub(r"\d+", "#", " ".join(linea.lower().split()))
+
+def limpiar_paginas(paginas, lineas_borde=3, umbral=0.5, min_paginas=3):
+    """
+    Quita el texto repetitivo que PyPDF2 extrae de cada página: números de
+    página y cabeceras/pies que se repiten. Solo se miran los bordes de cada
+    página (las `lineas_borde` primeras y últimas líneas).
+
+    - Cabeceras/pies: mismas líneas, salvo números, en el borde de al menos
+      un `umbral` de las páginas. Solo cuentan las páginas largas; en las
+      cortas (p.ej. diapositivas) todo es borde y un título repetido en
+      varias no es una cabecera.
+    - Números de página: líneas solo con un número ("12", "Página 3 de 10")
+      que avanza con la página (número - posición de la página constante en
+      al menos un `umbral` de ellas). Un "2024" o un "1." sueltos se quedan.
+    """
+    lineas = [pagina.split("\n") for pagina in paginas]
+    bordes = [set(range(min(lineas_borde, len(ls)))) | set(range(max(0, len(ls) - lineas_borde), len(ls)))
+              for ls in lineas]
+    repetidas, desfases = set(), set()
+    if len(paginas) >= min_paginas:
+        largas = [ls for ls in lineas if len(ls) > 2 * lineas_borde]
+        if len(largas) >= min_paginas:
+            cuenta = Counter()
+            for ls in largas:
+                cuenta.update({_patron_linea(l) for l in ls[:lineas_borde] + ls[-lineas_borde:]
+                               if l.strip() and _numero_pagina(l) is None})
+            repetidas = {p for p, n in cuenta.items() if n >= umbral * len(largas)}
+
+        cuenta = Counter()
+        for i, (ls, borde) in enumerate(zip(lineas, bordes)):
+            cuenta.update({n - i for n in (_numero_pagina(ls[j]) for j in borde) if n is not None})
+        desfases = {d for d, n in cuenta.items() if n >= max(2, umbral * len(paginas))}
+
+    limpias = []
+    for i, (ls, borde) in enumerate(zip(lineas, bordes)):
+        limpias.append("\n".join(
+            l for j, l in enumerate(ls)
+            if not (j in borde and l.strip() and _es_repetitiva(l, i, repetidas, desfases))
+        ))
+    return limpias
+
+def _numero_pagina(linea):
+    """El número de una línea que solo tiene un número de página, o None."""
+    encontrado = _NUMERO_PAGINA.match(linea.strip())
+    return int(encontrado.group(3)) if encontrado else None
+
+def _es_repetitiva(linea, pagina, repetidas, desfases):
+    numero = _numero_pagina(linea)
+    if numero is not None:
+        return numero - pagina in desfases
+    return _patron_linea(linea) in repetidas
+
+def contar_paginas_pdf(datos):
+    from PyPDF2 import PdfReader
+    return len(PdfReader(_como_fichero(datos)).pages)
+
+# ---------- Extracción en paralelo ----------
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _obtener_pool(max_workers=None):
+    """Pool de procesos compartido (arrancarlo cuesta; se reutiliza)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=max_workers or os.cpu_count())
+        return _pool
+
+def _tarea(nombre, datos, inicio, fin):
+    """
+    Trabajo de un proceso: extrae el documento `nombre` (`datos` son los bytes
+    o la ruta del fichero). Si `inicio` no es None es un PDF y solo se extraen
+    las páginas [inicio, fin). Devuelve (unidades, segundos empleados).
+    """
+    t0 = time.perf_counter()
+    if inicio is not None:
+        unidades = list(iter_paginas_pdf(datos, inicio, fin))
+    else:
+        unidades = list(iter_texto(nombre, datos))
+    return unidades, time.perf_counter() - t0
+
+def extraer_documentos(archivos, max_workers=None, paginas_por_tarea=50):
+    """
+    Extrae el texto de varios documentos en paralelo en un pool de procesos.
+    Los PDFs con más de `paginas_por_tarea` páginas se reparten por rangos;
+    las tareas reciben la ruta de una copia temporal del PDF, no sus bytes,
+    así que cada proceso solo tiene en memoria las páginas que extrae.
+
+    archivos: lista de (nombre, bytes)
+    Genera (nombre, unidades, error, segundos) por archivo, en el mismo
+    orden y en cuanto está extraído, donde `unidades` es la lista de textos
+    por página/párrafo/diapositiva (None si hubo error) y `segundos` el
+    tiempo total de extracción.
+    """
+    # Planificamos las tareas: (índice de archivo, nombre, datos, inicio, fin)
+    tareas = []
+    errores = {}
+    temporales = []
+    try:
+        for i, (nombre, datos) in enumerate(archivos):
+            if not nombre.endswith(EXTENSIONES):
+                errores[i] = ValueError("Formato de archivo no soportado.")
+                continue
+            if nombre.endswith(".pdf"):
+                try:
+                    n_paginas = contar_paginas_pdf(datos)
+                except Exception as e:
+                    errores[i] = e
+                    continue
+                rangos = range(0, max(n_paginas, 1), paginas_por_tarea)
+                if len(rangos) > 1:
+                    datos = _copia_temporal(datos)
+                    temporales.append(datos)
+                tareas.extend((i, nombre, datos, inicio, inicio + paginas_por_tarea) for inicio in rangos)
+            else:
+                tareas.append((i, nombre, datos, None, None))
+
+        resultados = _ejecutar(tareas, max_workers)
+        n_tareas = Counter(t[0] for t in tareas)
+        for i, (nombre, _) in enumerate(archivos):
+            unidades, segundos, error = [], 0.0, errores.get(i)
+            # Las tareas de cada archivo son consecutivas
+            for _ in range(n_tareas[i]):
+                resultado = next(resultados)
+                if isinstance(resultado, Exception):
+                    error = error or resultado
+                elif error is None:
+                    unidades.extend(resultado[0])
+                    segundos += resultado[1]
+            yield nombre, None if error else unidades, error, segundos
+    finally:
+        for ruta in temporales:
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+
+def _copia_temporal(datos):
+    """Escribe los bytes del archivo en un fichero temporal y devuelve su ruta."""
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+        f.write(datos if isinstance(datos, (bytes, bytearray, memoryview)) else datos.read())
+        return f.name
+
+def _ejecutar(tareas, max_workers):
+    """Ejecuta las tareas en el pool; genera el resultado o la excepción de cada una, en orden."""
+    global _pool
+    if len(tareas) <= 1:
+        # Una sola tarea: no compensa mandarla a otro proceso
+        for t in tareas:
+            yield _capturar(_tarea, *t[1:])
+        return
+    try:
+        pool = _obtener_pool(max_workers)
+        futuros = [pool.submit(_tarea, *t[1:]) for t in tareas]
+    except BrokenProcessPool:
+        _pool, futuros = None, None
+    for futuro, t in zip(futuros or [None] * len(tareas), tareas):
+        if futuro is not None:
+            try:
+                yield _capturar(futuro.result)
+                continue
+            except BrokenProcessPool:
+                # Si el pool no puede arrancar (p.ej. entorno sin fork), seguimos en serie
+                _pool, futuros = None, None
+        yield _capturar(_tarea, *t[1:])
+
+def _capturar(funcion, *args):
+    try:
+        return funcion(*args)
+    except BrokenProcessPool:
+        raise
+    except Exception as e:
+        return e
+
+# ---------- Caché de extracción ----------
+
+def huella_bytes(datos):
+    """Hash del contenido de un archivo."""
+    return hashlib.sha256(datos).hexdigest()
+
+class ExtractionCache:
+    """
+    Caché del texto extraído, indexada por el hash de los bytes del archivo.
+
+    Nivel en memoria (LRU de `max_entradas`) y, opcionalmente, nivel en disco
+    (`directorio`, un JSON por archivo) que sobrevive a reinicios. El disco
+    ocupa como mucho `max_bytes_disco`: al pasarse se borran los ficheros
+    usados hace más tiempo (la fecha de modificación se actualiza en cada
+    acierto). El directorio se crea con el primer guardado. Guarda el
+    tiempo que costó extraer cada archivo para contar cuánto se ahorra.
+    """
+    def __init__(self, directorio=".cache/extraccion", max_entradas=256, max_bytes_disco=512 * 1024 * 1024):
+        self.directorio = directorio
+        self.max_entradas = max_entradas
+        self.max_bytes_disco = max_bytes_disco
+        self.hits = 0
+        self.misses = 0
+        self.descartes_disco = 0
+        self.segundos_ahorrados = 0.0
+        self._memoria = OrderedDict()  # huella -> (unidades, segundos)
+        self._bytes_disco = None  # total ocupado en disco; se calcula al primer guardado
+        self._lock = threading.Lock()
+
+    def obtener(self, huella):
+        """Unidades de texto guardadas para `huella`, o None."""
+        with self._lock:
+            entrada = self._memoria.get(huella)
+            if entrada is not None:
+                self._memoria.move_to_end(huella)
+        if entrada is None:
+            entrada = self._leer_disco(huella)
+            if entrada is not None:
+                self._guardar_memoria(huella, entrada)
+        with self._lock:
+            if entrada is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.segundos_ahorrados += entrada[1]
+        return entrada[0]
+
+    def guardar(self, huella, unidades, segundos):
+        entrada = (unidades, segundos)
+        self._guardar_memoria(huella, entrada)
+        if self.directorio:
+            os.makedirs(self.directorio, exist_ok=True)
+            ruta = os.path.join(self.directorio, huella + ".json")
+            tmp = ruta + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"unidades": unidades, "segundos": segundos}, f, ensure_ascii=False)
+            tamano = os.path.getsize(tmp)
+            anterior = os.path.getsize(ruta) if os.path.exists(ruta) else 0
+            os.replace(tmp, ruta)
+            self._ajustar_disco(ruta, tamano - anterior)
+
+    def estadisticas(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "descartes_disco": self.descartes_disco,
+            "segundos_ahorrados": self.segundos_ahorrados,
+        }
+
+    def _guardar_memoria(self, huella, entrada):
+        with self._lock:
+            self._memoria[huella] = entrada
+            self._memoria.move_to_end(huella)
+            while len(self._memoria) > self.max_entradas:
+                self._memoria.popitem(last=False)
+
+    def _leer_disco(self, huella):
+        if not self.directorio:
+            return None
+        ruta = os.path.join(self.directorio, huella + ".json")
+        try:
+            with open(ruta, "r", encoding="utf-8") as f:
+                datos = json.load(f)
+            os.utime(ruta)  # recién usado: lo último en borrarse
+            return datos["unidades"], datos["segundos"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _ajustar_disco(self, ruta, delta):
+        """Suma `delta` bytes al total en disco y borra los ficheros más antiguos si se pasa del máximo."""
+        with self._lock:
+            if self._bytes_disco is None:
+                # Primer guardado del proceso: contamos lo que ya hay (incluido `ruta`)
+                self._bytes_disco = sum(tamano for _, tamano, _ in self._ficheros_disco())
+            else:
+                self._bytes_disco += delta
+            if not self.max_bytes_disco or self._bytes_disco <= self.max_bytes_disco:
+                return
+            for _, tamano, otra in sorted(self._ficheros_disco()):
+                if self._bytes_disco <= self.max_bytes_disco:
+                    break
+                if otra == ruta:
+                    continue
+                try:
+                    os.remove(otra)
+                except OSError:
+                    continue
+                self._bytes_disco -= tamano
+                self.descartes_disco += 1
+
+    def _ficheros_disco(self):
+        """(fecha de modificación, tamaño, ruta) de cada fichero de la caché en disco."""
+        ficheros = []
+        try:
+            nombres = os.listdir(self.directorio)
+        except OSError:
+            return ficheros
+        for nombre in nombres:
+            if not nombre.endswith(".json"):
+                continue
+            ruta = os.path.join(self.directorio, nombre)
+            try:
+                info = os.stat(ruta)
+            except OSError:
+                continue
+            ficheros.append((info.st_mtime, info.st_size, ruta))
+        return ficheros
+
+# Caché compartida por todos los DocumentUploader del proceso
+# (Streamlit vuelve a ejecutar app.py, pero los módulos importados se mantienen)
+CACHE_EXTRACCION = ExtractionCache()
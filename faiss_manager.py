@@ -1,95 +1,892 @@
 # faiss_manager.py
 
+import asyncio
 import faiss
 import numpy as np
 import json
-import boto3
+import math
+import threading
+import time
+from array import array
+from bm25 import BM25Index, reciprocal_rank_fusion
+from chunker import chunk_documento
+from dedup import Deduplicador
+from embedding_cache import EmbeddingCache
+from recursos import get_bedrock_client, get_embedding_cache
+from embedding_pipeline import EmbeddingPipeline
+from index_store import IndexStore
+from index_factory import (
+    crear_indice, entrenar, ajustar_busqueda, admite_borrado, bytes_por_vector, reconstruccion_exacta,
+)
+from metricas import METRICAS, BUCKETS_TAMANO
 
 class FAISSManager:
-    def __init__(self):
-        self.bedrock_client = boto3.client('bedrock-runtime', region_name='us-east-1')
-        self.index = None
+    EMBEDDING_MODEL_ID = "cohere.embed-multilingual-v3"
+    # Versión del formato de los índices guardados en disco. Forma parte de la
+    # huella: al cambiar lo que se guarda (ids.npy, arrays meta_*, duplicados...)
+    # se sube y los índices antiguos dejan de encontrarse y se reconstruyen.
+    FORMATO_INDICE = 3
+
+    def __init__(self, cache_dir=".cache/embeddings", index_dir=".cache/indices",
+                 bedrock_client=None, max_workers=8, rate=20.0,
+                 index_type="flat", nlist=1024, pq_m=64, nprobe=16, ef_search=64,
+                 max_tokens=400, overlap_tokens=40, storage="float32", pca_dim=None,
+                 async_client=None, dedup_umbral=0.8, factor_reentreno=4, espera_reintento=30.0):
+        # Cliente compartido; se puede inyectar otro (p.ej. fake_bedrock.FakeBedrockClient)
+        self.bedrock_client = bedrock_client or get_bedrock_client()
+        # Cliente asíncrono (bedrock_async.AsyncBedrockClient); se crea al usarlo
+        self._async_client = async_client
         self.chunks = []  # guardamos el texto de cada chunk
         self.dim = None   # dimensión de embeddings (la definiremos tras la primera llamada)
+        # Caché de embeddings en disco (cache_dir=None la desactiva)
+        self.embedding_cache = get_embedding_cache(cache_dir) if cache_dir else None
+        # Índices guardados en disco por huella de documentos (index_dir=None lo desactiva)
+        self.index_store = IndexStore(index_dir) if index_dir else None
+        # Presupuesto de tokens por chunk y solapamiento entre chunks
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        # Tipo de índice (ver index_factory.TIPOS_INDICE) y parámetros de búsqueda
+        self.index_type = index_type
+        # storage: "float32", "fp16" o "sq8" (ver index_factory.ALMACENAMIENTOS);
+        # pca_dim: dimensión reducida con PCA (None = sin reducir)
+        self.index_params = {"nlist": nlist, "pq_m": pq_m, "almacenamiento": storage, "pca_dim": pca_dim}
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        # IVF, SQ8 y PCA se entrenan con los vectores del primer lote; cuando el
+        # índice tiene `factor_reentreno` veces más, se vuelve a crear y entrenar con todos
+        self.factor_reentreno = factor_reentreno
+        # Similitud (Jaccard) a partir de la cual un chunk se considera
+        # duplicado de otro ya indexado y no se vuelve a embeber (None = sin dedup)
+        self.dedup_umbral = dedup_umbral
+        self.dedup_stats = {"chunks": 0, "duplicados": 0, "llamadas_ahorradas": 0, "bytes_ahorrados": 0}
+        # Si fallan los embeddings, los chunks se indexan solo en BM25 y no se
+        # vuelve a intentar embeberlos hasta pasados `espera_reintento` segundos
+        self.espera_reintento = espera_reintento
+        # Embeddings en paralelo, con límite de ritmo y reintentos
+        self.embedding_pipeline = EmbeddingPipeline(
+            self.generate_embeddings, batch_size=16, max_workers=max_workers, rate=rate
+        )
+        # Protege lo que se lee de disco o se construye al primer uso (índice, BM25)
+        self._lock_perezoso = threading.Lock()
+        self._reset()
+
+    @property
+    def index(self):
+        """El índice FAISS; si viene de disco, se lee la primera vez que se usa."""
+        if self._index is None and self._carga_pendiente is not None:
+            # Varias búsquedas pueden llegar aquí a la vez (ClaudeAPI las deja
+            # leer en paralelo): solo una lee de disco
+            with self._lock_perezoso:
+                if self._index is None and self._carga_pendiente is not None:
+                    self._cargar(self._carga_pendiente)
+        return self._index
+
+    def _cargar(self, huella):
+        index, self.chunks, ids, meta, arrays = self.index_store.cargar(huella, mmap=True)
+        self._index_mmap = True
+        self._huella_cargada = huella
+        self.dim = index.d
+        self.chunk_ids = ids.tolist()
+        self._pos_por_id = {chunk_id: pos for pos, chunk_id in enumerate(self.chunk_ids)}
+        self.doc_ranges = {h: tuple(r) for h, r in meta.get("doc_ranges", {}).items()}
+        self.doc_nombres = meta.get("doc_nombres", {})
+        self.duplicados = {int(i): tuple(d) for i, d in meta.get("duplicados", {}).items()}
+        for campo in ("paginas", "inicios", "fines"):
+            if campo in arrays:
+                getattr(self, "chunk_" + campo).frombytes(arrays[campo].tobytes())
+        self._bm25_guardado = {nombre[len("bm25_"):]: valores for nombre, valores in arrays.items()
+                               if nombre.startswith("bm25_")} or None
+        self._next_id = meta.get("next_id", len(self.chunk_ids))
+        self._n_entrenamiento = meta.get("n_entrenamiento", index.ntotal)
+        ajustar_busqueda(index, nprobe=self.nprobe, ef_search=self.ef_search)
+        # El índice se publica al final, cuando el resto del estado ya está listo
+        self._index = index
+        self._carga_pendiente = None
+
+    @index.setter
+    def index(self, value):
+        self._index = value
+        self._index_mmap = False
+        self._carga_pendiente = None
 
     def chunk_text(self, text, max_length=2048):
         """
         Divide un string `text` en una lista de trozos (chunks),
         donde cada chunk tiene como máximo `max_length` caracteres.
+        Los cortes se hacen entre párrafos y frases (ver chunker.py).
         """
-        chunks = []
-        start = 0
-        while start < len(text):
-            end = start + max_length
-            chunk = text[start:end]
-            chunks.append(chunk)
-            start = end
-        return chunks
+        return [text[inicio:fin] for inicio, fin, _ in self._chunk_offsets(text, None, max_length)]
 
-    def generate_embeddings(self, texts):
+    def _chunk_offsets(self, text, limites, max_length=2048):
+        return chunk_documento(text, limites, max_tokens=self.max_tokens,
+                               overlap_tokens=self.overlap_tokens, max_chars=max_length)
+
+    def generate_embeddings(self, texts, input_type="search_document"):
         """
         Genera embeddings usando 'cohere.embed-multilingual-v3' a través de Bedrock.
         texts: lista de strings
         Retorna: np.array de forma (len(texts), embedding_dim)
+
+        Los textos que ya están en la caché no se envían a Bedrock;
+        solo los fallos generan llamada.
         """
+        if self.embedding_cache is None:
+            return self._invoke_embeddings(texts, input_type)
+
+        with METRICAS.span("embeddings", textos=len(texts), input_type=input_type) as span:
+            claves = [EmbeddingCache.clave(t, self.EMBEDDING_MODEL_ID, input_type) for t in texts]
+            cacheados = self.embedding_cache.obtener(claves)
+            faltan = [i for i, v in enumerate(cacheados) if v is None]
+            span["cache_aciertos"] = len(texts) - len(faltan)
+            METRICAS.contador("embeddings_textos_total", len(texts) - len(faltan), origen="cache")
+
+            if faltan:
+                nuevos = self._invoke_embeddings([texts[i] for i in faltan], input_type)
+                self.embedding_cache.guardar([claves[i] for i in faltan], nuevos)
+                for i, vector in zip(faltan, nuevos):
+                    cacheados[i] = vector
+
+        if not cacheados:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        return np.stack(cacheados).astype(np.float32, copy=False)
+
+    def _invoke_embeddings(self, texts, input_type):
+        """Llamada directa a Bedrock, sin caché."""
         # Construimos el body JSON con la lista "texts".
         # Importante: 'texts' NO debe contener cadenas de más de 2048 caracteres,
         # por eso hemos hecho el chunking antes.
         body = json.dumps({
             "texts": texts,
-            "input_type": "search_document",
+            "input_type": input_type,
             "truncate": "END"
         })
 
-        response = self.bedrock_client.invoke_model(
-            modelId="cohere.embed-multilingual-v3",
+        caracteres = sum(len(t) for t in texts)
+        with METRICAS.span("bedrock_embeddings", textos=len(texts), caracteres=caracteres):
+            response = self.bedrock_client.invoke_model(
+                modelId=self.EMBEDDING_MODEL_ID,
+                accept="application/json",
+                contentType="application/json",
+                body=body
+            )
+            response_body = json.loads(response['body'].read())
+        METRICAS.observar("bedrock_embeddings_lote_textos", len(texts), buckets=BUCKETS_TAMANO)
+        METRICAS.contador("embeddings_textos_total", len(texts), origen="bedrock")
+        METRICAS.contador("embeddings_caracteres_total", caracteres)
+        embeddings = response_body['embeddings']
+        return np.array(embeddings, dtype=np.float32)
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            from bedrock_async import AsyncBedrockClient
+            self._async_client = AsyncBedrockClient()
+        return self._async_client
+
+    async def generate_embeddings_async(self, texts, input_type="search_document"):
+        """
+        Igual que `generate_embeddings`, pero asíncrono: los textos que no
+        están en la caché se envían en lotes concurrentes por el cliente
+        asíncrono, sin bloquear ningún hilo.
+        """
+        with METRICAS.span("embeddings_async", textos=len(texts), input_type=input_type) as span:
+            if self.embedding_cache is not None:
+                claves = [EmbeddingCache.clave(t, self.EMBEDDING_MODEL_ID, input_type) for t in texts]
+                cacheados = self.embedding_cache.obtener(claves)
+            else:
+                claves, cacheados = None, [None] * len(texts)
+            faltan = [i for i, v in enumerate(cacheados) if v is None]
+            span["cache_aciertos"] = len(texts) - len(faltan)
+
+            if faltan:
+                tamano = self.embedding_pipeline.batch_size
+                lotes = [faltan[i:i + tamano] for i in range(0, len(faltan), tamano)]
+                resultados = await asyncio.gather(*(
+                    self._invoke_embeddings_async([texts[i] for i in lote], input_type) for lote in lotes
+                ))
+                for lote, nuevos in zip(lotes, resultados):
+                    if self.embedding_cache is not None:
+                        self.embedding_cache.guardar([claves[i] for i in lote], nuevos)
+                    for i, vector in zip(lote, nuevos):
+                        cacheados[i] = vector
+
+        if not cacheados:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        return np.stack(cacheados).astype(np.float32, copy=False)
+
+    async def _invoke_embeddings_async(self, texts, input_type):
+        """Llamada directa a Bedrock con el cliente asíncrono, sin caché."""
+        body = json.dumps({"texts": texts, "input_type": input_type, "truncate": "END"})
+        response = await self.async_client.invoke_model(
+            modelId=self.EMBEDDING_MODEL_ID,
             accept="application/json",
             contentType="application/json",
             body=body
         )
-        response_body = json.loads(response['body'].read())
-        embeddings = response_body['embeddings']
-        return np.array(embeddings, dtype=np.float32)
+        METRICAS.contador("embeddings_textos_total", len(texts), origen="bedrock")
+        return np.array(json.loads(response['body'].read())['embeddings'], dtype=np.float32)
 
+    @METRICAS.instrumentar("create_faiss_index")
     def create_faiss_index(self, docs):
         """
         1) Divide todos los documentos en chunks de máximo 2048 caracteres,
         2) Genera embeddings para cada chunk (en lotes),
         3) Crea un índice FAISS y almacena los vectores.
         """
-        # 1) Crear chunks de todos los docs
+        self._reset()
+        self.add_documents(docs)
+
+    def add_documents(self, docs):
+        """
+        Añade documentos al índice sin reconstruirlo: solo se generan
+        embeddings para los chunks de los documentos nuevos. Los documentos
+        que ya están indexados (mismo contenido) se ignoran, y los chunks
+        casi iguales a otro ya indexado (ver `dedup_umbral`) se guardan solo
+        como procedencia de ese otro chunk.
+
+        Los chunks se registran (texto, procedencia y BM25) antes de pedir
+        los embeddings: si Bedrock falla se pueden buscar igualmente con
+        BM25, y se vuelven a embeber en la próxima llamada (ver
+        `_indexar_pendientes`).
+        """
+        self._hacer_editable()
+        self.huella = None
+        self._bm25_guardado = None
+
+        # 1) Crear chunks de los documentos nuevos, respetando sus páginas
+        nuevos = []  # (huella_doc, [(inicio, fin, pagina)])
         all_chunks = []
-        for doc in docs:
-            doc_chunks = self.chunk_text(doc, max_length=2048)
-            all_chunks.extend(doc_chunks)
+        vistos = set(self.doc_ranges)
+        with METRICAS.span("chunking") as span:
+            for doc in docs:
+                texto, nombre, limites = _desglosar(doc)
+                huella_doc = IndexStore.huella_documento(texto)
+                if huella_doc in vistos:
+                    continue
+                vistos.add(huella_doc)
+                offsets = self._chunk_offsets(texto, limites)
+                nuevos.append((huella_doc, offsets))
+                all_chunks.extend(texto[inicio:fin] for inicio, fin, _ in offsets)
+                if nombre:
+                    self.doc_nombres[huella_doc] = nombre
+            span.update(documentos=len(nuevos), chunks=len(all_chunks))
 
-        self.chunks = all_chunks
+        n_duplicados = self._registrar_chunks(nuevos, all_chunks) if all_chunks else 0
+        # 3) Embeber los chunks nuevos (y los que quedaron sin vector otras veces)
+        self._indexar_pendientes()
+        if all_chunks:
+            self._registrar_dedup(len(all_chunks), n_duplicados)
 
-        # 2) Generar embeddings por lotes
-        embeddings = []
-        batch_size = 16  # Ajusta según tu límite o conveniencia
-        for i in range(0, len(all_chunks), batch_size):
-            batch = all_chunks[i:i+batch_size]
-            emb_batch = self.generate_embeddings(batch)
-            embeddings.append(emb_batch)
+    def _registrar_chunks(self, nuevos, all_chunks):
+        """
+        Guarda los chunks de los documentos `nuevos`, pendientes de embeber.
+        Devuelve cuántos eran casi repetidos.
+        """
+        # 2) Quitar los chunks casi repetidos (el mismo material en otro
+        # formato u otra versión): no se embeben ni se guardan en el índice
+        ids = np.arange(self._next_id, self._next_id + len(all_chunks), dtype=np.int64)
+        unicos, duplicados = self._deduplicar(ids, all_chunks)
 
-        if not embeddings:
-            return  # No se agregan embeddings si la lista está vacía
+        # Cada documento ocupa un rango contiguo de ids (también los duplicados)
+        offsets_todos = [o for _, offsets in nuevos for o in offsets]
+        for huella_doc, offsets in nuevos:
+            self.doc_ranges[huella_doc] = (self._next_id, self._next_id + len(offsets))
+            self._next_id += len(offsets)
+        for i, canonico in duplicados:
+            inicio, fin, pagina = offsets_todos[i]
+            self.duplicados[int(ids[i])] = (canonico, pagina, inicio, fin)
 
-        embeddings = np.concatenate(embeddings, axis=0)  # (N, embedding_dim)
-        self.dim = embeddings.shape[1]
+        ids = ids[unicos].tolist()
+        all_chunks = [all_chunks[i] for i in unicos]
+        for i in unicos:
+            inicio, fin, pagina = offsets_todos[i]
+            self.chunk_paginas.append(pagina)
+            self.chunk_inicios.append(inicio)
+            self.chunk_fines.append(fin)
+        for chunk_id, chunk in zip(ids, all_chunks):
+            self._pos_por_id[chunk_id] = len(self.chunks)
+            self.chunks.append(chunk)
+            self.chunk_ids.append(chunk_id)
+        if self._bm25 is not None:
+            self._bm25.add(ids, all_chunks)
+        self._sin_vector.update(ids)
+        return len(duplicados)
+
+    def _indexar_pendientes(self):
+        """
+        Embebe los chunks que aún no tienen vector y los añade al índice
+        FAISS. Si Bedrock falla se quedan solo en BM25 y se reintenta en la
+        próxima llamada, como pronto `espera_reintento` segundos después.
+        """
+        if not self._sin_vector or time.monotonic() < self._proximo_reintento:
+            return
+        ids = np.array([i for i in self.chunk_ids if i in self._sin_vector], dtype=np.int64)
+        try:
+            embeddings = self._embeber([self.chunks[self._pos_por_id[i]] for i in ids.tolist()])
+        except Exception as e:
+            self._proximo_reintento = time.monotonic() + self.espera_reintento
+            METRICAS.contador("chunks_sin_embedding_total", len(ids))
+            print(f"No se pudieron calcular los embeddings ({e!r}): "
+                  f"{len(ids)} chunks se buscan solo con BM25 por ahora.")
+            return
+
+        with METRICAS.span("faiss_add", vectores=len(ids), index_type=self.index_type):
+            self.index.add_with_ids(embeddings, ids)
+        self._sin_vector.clear()
+        self._reentrenar_si_crece()
+
+    def _embeber(self, all_chunks):
+        """Embeddings normalizados de `all_chunks`; crea el índice la primera vez."""
+        # Generar embeddings por lotes (varios lotes a la vez)
+        with METRICAS.span("embedding_pipeline", chunks=len(all_chunks)) as span:
+            embeddings = self.embedding_pipeline.embed(all_chunks)  # (N, embedding_dim)
+            span.update(self.embedding_pipeline.estadisticas())
+
+        if self.embedding_cache is not None:
+            self.embedding_cache.flush()
 
-        # 3) Crear y entrenar el índice FAISS
-        self.index = faiss.IndexFlatIP(self.dim)  
         # Normalizamos para que sea más similar a coseno
         faiss.normalize_L2(embeddings)
-        self.index.add(embeddings)  # Agregar todos los vectores
+
+        # Crear (y entrenar, si es IVF) el índice FAISS la primera vez.
+        # Todos los tipos aceptan ids propios para poder borrar un documento.
+        if self.index is None:
+            self.dim = embeddings.shape[1]
+            index = crear_indice(self.index_type, self.dim, n_entrenamiento=len(embeddings),
+                                 **self.index_params)
+            entrenar(index, embeddings)
+            ajustar_busqueda(index, nprobe=self.nprobe, ef_search=self.ef_search)
+            self.index = index
+            self._n_entrenamiento = len(embeddings)
+        return embeddings
+
+    def _necesita_entrenamiento(self):
+        """True si el índice pedido depende de los vectores con los que se entrena."""
+        return (self.index_type.startswith("ivf") or self.index_params["almacenamiento"] == "sq8"
+                or bool(self.index_params["pca_dim"]))
+
+    def _reentrenar_si_crece(self, max_muestra=100000):
+        """
+        Un IVF entrenado con un primer documento pequeño se queda con pocas
+        listas (o en "flat") y centroides poco representativos; igual los
+        rangos de SQ8 y la proyección PCA (que con pocos vectores ni se
+        aplica). Cuando el índice crece `factor_reentreno` veces se crea de
+        nuevo con todos los vectores (hasta `max_muestra` se usan para entrenar).
+        """
+        if not self._necesita_entrenamiento() or self._n_entrenamiento >= max_muestra:
+            return
+        if self.index.ntotal < self.factor_reentreno * max(self._n_entrenamiento, 1):
+            return
+        with METRICAS.span("reentrenar_indice", vectores=self.index.ntotal,
+                           antes=self._n_entrenamiento, index_type=self.index_type):
+            ids = np.array(self.chunk_ids, dtype=np.int64)
+            vecs = self._vectores(ids)
+            index = crear_indice(self.index_type, self.dim, n_entrenamiento=len(vecs),
+                                 **self.index_params)
+            entrenar(index, vecs, max_muestra=max_muestra)
+            index.add_with_ids(vecs, ids)
+            ajustar_busqueda(index, nprobe=self.nprobe, ef_search=self.ef_search)
+            self.index = index
+            self._n_entrenamiento = len(vecs)
+
+    def _vectores(self, ids):
+        """
+        Vectores (normalizados) de los chunks `ids`. Si el índice los guarda
+        tal cual se leen de él; si no (PQ, SQ8, PCA), se vuelven a pedir los
+        embeddings, que normalmente salen de la caché sin llamar a Bedrock.
+        Si Bedrock no responde, se usa la aproximación que da el índice.
+        """
+        if not reconstruccion_exacta(self.index):
+            textos = [self.chunks[self._pos_por_id[int(i)]] for i in ids]
+            try:
+                vecs = self.embedding_pipeline.embed(textos)
+                faiss.normalize_L2(vecs)
+                return vecs
+            except Exception as e:
+                print(f"No se pudieron recuperar los embeddings originales ({e!r}); "
+                      f"se usan los reconstruidos por el índice.")
+        return np.vstack([self.index.reconstruct(int(i)) for i in ids])
+
+    def _deduplicador(self):
+        """Firmas MinHash de los chunks indexados (se calculan la primera vez)."""
+        if self._dedup is None:
+            self._dedup = Deduplicador(umbral=self.dedup_umbral)
+            if not self._vacio():
+                self._dedup.agregar_textos(self.chunk_ids, self.chunks)
+        return self._dedup
+
+    def _deduplicar(self, ids, textos):
+        """
+        Separa los chunks nuevos en únicos (posiciones) y duplicados
+        [(posición, id del chunk indexado igual)]. Se compara con los chunks
+        ya indexados y con los únicos anteriores del mismo lote.
+        """
+        if self.dedup_umbral is None:
+            return list(range(len(textos))), []
+        unicos, duplicados = [], []
+        with METRICAS.span("dedup", chunks=len(textos)) as span:
+            dedup = self._deduplicador()
+            for i, (chunk_id, texto) in enumerate(zip(ids.tolist(), textos)):
+                firma = dedup.firma(texto)
+                parecido = dedup.buscar(firma)
+                if parecido is None:
+                    dedup.agregar(chunk_id, firma)
+                    unicos.append(i)
+                else:
+                    duplicados.append((i, parecido[0]))
+            span["duplicados"] = len(duplicados)
+        return unicos, duplicados
+
+    def _registrar_dedup(self, n_chunks, n_duplicados):
+        """Acumula y muestra lo que se ahorra al no embeber ni indexar los duplicados."""
+        if self.dedup_umbral is None:
+            return
+        lote = self.embedding_pipeline.batch_size
+        llamadas = math.ceil(n_chunks / lote) - math.ceil((n_chunks - n_duplicados) / lote)
+        por_vector = bytes_por_vector(self.index) if self.index is not None else 0
+        estadisticas = {"chunks": n_chunks, "duplicados": n_duplicados,
+                        "llamadas_ahorradas": llamadas, "bytes_ahorrados": n_duplicados * por_vector}
+        for clave, valor in estadisticas.items():
+            self.dedup_stats[clave] += valor
+        METRICAS.contador("dedup_chunks_duplicados_total", n_duplicados)
+        METRICAS.contador("dedup_llamadas_ahorradas_total", llamadas)
+        METRICAS.contador("dedup_bytes_ahorrados_total", estadisticas["bytes_ahorrados"])
+        if n_duplicados:
+            print(f"Dedup: {n_duplicados} de {n_chunks} chunks casi repetidos; "
+                  f"{llamadas} llamadas de embeddings y {estadisticas['bytes_ahorrados'] / 1024:.1f} KB "
+                  f"de índice ahorrados.")
+
+    def remove_document(self, huella_doc):
+        """
+        Elimina del índice todos los chunks de un documento, identificado
+        por su huella (`IndexStore.huella_documento`). Devuelve False si
+        el documento no estaba indexado.
+        """
+        self._hacer_editable()
+        if huella_doc not in self.doc_ranges:
+            return False
+        self.huella = None
+        self._bm25_guardado = None
+
+        inicio, fin = self.doc_ranges.pop(huella_doc)
+        self._promover_duplicados(inicio, fin)
+        conservar = [i for i, chunk_id in enumerate(self.chunk_ids) if not inicio <= chunk_id < fin]
+        self._sin_vector = {i for i in self._sin_vector if not inicio <= i < fin}
+
+        if self.index is None:
+            pass  # todavía no hay vectores (solo BM25)
+        elif admite_borrado(self.index):
+            self.index.remove_ids(np.arange(inicio, fin, dtype=np.int64))
+        else:
+            # HNSW: reconstruimos el índice con los vectores que se quedan
+            # (los originales: con SQ8/PCA, `reconstruct` perdería calidad en cada borrado)
+            ids = np.array([self.chunk_ids[i] for i in conservar
+                            if self.chunk_ids[i] not in self._sin_vector], dtype=np.int64)
+            if len(ids):
+                vecs = self._vectores(ids)
+                index = crear_indice(self.index_type, self.dim, n_entrenamiento=len(vecs),
+                                     **self.index_params)
+                entrenar(index, vecs)  # SQ8 y PCA necesitan entrenamiento
+                index.add_with_ids(vecs, ids)
+                ajustar_busqueda(index, nprobe=self.nprobe, ef_search=self.ef_search)
+                self.index = index
+                self._n_entrenamiento = len(vecs)
+            else:
+                self.index = None  # se vuelve a crear con el próximo documento
+        if self._bm25 is not None:
+            self._bm25.remove(range(inicio, fin))
+        if self._dedup is not None:
+            self._dedup.eliminar(range(inicio, fin))
+
+        self.chunks = [self.chunks[i] for i in conservar]
+        self.chunk_ids = [self.chunk_ids[i] for i in conservar]
+        self.doc_nombres.pop(huella_doc, None)
+        for campo in ("chunk_paginas", "chunk_inicios", "chunk_fines"):
+            valores = getattr(self, campo)
+            setattr(self, campo, array(valores.typecode, (valores[i] for i in conservar)))
+        self._pos_por_id = {chunk_id: pos for pos, chunk_id in enumerate(self.chunk_ids)}
+        return True
+
+    def _promover_duplicados(self, inicio, fin):
+        """
+        Antes de borrar los chunks con ids [inicio, fin): los duplicados de
+        otros documentos que apuntaban a ellos pasan a ser chunks normales,
+        con el mismo vector y texto (no se vuelve a llamar a Bedrock). Si el
+        chunk borrado aún no tenía vector, el promovido tampoco.
+        """
+        for dup_id in [i for i in self.duplicados if inicio <= i < fin]:
+            del self.duplicados[dup_id]
+        promovidos = {}  # id borrado -> id que lo sustituye
+        for dup_id, (canonico, pagina, ini, fi) in sorted(self.duplicados.items()):
+            if not inicio <= canonico < fin:
+                continue
+            if canonico in promovidos:
+                self.duplicados[dup_id] = (promovidos[canonico], pagina, ini, fi)
+                continue
+            del self.duplicados[dup_id]
+            promovidos[canonico] = dup_id
+            texto = self.chunks[self._pos_por_id[canonico]]
+            if canonico in self._sin_vector:
+                self._sin_vector.add(dup_id)
+            else:
+                vector = self.index.reconstruct(canonico).reshape(1, -1)
+                self.index.add_with_ids(vector, np.array([dup_id], dtype=np.int64))
+            self._pos_por_id[dup_id] = len(self.chunks)
+            self.chunks.append(texto)
+            self.chunk_ids.append(dup_id)
+            self.chunk_paginas.append(pagina)
+            self.chunk_inicios.append(ini)
+            self.chunk_fines.append(fi)
+            if self._bm25 is not None:
+                self._bm25.add([dup_id], [texto])
+            if self._dedup is not None:
+                self._dedup.agregar_textos([dup_id], [texto])
+
+    def sync_documents(self, docs):
+        """
+        Deja el índice con exactamente estos documentos (los que tiene el
+        DocumentUploader): usa uno guardado en disco si existe y, si no,
+        quita los que sobran y añade solo los nuevos. No hace nada si el
+        índice ya corresponde a estos documentos.
+        """
+        huella = self._huella_de(docs)
+        if huella == self.huella:
+            return
+        if self.load_index(huella):
+            return
+
+        self._hacer_editable()
+        actuales = {IndexStore.huella_documento(_desglosar(d)[0]) for d in docs}
+        for huella_doc in [h for h in self.doc_ranges if h not in actuales]:
+            self.remove_document(huella_doc)
+        self.add_documents(docs)
+        if self._sin_vector:
+            # Sin embeddings todavía: ni huella ni guardado, así la próxima
+            # llamada vuelve a intentarlo
+            return
+
+        self.huella = huella
+        self.save_index(huella)
+
+    def sincronizado(self, docs):
+        """True si el índice ya corresponde a `docs` (`sync_documents` no cambiaría nada)."""
+        return self.huella is not None and self._huella_de(docs) == self.huella
+
+    def _huella_de(self, docs):
+        return IndexStore.huella([_desglosar(d)[0] for d in docs], extra=self._configuracion())
+
+    def _configuracion(self):
+        """Todo lo que, además de los documentos, cambia el índice guardado."""
+        return (
+            f"v{self.FORMATO_INDICE}/{self.EMBEDDING_MODEL_ID}/{self.index_type}"
+            f"/{self.index_params['almacenamiento']}/{self.index_params['pca_dim']}"
+            f"/t{self.max_tokens}/o{self.overlap_tokens}/dedup{self.dedup_umbral}"
+        )
+
+    def load_index(self, huella):
+        """
+        Prepara la carga (perezosa) del índice guardado para `huella`.
+        Devuelve False si no existe en disco.
+        """
+        if self.index_store is None or not self.index_store.existe(huella):
+            return False
+        self._reset()
+        self._carga_pendiente = huella
+        self.huella = huella
+        return True
+
+    def save_index(self, huella):
+        """
+        Guarda el índice actual, sus chunks y el índice BM25 bajo `huella`
+        (no se guarda mientras haya chunks sin embeber).
+        """
+        if self.index_store is None or self.index is None or self._sin_vector:
+            return
+        meta = {
+            "formato": self.FORMATO_INDICE,
+            "dim": self.dim,
+            "index_type": self.index_type,
+            "storage": self.index_params["almacenamiento"],
+            "pca_dim": self.index_params["pca_dim"],
+            "next_id": self._next_id,
+            "n_entrenamiento": self._n_entrenamiento,
+            "doc_ranges": self.doc_ranges,
+            "doc_nombres": self.doc_nombres,
+            "duplicados": self.duplicados,
+        }
+        arrays = {
+            "paginas": np.frombuffer(self.chunk_paginas, dtype=np.int32),
+            "inicios": np.frombuffer(self.chunk_inicios, dtype=np.int64),
+            "fines": np.frombuffer(self.chunk_fines, dtype=np.int64),
+        }
+        # BM25 también, para no volver a tokenizar todos los chunks al cargar
+        arrays.update(("bm25_" + nombre, valores) for nombre, valores in self.lexical_index().a_arrays().items())
+        self.index_store.guardar(huella, self.index, self.chunks, self.chunk_ids, meta, arrays)
+
+    def _reset(self):
+        """Vacía el índice y todos los datos asociados."""
+        self.index = None
+        self.huella = None
+        self.chunks = []
+        self.chunk_ids = []      # id FAISS de cada chunk (misma posición que self.chunks)
+        # Procedencia de cada chunk (misma posición), en arrays compactos
+        self.chunk_paginas = array('i')  # página/diapositiva (desde 0)
+        self.chunk_inicios = array('q')  # offsets del chunk en el texto del documento
+        self.chunk_fines = array('q')
+        self.doc_ranges = {}     # huella_doc -> (primer_id, último_id + 1)
+        self.doc_nombres = {}    # huella_doc -> nombre del archivo
+        # Chunks casi repetidos que no están en el índice:
+        # id -> (id del chunk indexado, página, inicio, fin)
+        self.duplicados = {}
+        self._next_id = 0
+        self._n_entrenamiento = 0  # vectores con los que se entrenó el índice
+        self._pos_por_id = {}
+        self._bm25 = None        # índice léxico; se construye al usarlo por primera vez
+        self._bm25_guardado = None  # arrays del BM25 guardado con el índice de disco (ver BM25Index.a_arrays)
+        self._dedup = None       # firmas MinHash; ídem
+        self._sin_vector = set()  # ids de chunks que aún no están en el índice FAISS (solo BM25)
+        self._proximo_reintento = 0.0
+
+    def _hacer_editable(self):
+        """
+        Un índice leído con mmap no se puede modificar, y `faiss.clone_index`
+        no sabe copiar listas invertidas en disco (IVF) ni PCA; antes de añadir
+        o borrar lo volvemos a leer entero a memoria, junto con sus chunks.
+        """
+        if self.index is not None and self._index_mmap:
+            index = self.index_store.leer_indice(self._huella_cargada, mmap=False)
+            ajustar_busqueda(index, nprobe=self.nprobe, ef_search=self.ef_search)
+            self.index = index
+            self.chunks = list(self.chunks)
+
+    def set_search_params(self, nprobe=None, ef_search=None):
+        """Cambia `nprobe` (IVF) y/o `ef_search` (HNSW) del índice actual."""
+        if nprobe is not None:
+            self.nprobe = nprobe
+        if ef_search is not None:
+            self.ef_search = ef_search
+        if self.index is not None:
+            ajustar_busqueda(self.index, nprobe=self.nprobe, ef_search=self.ef_search)
+
+    def search(self, query, k=5, mmr=False, lambda_mmr=0.5, fetch_k=None, vector=None):
+        """
+        Búsqueda semántica de los `k` chunks más parecidos a `query`.
+        `query` puede ser un string o una lista de strings (se buscan todas
+        en una sola llamada a `index.search`).
+
+        Con `mmr=True` se recuperan `fetch_k` candidatos y se reordenan con
+        Maximal Marginal Relevance para evitar chunks casi repetidos;
+        `lambda_mmr` pondera relevancia (1.0) frente a diversidad (0.0).
+
+        `vector` es el embedding de la consulta ya calculado (p.ej. con
+        `generate_embeddings_async`); si se da, no se vuelve a pedir.
+
+        Retorna: lista de dicts {"id", "score", "text", "metadata"} (o una lista por
+        consulta si `query` era una lista).
+        """
+        queries = [query] if isinstance(query, str) else list(query)
+        if self.index is None or not len(self.chunks) or not queries:
+            return [] if isinstance(query, str) else [[] for _ in queries]
+
+        if vector is not None:
+            q = np.array(vector, dtype=np.float32).reshape(len(queries), -1)
+        else:
+            q = self.generate_embeddings(queries, input_type="search_query")
+        faiss.normalize_L2(q)
+
+        n_candidatos = max(k, fetch_k or 4 * k) if mmr else k
+        n_candidatos = min(n_candidatos, self.index.ntotal)
+        scores, ids = self.index.search(q, n_candidatos)
+
+        resultados = []
+        for qi in range(len(queries)):
+            hits = [(int(i), float(sc)) for i, sc in zip(ids[qi], scores[qi]) if i != -1]
+            if mmr:
+                hits = self._mmr(hits, k, lambda_mmr)
+            resultados.append([self._resultado(i, sc) for i, sc in hits[:k]])
+        return resultados[0] if isinstance(query, str) else resultados
+
+    def lexical_index(self):
+        """
+        Índice BM25 sobre `self.chunks`: se lee del índice guardado en disco
+        o, si no lo hay, se construye la primera vez.
+        """
+        if self._bm25 is None:
+            vacio = self._vacio()
+            with self._lock_perezoso:
+                if self._bm25 is None:
+                    if self._bm25_guardado is not None:
+                        bm25 = BM25Index.desde_arrays(self._bm25_guardado)
+                        self._bm25_guardado = None
+                    else:
+                        bm25 = BM25Index()
+                        if not vacio:
+                            bm25.add(self.chunk_ids, self.chunks)
+                    self._bm25 = bm25
+        return self._bm25
+
+    def search_lexical(self, query, k=5):
+        """
+        Búsqueda BM25 de los `k` chunks con más términos de `query`
+        (números de artículo, fórmulas, nombres...). No usa la red.
+        """
+        hits = self.lexical_index().search(query, k)
+        return [self._resultado(i, sc) for i, sc in hits]
+
+    def search_hybrid(self, query, k=5, mmr=False, lambda_mmr=0.5, fetch_k=None, k_rrf=60, vector=None):
+        """
+        Búsqueda híbrida: une los rankings de FAISS y de BM25 con
+        Reciprocal Rank Fusion (puntuación = Σ 1 / (k_rrf + posición)).
+        Si no se puede calcular el embedding de la consulta (Bedrock caído,
+        sin red) o los chunks aún no tienen vector, se usa solo BM25.
+        `vector`: embedding de la consulta ya calculado, como en `search`.
+
+        Retorna: lista de dicts {"id", "score", "text", "metadata"}.
+        """
+        if self._vacio():
+            return []
+        n_candidatos = min(max(k, fetch_k or 4 * k), len(self.chunk_ids))
+
+        rankings = [[i for i, _ in self.lexical_index().search(query, n_candidatos)]]
+        if self.index is not None:
+            try:
+                rankings.append([r["id"] for r in self.search(query, k=n_candidatos, vector=vector)])
+            except Exception as e:
+                print(f"Búsqueda semántica no disponible, usando solo BM25: {e}")
+
+        hits = reciprocal_rank_fusion(rankings, k=k_rrf)[:n_candidatos]
+        # MMR compara los vectores de los candidatos: sin todos ellos, orden RRF
+        if mmr and hits and self.index is not None and not any(i in self._sin_vector for i, _ in hits):
+            # Escalamos la puntuación RRF a [0, 1] para compararla con la similitud
+            maximo = hits[0][1]
+            hits = self._mmr([(i, sc / maximo) for i, sc in hits], k, lambda_mmr)
+        return [self._resultado(i, sc) for i, sc in hits[:k]]
+
+    def _vacio(self):
+        """True si no hay ningún chunk, ni con vector ni solo en BM25."""
+        self.index  # si hay un índice de disco pendiente, lo carga (y sus chunks)
+        return not self.chunk_ids
+
+    def _resultado(self, chunk_id, score):
+        return {"id": chunk_id, "score": score, "text": self.chunks[self._pos_por_id[chunk_id]],
+                "metadata": self.chunk_metadata(chunk_id)}
+
+    def _mmr(self, hits, k, lambda_mmr):
+        """Reordena `hits` [(id, score)] con Maximal Marginal Relevance."""
+        if len(hits) <= 1:
+            return hits
+        vecs = np.vstack([self.index.reconstruct(i) for i, _ in hits])
+        relevancia = np.array([sc for _, sc in hits], dtype=np.float32)
+        similitud = vecs @ vecs.T
+
+        seleccion = []
+        restantes = list(range(len(hits)))
+        while restantes and len(seleccion) < k:
+            if seleccion:
+                redundancia = similitud[np.ix_(restantes, seleccion)].max(axis=1)
+            else:
+                redundancia = np.zeros(len(restantes), dtype=np.float32)
+            puntuacion = lambda_mmr * relevancia[restantes] - (1 - lambda_mmr) * redundancia
+            mejor = restantes[int(np.argmax(puntuacion))]
+            seleccion.append(mejor)
+            restantes.remove(mejor)
+        return [hits[i] for i in seleccion]
+
+    def diverse_chunks(self, n, max_candidatos=2000, seed=None):
+        """
+        Elige `n` chunks que cubran el temario lo mejor posible (k-center
+        voraz / farthest point sampling sobre los embeddings): cada chunk
+        elegido es el más alejado de los ya elegidos. Con más de
+        `max_candidatos` chunks se parte de una muestra aleatoria. Si hay
+        chunks sin vector (Bedrock no respondía), una muestra aleatoria.
+        Retorna: lista de dicts {"id", "text", "metadata"}.
+        """
+        if self._vacio() or n <= 0:
+            return []
+        rng = np.random.default_rng(seed)
+        ids = self.chunk_ids
+        if self._sin_vector:
+            elegidos = rng.choice(len(ids), min(n, len(ids)), replace=False)
+            return [{"id": ids[i], "text": self.chunks[i], "metadata": self.chunk_metadata(ids[i])}
+                    for i in elegidos.tolist()]
+        if len(ids) > max_candidatos:
+            ids = [ids[i] for i in rng.choice(len(ids), max_candidatos, replace=False)]
+        vecs = np.vstack([self.index.reconstruct(int(i)) for i in ids])
+
+        elegidos = [int(rng.integers(len(ids)))]
+        distancia = 1 - vecs @ vecs[elegidos[0]]  # distancia coseno al conjunto elegido
+        while len(elegidos) < min(n, len(ids)):
+            siguiente = int(np.argmax(distancia))
+            elegidos.append(siguiente)
+            distancia = np.minimum(distancia, 1 - vecs @ vecs[siguiente])
+
+        return [
+            {"id": ids[i], "text": self.chunks[self._pos_por_id[ids[i]]],
+             "metadata": self.chunk_metadata(ids[i])}
+            for i in elegidos
+        ]
+
+    def document_chunks(self, huella_doc):
+        """
+        Chunks de un documento en orden, identificado por su huella
+        (`IndexStore.huella_documento`). Retorna: lista de dicts {"id", "text", "metadata"}.
+        Los chunks casi repetidos devuelven el id y el texto del chunk
+        indexado, con su propia procedencia.
+        """
+        if self._vacio() or huella_doc not in self.doc_ranges:
+            return []
+        inicio, fin = self.doc_ranges[huella_doc]
+        resultado = []
+        for i in range(inicio, fin):
+            indexado = self.duplicados[i][0] if i in self.duplicados else i
+            if indexado in self._pos_por_id:
+                resultado.append({"id": indexado, "text": self.chunks[self._pos_por_id[indexado]],
+                                  "metadata": self.chunk_metadata(i)})
+        return resultado
+
+    def chunk_metadata(self, chunk_id):
+        """
+        Procedencia de un chunk: documento, página (desde 1) y offsets.
+        Si hay chunks casi iguales en otros sitios, van en "duplicados".
+        """
+        if chunk_id in self.duplicados:
+            _, pagina, inicio, fin = self.duplicados[chunk_id]
+        else:
+            pos = self._pos_por_id[chunk_id]
+            pagina, inicio, fin = self.chunk_paginas[pos], self.chunk_inicios[pos], self.chunk_fines[pos]
+        metadata = {
+            "documento": self._nombre_documento(chunk_id),
+            "pagina": pagina + 1,
+            "inicio": inicio,
+            "fin": fin,
+        }
+        copias = [i for i, d in self.duplicados.items() if d[0] == chunk_id]
+        if copias:
+            metadata["duplicados"] = [
+                {"documento": self._nombre_documento(i), "pagina": self.duplicados[i][1] + 1} for i in copias
+            ]
+        return metadata
+
+    def _nombre_documento(self, chunk_id):
+        documento = next(
+            (h for h, (inicio, fin) in self.doc_ranges.items() if inicio <= chunk_id < fin), None
+        )
+        return self.doc_nombres.get(documento, documento)
 
     def get_random_chunk(self):
         """
         Devuelve un chunk aleatorio del índice FAISS.
         """
-        if not self.index or not self.chunks:
+        if self._vacio():
             return None
         idx = np.random.randint(0, len(self.chunks))
         return self.chunks[idx]
+
+def _desglosar(doc):
+    """
+    Acepta un documento como string o como dict de
+    DocumentUploader.get_documents_info(); devuelve (texto, nombre, limites).
+    """
+    if isinstance(doc, str):
+        return doc, None, None
+    return doc["texto"], doc.get("nombre"), doc.get("paginas")
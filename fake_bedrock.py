@@ -0,0 +1,165 @@
+# fake_bedrock.py
+
+import hashlib
+import io
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+import numpy as np
+from botocore.exceptions import ClientError
+
+class FakeBedrockClient:
+    """
+    Cliente local que imita a `boto3.client('bedrock-runtime')` sin red.
+
+    Sirve para probar y medir el pipeline sin gastar en Bedrock:
+    - Embeddings deterministas (el mismo texto da siempre el mismo vector).
+    - Respuestas de Claude con el formato Pregunta:/Respuesta:.
+    - Latencia configurable (`latencia` segundos + `jitter`).
+    - Errores de throttling si se supera `max_concurrencia` llamadas a la
+      vez, o al azar con probabilidad `tasa_errores`.
+    """
+    def __init__(self, dim=1024, latencia=0.05, jitter=0.0, tasa_errores=0.0,
+                 max_concurrencia=None, seed=0):
+        self.dim = dim
+        self.latencia = latencia
+        self.jitter = jitter
+        self.tasa_errores = tasa_errores
+        self.max_concurrencia = max_concurrencia
+        self.llamadas = 0
+        self.errores = 0
+        self._en_curso = 0
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+
+    def invoke_model(self, modelId, body, accept=None, contentType=None):
+        datos = json.loads(body)
+        with self._lock:
+            self.llamadas += 1
+            self._en_curso += 1
+            saturado = self.max_concurrencia is not None and self._en_curso > self.max_concurrencia
+            fallo = saturado or self._random.random() < self.tasa_errores
+            espera = self.latencia + self._random.uniform(0, self.jitter)
+        try:
+            time.sleep(espera)
+            if fallo:
+                with self._lock:
+                    self.errores += 1
+                raise ClientError(
+                    {"Error": {"Code": "ThrottlingException", "Message": "Too many requests"}},
+                    "InvokeModel",
+                )
+            if modelId.startswith("cohere.embed"):
+                respuesta = {"embeddings": [self._vector(t).tolist() for t in datos["texts"]]}
+            else:
+                respuesta = self._respuesta_claude(datos)
+            return {"body": io.BytesIO(json.dumps(respuesta).encode("utf-8"))}
+        finally:
+            with self._lock:
+                self._en_curso -= 1
+
+    def invoke_model_with_response_stream(self, modelId, body, accept=None, contentType=None):
+        """
+        Streaming de Claude con el mismo formato de eventos que Bedrock:
+        la latencia se reparte entre trozos de unos 20 caracteres.
+        """
+        datos = json.loads(body)
+        with self._lock:
+            self.llamadas += 1
+            fallo = self._random.random() < self.tasa_errores
+            if fallo:
+                self.errores += 1
+        if fallo:
+            raise ClientError(
+                {"Error": {"Code": "ThrottlingException", "Message": "Too many requests"}},
+                "InvokeModelWithResponseStream",
+            )
+        texto = self._texto_claude(datos)
+        trozos = [texto[i:i + 20] for i in range(0, len(texto), 20)]
+
+        def eventos():
+            yield self._evento({"type": "message_start"})
+            for trozo in trozos:
+                time.sleep(self.latencia / max(len(trozos), 1))
+                yield self._evento({"type": "content_block_delta",
+                                    "delta": {"type": "text_delta", "text": trozo}})
+            yield self._evento({"type": "message_stop"})
+
+        return {"body": eventos()}
+
+    @staticmethod
+    def _evento(datos):
+        return {"chunk": {"bytes": json.dumps(datos).encode("utf-8")}}
+
+    def _vector(self, texto):
+        """Vector pseudoaleatorio y normalizado derivado del hash del texto."""
+        semilla = int.from_bytes(hashlib.sha256(texto.encode("utf-8")).digest()[:8], "little")
+        v = np.random.default_rng(semilla).standard_normal(self.dim).astype(np.float32)
+        return v / np.linalg.norm(v)
+
+    def _texto_claude(self, datos):
+        """Texto de respuesta simulado a partir del prompt."""
+        prompt = datos["messages"][-1]["content"]
+        frases = [f.strip() for f in prompt.split(".") if len(f.strip()) > 30][:5] or ["el contenido"]
+        return "\n".join(
+            f"Pregunta: ¿Qué se afirma sobre {f[:60]}?\nRespuesta: {f}" for f in frases
+        )
+
+    def _respuesta_claude(self, datos):
+        texto = self._texto_claude(datos)
+        return {
+            "content": [{"type": "text", "text": texto}],
+            "usage": {"input_tokens": len(datos["messages"][-1]["content"]) // 4,
+                      "output_tokens": len(texto) // 4},
+        }
+
+def servir_stub(cliente=None, puerto=8765, host="127.0.0.1"):
+    """
+    Servidor HTTP local que responde como Bedrock (POST /model/{id}/invoke)
+    usando un FakeBedrockClient. Sirve para probar el cliente asíncrono:
+    `AsyncBedrockClient(endpoint_url="http://127.0.0.1:8765")`.
+    Los errores simulados se devuelven como 429 con `x-amzn-ErrorType`.
+    Retorna el servidor (server.shutdown() lo para).
+    """
+    cliente = cliente or FakeBedrockClient()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, como Bedrock
+
+        def do_POST(self):
+            partes = self.path.strip("/").split("/")
+            if len(partes) != 3 or partes[0] != "model" or partes[2] != "invoke":
+                self._responder(404, {"message": "Not found"})
+                return
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            try:
+                respuesta = cliente.invoke_model(modelId=unquote(partes[1]), body=body)
+            except ClientError as e:
+                codigo = e.response["Error"]["Code"]
+                self._responder(429, {"message": e.response["Error"]["Message"]}, codigo)
+                return
+            self._responder(200, respuesta["body"].read())
+
+        def _responder(self, estado, cuerpo, error=None):
+            if not isinstance(cuerpo, bytes):
+                cuerpo = json.dumps(cuerpo).encode("utf-8")
+            self.send_response(estado)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(cuerpo)))
+            if error:
+                self.send_header("x-amzn-ErrorType", error)
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer((host, puerto), Handler)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    print(f"Bedrock simulado en http://{host}:{puerto}")
+    return servidor
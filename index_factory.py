@@ -0,0 +1,138 @@
+# index_factory.py
+
+import faiss
+import numpy as np
+
+# Tipos de índice disponibles en FAISSManager
+TIPOS_INDICE = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+# Cómo se guarda cada vector: 4, 2 o 1 byte por dimensión
+ALMACENAMIENTOS = ("float32", "fp16", "sq8")
+_TIPOS_SQ = {
+    "fp16": faiss.ScalarQuantizer.QT_fp16,
+    "sq8": faiss.ScalarQuantizer.QT_8bit,
+}
+
+def crear_indice(tipo, dim, n_entrenamiento=None, nlist=1024, pq_m=64, pq_bits=8, hnsw_m=32,
+                 almacenamiento="float32", pca_dim=None):
+    """
+    Crea un índice de producto interno (coseno con vectores normalizados)
+    que admite `add_with_ids` y `remove_ids`:
+
+    - "flat":     búsqueda exacta (IndexFlatIP). Para corpus pequeños.
+    - "ivf_flat": `nlist` listas invertidas, vectores completos.
+    - "ivf_pq":   listas invertidas + Product Quantization (`pq_m` subvectores
+                  de `pq_bits` bits): mucha menos memoria, recall algo menor.
+    - "hnsw":     grafo HNSW con `hnsw_m` vecinos por nodo. No necesita
+                  entrenamiento, pero no permite borrar (ver FAISSManager).
+
+    `almacenamiento` ("fp16" o "sq8") guarda los vectores de flat, ivf_flat y
+    hnsw con cuantización escalar: 2x o 4x menos memoria que float32 con una
+    pérdida de recall muy pequeña (ivf_pq ya va comprimido y lo ignora).
+    `pca_dim` reduce antes la dimensión con PCA (y vuelve a normalizar);
+    hay que entrenar el índice aunque sea "flat".
+
+    `n_entrenamiento` es el número de vectores disponibles para entrenar;
+    si no llegan para el tipo pedido, se reduce `nlist` o se usa "flat".
+    """
+    if tipo not in TIPOS_INDICE:
+        raise ValueError(f"Tipo de índice no soportado: {tipo}. Opciones: {TIPOS_INDICE}")
+    if almacenamiento not in ALMACENAMIENTOS:
+        raise ValueError(f"Almacenamiento no soportado: {almacenamiento}. Opciones: {ALMACENAMIENTOS}")
+
+    if pca_dim and pca_dim < dim:
+        if n_entrenamiento is not None and n_entrenamiento < pca_dim:
+            print(f"No hay datos suficientes para PCA a {pca_dim} dimensiones "
+                  f"({n_entrenamiento} vectores); se mantienen {dim}.")
+        else:
+            interno = _crear_base(tipo, pca_dim, n_entrenamiento, nlist, pq_m, pq_bits, hnsw_m, almacenamiento)
+            index = faiss.IndexPreTransform(faiss.NormalizationTransform(pca_dim), interno)
+            index.prepend_transform(faiss.PCAMatrix(dim, pca_dim))
+            return index
+    return _crear_base(tipo, dim, n_entrenamiento, nlist, pq_m, pq_bits, hnsw_m, almacenamiento)
+
+def _crear_base(tipo, dim, n_entrenamiento, nlist, pq_m, pq_bits, hnsw_m, almacenamiento):
+    """Índice sin transformaciones previas (ver `crear_indice`)."""
+    if tipo.startswith("ivf") and n_entrenamiento is not None:
+        # FAISS recomienda unos 39 puntos de entrenamiento por lista
+        nlist = max(1, min(nlist, n_entrenamiento // 39))
+        if tipo == "ivf_pq" and (n_entrenamiento < 2 ** pq_bits or dim % pq_m != 0):
+            print(f"No hay datos suficientes para IVF-PQ ({n_entrenamiento} vectores); usando IVF-Flat.")
+            tipo = "ivf_flat"
+        if nlist < 2:
+            print(f"No hay datos suficientes para IVF ({n_entrenamiento} vectores); usando flat.")
+            tipo = "flat"
+
+    qtype = _TIPOS_SQ.get(almacenamiento)
+    if tipo == "flat":
+        if qtype is None:
+            return faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+        return faiss.IndexIDMap2(faiss.IndexScalarQuantizer(dim, qtype, faiss.METRIC_INNER_PRODUCT))
+    if tipo == "hnsw":
+        if qtype is None:
+            return faiss.IndexIDMap2(faiss.IndexHNSWFlat(dim, hnsw_m, faiss.METRIC_INNER_PRODUCT))
+        return faiss.IndexIDMap2(faiss.IndexHNSWSQ(dim, qtype, hnsw_m, faiss.METRIC_INNER_PRODUCT))
+
+    # Los IVF gestionan ids propios; el direct map en tabla hash permite
+    # reconstruir vectores por id y borrar a la vez.
+    cuantizador = faiss.IndexFlatIP(dim)
+    if tipo == "ivf_flat" and qtype is None:
+        index = faiss.IndexIVFFlat(cuantizador, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+    elif tipo == "ivf_flat":
+        index = faiss.IndexIVFScalarQuantizer(cuantizador, dim, nlist, qtype, faiss.METRIC_INNER_PRODUCT)
+    else:
+        index = faiss.IndexIVFPQ(cuantizador, dim, nlist, pq_m, pq_bits, faiss.METRIC_INNER_PRODUCT)
+    index.set_direct_map_type(faiss.DirectMap.Hashtable)
+    return index
+
+def entrenar(index, vectores, max_muestra=100000, seed=0):
+    """Entrena el índice (si lo necesita) con una muestra de los vectores."""
+    if index.is_trained:
+        return
+    if len(vectores) > max_muestra:
+        rng = np.random.default_rng(seed)
+        vectores = vectores[rng.choice(len(vectores), max_muestra, replace=False)]
+    index.train(np.ascontiguousarray(vectores, dtype=np.float32))
+
+def ajustar_busqueda(index, nprobe=None, ef_search=None):
+    """
+    Ajusta los parámetros de búsqueda: `nprobe` (listas visitadas en IVF)
+    y `ef_search` (tamaño de la cola en HNSW). Más alto = más recall y
+    menos consultas por segundo. Los parámetros que no aplican se ignoran.
+    """
+    params = faiss.ParameterSpace()
+    base = base_index(index)
+    if nprobe is not None and isinstance(base, faiss.IndexIVF):
+        params.set_index_parameter(index, "nprobe", int(nprobe))
+    if ef_search is not None and isinstance(base, faiss.IndexHNSW):
+        params.set_index_parameter(index, "efSearch", int(ef_search))
+
+def base_index(index):
+    """Índice interno quitando envoltorios (IDMap, PreTransform)."""
+    index = faiss.downcast_index(index)
+    while isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2, faiss.IndexPreTransform)):
+        index = faiss.downcast_index(index.index)
+    return index
+
+def reconstruccion_exacta(index):
+    """True si `reconstruct` devuelve el vector original (sin PCA ni cuantización)."""
+    if isinstance(faiss.downcast_index(index), faiss.IndexPreTransform):
+        return False
+    base = base_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        return isinstance(base, faiss.IndexHNSWFlat)
+    return isinstance(base, (faiss.IndexFlat, faiss.IndexIVFFlat))
+
+def admite_borrado(index):
+    """HNSW no implementa remove_ids; hay que reconstruir el índice."""
+    return not isinstance(base_index(index), faiss.IndexHNSW)
+
+def memoria_indice(index):
+    """Bytes que ocupa el índice serializado (≈ memoria en RAM)."""
+    return int(faiss.serialize_index(index).nbytes)
+
+def bytes_por_vector(index):
+    """Bytes aproximados por vector en el índice: código, id y enlaces del grafo en HNSW."""
+    base = base_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        return faiss.downcast_index(base.storage).code_size + 4 * base.hnsw.nb_neighbors(0) + 8
+    return getattr(base, "code_size", base.d * 4) + 8
@@ -0,0 +1,140 @@
+# index_store.py
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import faiss
+import numpy as np
+
+class ChunksEnDisco:
+    """
+    Lista de chunks de solo lectura respaldada por ficheros en disco.
+
+    El texto de todos los chunks se guarda concatenado en UTF-8 (`chunks.bin`)
+    y `offsets.npy` guarda dónde empieza y acaba cada uno. Ambos se abren
+    mapeados en memoria, así que solo se decodifican los chunks que se leen.
+    """
+    def __init__(self, directorio):
+        ruta_datos = os.path.join(directorio, "chunks.bin")
+        # np.memmap no admite ficheros vacíos
+        if os.path.getsize(ruta_datos):
+            self._datos = np.memmap(ruta_datos, dtype=np.uint8, mode="r")
+        else:
+            self._datos = np.empty(0, dtype=np.uint8)
+        self._offsets = np.load(os.path.join(directorio, "offsets.npy"), mmap_mode="r")
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        inicio, fin = int(self._offsets[i]), int(self._offsets[i + 1])
+        return self._datos[inicio:fin].tobytes().decode("utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+class IndexStore:
+    """
+    Guarda en disco índices FAISS junto a sus chunks, identificados por
+    la huella (hash) del conjunto de documentos que los generó.
+
+    Estructura: <directorio>/<huella>/{index.faiss, chunks.bin, offsets.npy, ids.npy,
+                                      meta.json, meta_<campo>.npy}
+    """
+    def __init__(self, directorio=".cache/indices"):
+        self.directorio = directorio
+        os.makedirs(directorio, exist_ok=True)
+
+    @staticmethod
+    def huella_documento(texto):
+        """Hash del contenido de un documento."""
+        return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def huella(docs, extra=""):
+        """
+        Huella de un conjunto de textos de documentos (no depende del orden).
+        `extra` distingue índices de los mismos documentos con distinta
+        configuración (p.ej. el tipo de índice).
+        """
+        h = hashlib.sha256(extra.encode("utf-8"))
+        for huella_doc in sorted(IndexStore.huella_documento(d) for d in docs):
+            h.update(huella_doc.encode("ascii"))
+        return h.hexdigest()
+
+    def ruta(self, huella):
+        return os.path.join(self.directorio, huella)
+
+    def existe(self, huella):
+        return os.path.exists(os.path.join(self.ruta(huella), "meta.json"))
+
+    def guardar(self, huella, index, chunks, ids, meta=None, arrays=None):
+        """
+        Escribe el índice y los chunks. Se escribe primero en un directorio
+        temporal y luego se renombra, para que otro proceso nunca vea un
+        índice a medio escribir.
+        """
+        if self.existe(huella):
+            return
+        tmp = tempfile.mkdtemp(prefix=".tmp-", dir=self.directorio)
+        try:
+            faiss.write_index(index, os.path.join(tmp, "index.faiss"))
+
+            codificados = [c.encode("utf-8") for c in chunks]
+            offsets = np.zeros(len(codificados) + 1, dtype=np.int64)
+            if codificados:
+                np.cumsum([len(c) for c in codificados], out=offsets[1:])
+            with open(os.path.join(tmp, "chunks.bin"), "wb") as f:
+                for c in codificados:
+                    f.write(c)
+            np.save(os.path.join(tmp, "offsets.npy"), offsets)
+            np.save(os.path.join(tmp, "ids.npy"), np.asarray(ids, dtype=np.int64))
+            # Metadatos por chunk (página, offsets...), un .npy por campo
+            for nombre, valores in (arrays or {}).items():
+                np.save(os.path.join(tmp, f"meta_{nombre}.npy"), np.asarray(valores))
+
+            with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(dict(meta or {}, num_chunks=len(codificados)), f)
+
+            os.replace(tmp, self.ruta(huella))
+        except OSError:
+            # Otro proceso lo ha guardado a la vez; nos quedamos con el suyo
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not self.existe(huella):
+                raise
+
+    def leer_indice(self, huella, mmap=True):
+        """
+        Solo el índice FAISS. Uno leído con mmap no se puede modificar ni
+        copiar con `faiss.clone_index` (listas invertidas en disco); para
+        editarlo hay que leerlo con `mmap=False`.
+        """
+        flags = faiss.IO_FLAG_MMAP if mmap else 0
+        return faiss.read_index(os.path.join(self.ruta(huella), "index.faiss"), flags)
+
+    def cargar(self, huella, mmap=True):
+        """
+        Devuelve (index, chunks, ids, meta, arrays). Con `mmap=True` los vectores no se
+        copian a RAM: varios procesos comparten las mismas páginas del fichero.
+        """
+        directorio = self.ruta(huella)
+        index = self.leer_indice(huella, mmap)
+        with open(os.path.join(directorio, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        ids = np.load(os.path.join(directorio, "ids.npy"))
+        arrays = {
+            fichero[len("meta_"):-len(".npy")]: np.load(os.path.join(directorio, fichero))
+            for fichero in os.listdir(directorio)
+            if fichero.startswith("meta_") and fichero.endswith(".npy")
+        }
+        return index, ChunksEnDisco(directorio), ids, meta, arrays
@@ -1,12 +1,114 @@
 # manager.py
 
 import random
+import re
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+
+class SentenceIndex:
+    """
+    Frases de un texto segmentadas una sola vez.
+
+    Las frases no se copian: se guardan sus offsets en el texto original
+    (arrays compactos) junto con una puntuación de "informatividad". Así
+    muestrear `count` frases cuesta O(count · log n) y no O(len(texto)).
+    """
+    def __init__(self, texto, min_len=30):
+        self.texto = texto
+        self.inicios = array('q')
+        self.fines = array('q')
+        self.puntuaciones = array('f')
+
+        # Misma segmentación que antes: trozos entre puntos de más de `min_len` caracteres
+        for m in re.finditer(r"[^.]+", texto):
+            inicio, fin = m.span()
+            while inicio < fin and texto[inicio].isspace():
+                inicio += 1
+            while fin > inicio and texto[fin - 1].isspace():
+                fin -= 1
+            if fin - inicio > min_len:
+                self.inicios.append(inicio)
+                self.fines.append(fin)
+                self.puntuaciones.append(self._puntuar(texto[inicio:fin]))
+
+        # Pesos acumulados para el muestreo ponderado con bisect
+        self._acumulados = list(accumulate(self.puntuaciones))
+
+    def __len__(self):
+        return len(self.inicios)
+
+    def frase(self, i):
+        return self.texto[self.inicios[i]:self.fines[i]]
+
+    def muestrear(self, count, rng=random):
+        """Índices de `count` frases distintas, ponderadas por puntuación."""
+        n = len(self)
+        if count >= n:
+            indices = list(range(n))
+            rng.shuffle(indices)
+            return indices
+        total = self._acumulados[-1]
+        elegidos = []
+        vistos = set()
+        intentos = 0
+        while len(elegidos) < count and intentos < count * 20:
+            intentos += 1
+            i = bisect_right(self._acumulados, rng.random() * total)
+            if i < n and i not in vistos:
+                vistos.add(i)
+                elegidos.append(i)
+        # Si hay muchas repeticiones (pocas frases con mucho peso) completamos al azar
+        if len(elegidos) < count:
+            restantes = [i for i in range(n) if i not in vistos]
+            elegidos.extend(rng.sample(restantes, count - len(elegidos)))
+        return elegidos
+
+    @staticmethod
+    def _puntuar(frase):
+        """
+        Puntuación heurística: frases de longitud media, con vocabulario
+        variado, cifras o nombres propios suelen dar mejores preguntas.
+        """
+        palabras = frase.split()
+        distintas = len({p.lower() for p in palabras})
+        puntuacion = min(len(palabras), 40) / 40 * (distintas / len(palabras))
+        if any(c.isdigit() for c in frase):
+            puntuacion += 0.3
+        propios = sum(1 for p in palabras[1:] if p[:1].isupper())
+        puntuacion += min(propios, 3) * 0.1
+        if len(palabras) > 80:
+            puntuacion *= 0.5
+        return max(puntuacion, 0.05)
+
+def _desarrollo(s):
+    return f"Explica en detalle: '{s}'", f"Respuesta elaborada sobre: {s}"
+
+def _verdadero_falso(s):
+    # De manera simplificada, asignamos al azar la respuesta como 'Verdadero' o 'Falso'.
+    # En la práctica, deberías analizar la oración para determinar su veracidad.
+    return f"'{s}'. ¿Verdadero o Falso?", random.choice(["Verdadero", "Falso"])
+
+def _corta(s):
+    # Separamos por comas a modo de ejemplo; se puede refinar la lógica
+    parts = s.split(',')
+    if len(parts) >= 2:
+        return f"¿{parts[0]}?", ','.join(parts[1:]).strip()
+    return f"Describe brevemente: '{s[:50]}'...", f"Respuesta corta sobre: {s[:50]}..."
+
+_FORMATOS = {
+    "desarrollo": _desarrollo,
+    "verdadero/falso": _verdadero_falso,
+    "verdadero falso": _verdadero_falso,
+    "preguntas cortas": _corta,
+}
 
 class ExamManager:
-    def __init__(self, agent_rag):
+    def __init__(self, agent_rag=None):
         self.agent_rag = agent_rag
         self.questions = []
         self.answers = []
+        self._indice = None  # SentenceIndex del último texto usado
 
     def resolver_ticket(self, description):
         """
@@ -30,55 +132,49 @@ class ExamManager:
 
         return solution_text
 
+    def indice_frases(self, full_text):
+        """
+        Índice de frases de `full_text`. Se construye una sola vez por texto
+        y se reutiliza en las siguientes llamadas.
+        """
+        if self._indice is None or (self._indice.texto is not full_text
+                                    and self._indice.texto != full_text):
+            self._indice = SentenceIndex(full_text)
+        return self._indice
+
     def create_development_questions(self, full_text, count=5):
         """
         Genera preguntas de desarrollo a partir de frases o temáticas detectadas en el texto.
         """
-        sentences = [s.strip() for s in full_text.split('.') if len(s.strip()) > 30]
-        selected = random.sample(sentences, min(count, len(sentences)))
-        
-        for s in selected:
-            question = f"Explica en detalle: '{s}'"
-            answer = f"Respuesta elaborada sobre: {s}"
-            self.questions.append(question)
-            self.answers.append(answer)
-        return self.questions, self.answers
+        return self.generar_lote(full_text, "desarrollo", count)
 
     def create_true_false_questions(self, full_text, count=5):
         """
         Genera preguntas de verdadero/falso, donde la 'respuesta' podría ser 'Verdadero' o 'Falso'.
         """
-        sentences = [s.strip() for s in full_text.split('.') if len(s.strip()) > 30]
-        selected = random.sample(sentences, min(count, len(sentences)))
-        
-        for s in selected:
-            question = f"'{s}'. ¿Verdadero o Falso?"
-            # De manera simplificada, asignamos al azar la respuesta como 'Verdadero' o 'Falso'.
-            # En la práctica, deberías analizar la oración para determinar su veracidad.
-            answer = random.choice(["Verdadero", "Falso"])
-            self.questions.append(question)
-            self.answers.append(answer)
-        return self.questions, self.answers
+        return self.generar_lote(full_text, "verdadero/falso", count)
 
     def create_short_questions(self, full_text, count=5):
         """
         Genera preguntas cortas (con respuestas breves) a partir del texto.
         """
-        sentences = [s.strip() for s in full_text.split('.') if len(s.strip()) > 30]
-        selected = random.sample(sentences, min(count, len(sentences)))
-        
-        for s in selected:
-            # Separamos por comas a modo de ejemplo; se puede refinar la lógica
-            parts = s.split(',')
-            if len(parts) >= 2:
-                question = f"¿{parts[0]}?"
-                answer = ','.join(parts[1:]).strip()
-            else:
-                question = f"Describe brevemente: '{s[:50]}'..."
-                answer = f"Respuesta corta sobre: {s[:50]}..."
-            
-            self.questions.append(question)
-            self.answers.append(answer)
+        return self.generar_lote(full_text, "preguntas cortas", count)
+
+    def generar_lote(self, full_text, question_type, count=5):
+        """
+        Genera `count` preguntas del tipo indicado sin llamar a ningún modelo:
+        se muestrean frases del índice (priorizando las más informativas) y se
+        formatean con plantillas. Sirve de alternativa gratuita cuando Bedrock
+        va lento o no responde.
+        Retorna (questions, answers) solo con las preguntas de esta llamada.
+        """
+        formatear = _FORMATOS.get(question_type.lower())
+        if formatear is None:
+            return [], []
+        indice = self.indice_frases(full_text)
+        pares = [formatear(indice.frase(i)) for i in indice.muestrear(count)]
+        self.questions = [q for q, _ in pares]
+        self.answers = [a for _, a in pares]
         return self.questions, self.answers
 
     def combine_claude_and_local(self, description, question_type="desarrollo"):
@@ -92,13 +188,6 @@ class ExamManager:
             return [], [], full_text  # Devuelve el error si algo falla
 
         # 2. Dependiendo del tipo de pregunta, generamos de forma local:
-        if question_type.lower() == "desarrollo":
-            qs, ans = self.create_development_questions(full_text)
-        elif question_type.lower() in ["verdadero/falso", "verdadero falso"]:
-            qs, ans = self.create_true_false_questions(full_text)
-        elif question_type.lower() == "preguntas cortas":
-            qs, ans = self.create_short_questions(full_text)
-        else:
-            qs, ans = [], []
-        
+        qs, ans = self.generar_lote(full_text, question_type)
+
         return qs, ans, "Preguntas generadas exitosamente."
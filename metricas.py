@@ -0,0 +1,267 @@
+# metricas.py
+
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+log = logging.getLogger(__name__)
+
+# Límites de los histogramas de tiempos (segundos), como los de Prometheus
+BUCKETS_TIEMPO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Límites para tamaños (textos por lote, chunks...)
+BUCKETS_TAMANO = (1, 2, 4, 8, 16, 32, 64, 96, 128, 256, 512, 1024)
+
+def _clave(nombre, etiquetas):
+    return nombre, tuple(sorted(etiquetas.items()))
+
+def _formato(nombre, etiquetas, extra=()):
+    pares = list(etiquetas) + list(extra)
+    if not pares:
+        return nombre
+    return nombre + "{" + ",".join(f'{k}="{v}"' for k, v in pares) + "}"
+
+class Metricas:
+    """
+    Métricas y trazas ligeras del proceso, sin dependencias.
+
+    - `contador(nombre, valor)`: totales acumulados (bytes, tokens, aciertos...).
+    - `observar(nombre, valor)`: histogramas (tiempos, tamaños de lote).
+    - `span(nombre)`: mide un tramo de código; el tiempo va al histograma
+      `<nombre>_segundos` y el tramo (con sus atributos y su padre) a la
+      lista de últimos spans y, si hay `log_path`, a un log JSON por líneas.
+    - `registrar_recolector(fn)`: valores que se leen al exportar (p.ej.
+      la tasa de aciertos de una caché).
+
+    Se exportan en formato de texto de Prometheus (`prometheus()`) o en
+    JSON (`resumen()`), y `servir(puerto)` los publica por HTTP.
+    """
+    def __init__(self, max_spans=500, log_path=None):
+        self.log_path = log_path
+        self._contadores = {}     # (nombre, etiquetas) -> valor
+        self._histogramas = {}    # (nombre, etiquetas) -> {"buckets", "cuentas", "suma", "n"}
+        self._spans = deque(maxlen=max_spans)
+        self._recolectores = []
+        self._lock = threading.Lock()
+        # Span abierto en el contexto actual: cada hilo y cada tarea de asyncio
+        # tiene el suyo, así los spans concurrentes no se mezclan
+        self._actual = contextvars.ContextVar("span_actual", default=None)
+
+    def contador(self, nombre, valor=1, **etiquetas):
+        clave = _clave(nombre, etiquetas)
+        with self._lock:
+            self._contadores[clave] = self._contadores.get(clave, 0) + valor
+
+    def observar(self, nombre, valor, buckets=BUCKETS_TIEMPO, **etiquetas):
+        clave = _clave(nombre, etiquetas)
+        with self._lock:
+            h = self._histogramas.get(clave)
+            if h is None:
+                h = self._histogramas[clave] = {
+                    "buckets": tuple(buckets), "cuentas": [0] * len(buckets), "suma": 0.0, "n": 0
+                }
+            for i, limite in enumerate(h["buckets"]):
+                if valor <= limite:
+                    h["cuentas"][i] += 1
+                    break
+            h["suma"] += valor
+            h["n"] += 1
+
+    @contextmanager
+    def span(self, nombre, **atributos):
+        """
+        Uso: `with METRICAS.span("claude", tipo=tipo) as s: ...; s["tokens"] = n`.
+        Los atributos que se añaden al dict dentro del bloque se guardan con el span.
+        """
+        registro = {"nombre": nombre, "padre": self._actual.get(),
+                    "inicio": time.time(), "atributos": atributos}
+        token = self._actual.set(nombre)
+        t0 = time.perf_counter()
+        error = None
+        try:
+            yield atributos
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            segundos = time.perf_counter() - t0
+            self._actual.reset(token)
+            registro["duracion_ms"] = round(1000 * segundos, 3)
+            if error:
+                registro["error"] = error
+                self.contador(nombre + "_errores_total")
+            self.observar(nombre + "_segundos", segundos)
+            with self._lock:
+                self._spans.append(registro)
+            self._escribir_log(registro)
+
+    def instrumentar(self, nombre):
+        """Decorador: cada llamada a la función es un span."""
+        def decorador(funcion):
+            @functools.wraps(funcion)
+            def envoltura(*args, **kwargs):
+                with self.span(nombre):
+                    return funcion(*args, **kwargs)
+            return envoltura
+        return decorador
+
+    def registrar_recolector(self, funcion):
+        """`funcion()` devuelve {nombre: valor}; se llama en cada exportación."""
+        with self._lock:
+            self._recolectores.append(funcion)
+
+    def ultimos_spans(self, n=50):
+        with self._lock:
+            return list(self._spans)[-n:]
+
+    def resumen(self):
+        """Todas las métricas en un dict serializable a JSON."""
+        with self._lock:
+            contadores = [
+                {"nombre": n, "etiquetas": dict(e), "valor": v} for (n, e), v in self._contadores.items()
+            ]
+            histogramas = [
+                {"nombre": n, "etiquetas": dict(e), "n": h["n"], "suma": h["suma"],
+                 "media": h["suma"] / h["n"] if h["n"] else 0.0}
+                for (n, e), h in self._histogramas.items()
+            ]
+        return {"contadores": contadores, "histogramas": histogramas, "valores": self._recolectar()}
+
+    def prometheus(self):
+        """
+        Métricas en el formato de texto de Prometheus, con una línea
+        `# TYPE` por métrica. Los valores de los recolectores son contadores
+        si su nombre acaba en `_total` y, si no, gauges.
+        """
+        lineas = []
+        tipos = set()
+
+        def tipo(nombre, clase):
+            if nombre not in tipos:
+                tipos.add(nombre)
+                lineas.append(f"# TYPE {nombre} {clase}")
+
+        with self._lock:
+            for (nombre, etiquetas), valor in sorted(self._contadores.items()):
+                tipo(nombre, "counter")
+                lineas.append(f"{_formato(nombre, etiquetas)} {valor}")
+            for (nombre, etiquetas), h in sorted(self._histogramas.items()):
+                tipo(nombre, "histogram")
+                acumulado = 0
+                for limite, cuenta in zip(h["buckets"], h["cuentas"]):
+                    acumulado += cuenta
+                    lineas.append(f"{_formato(nombre + '_bucket', etiquetas, [('le', limite)])} {acumulado}")
+                lineas.append(f"{_formato(nombre + '_bucket', etiquetas, [('le', '+Inf')])} {h['n']}")
+                lineas.append(f"{_formato(nombre + '_sum', etiquetas)} {h['suma']}")
+                lineas.append(f"{_formato(nombre + '_count', etiquetas)} {h['n']}")
+        for nombre, valor in sorted(self._recolectar().items()):
+            base = nombre.split("{", 1)[0]
+            tipo(base, "counter" if base.endswith("_total") else "gauge")
+            lineas.append(f"{nombre} {valor}")
+        return "\n".join(lineas) + "\n"
+
+    def reiniciar(self):
+        with self._lock:
+            self._contadores.clear()
+            self._histogramas.clear()
+            self._spans.clear()
+
+    def servir(self, puerto=9100, host="127.0.0.1"):
+        """
+        Publica `/metrics` (Prometheus) y `/metrics.json` en un hilo aparte.
+        Retorna el servidor (server.shutdown() lo para).
+        """
+        metricas = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    cuerpo, tipo = metricas.prometheus(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    datos = dict(metricas.resumen(), spans=metricas.ultimos_spans())
+                    cuerpo, tipo = json.dumps(datos, ensure_ascii=False, default=str), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                cuerpo = cuerpo.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", tipo)
+                self.send_header("Content-Length", str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def log_message(self, *args):
+                pass  # sin una línea por petición en la consola
+
+        servidor = ThreadingHTTPServer((host, puerto), Handler)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        print(f"Métricas en http://{host}:{puerto}/metrics")
+        return servidor
+
+    def _recolectar(self):
+        with self._lock:
+            recolectores = list(self._recolectores)
+        valores = {}
+        for funcion in recolectores:
+            try:
+                valores.update(funcion())
+            except Exception:
+                # Un recolector roto no debe tumbar /metrics: se cuenta y se sigue
+                log.exception("Error al recolectar métricas")
+                self.contador("metricas_recolector_errores_total")
+        return valores
+
+    def _escribir_log(self, registro):
+        if not self.log_path:
+            return
+        linea = json.dumps(registro, ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(linea + "\n")
+
+def recolector_cache(nombre, cache):
+    """Recolector de aciertos, fallos y tasa de aciertos de una caché con `estadisticas()`."""
+    def recolectar():
+        stats = cache.estadisticas()
+        total = stats["hits"] + stats["misses"]
+        return {
+            f'cache_aciertos_total{{cache="{nombre}"}}': stats["hits"],
+            f'cache_fallos_total{{cache="{nombre}"}}': stats["misses"],
+            f'cache_tasa_aciertos{{cache="{nombre}"}}': stats["hits"] / total if total else 0.0,
+        }
+    return recolectar
+
+# Métricas de todo el proceso. METRICAS_LOG=fichero.jsonl guarda cada span.
+METRICAS = Metricas(log_path=os.environ.get("METRICAS_LOG"))
+
+_servidor = None
+_servidor_iniciado = False
+_lock_servidor = threading.Lock()
+
+def servir_desde_entorno():
+    """
+    Con METRICAS_PUERTO=9100 publica el endpoint HTTP de METRICAS. Se llama
+    desde el punto de entrada (app.py, procesar_directorio.py), no al
+    importar el módulo; solo la primera llamada del proceso hace algo
+    (Streamlit vuelve a ejecutar app.py en cada interacción).
+    Retorna el servidor, o None.
+    """
+    global _servidor, _servidor_iniciado
+    puerto = os.environ.get("METRICAS_PUERTO")
+    if not puerto:
+        return None
+    with _lock_servidor:
+        if not _servidor_iniciado:
+            _servidor_iniciado = True
+            try:
+                _servidor = METRICAS.servir(int(puerto))
+            except OSError as e:
+                # p.ej. otro proceso con el puerto ya ocupado
+                log.warning("No se pudo publicar el endpoint de métricas: %s", e)
+    return _servidor
@@ -0,0 +1,201 @@
+# procesar_directorio.py
+#
+# Generación de preguntas en lote, sin Streamlit: recorre un directorio,
+# extrae e indexa todos los documentos en paralelo y genera un juego de
+# preguntas por archivo (o por tema) y tipo. Cada juego se escribe como una
+# línea JSON en cuanto termina; si la ejecución se corta, al relanzarla con
+# el mismo fichero de salida solo se generan los que faltan. Uso:
+#
+#   python procesar_directorio.py temario/ --salida preguntas.jsonl
+#   python procesar_directorio.py temario/ --tipo desarrollo --tipo "verdadero/falso" --concurrencia 16
+#   python procesar_directorio.py temario/ --temas temas.txt --salida por_tema.jsonl
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
+
+from busqueda import ClaudeAPI
+from documentos import DocumentUploader
+from examen import GeneradorExamen
+from extraccion import EXTENSIONES, huella_bytes
+from faiss_manager import FAISSManager
+from index_store import IndexStore
+from metricas import servir_desde_entorno
+
+TIPOS = ("desarrollo", "verdadero/falso", "preguntas cortas")
+
+def buscar_archivos(directorio):
+    """Rutas de los documentos soportados bajo `directorio`, en orden estable."""
+    rutas = []
+    for raiz, _, ficheros in os.walk(directorio):
+        rutas.extend(os.path.join(raiz, f) for f in ficheros if f.lower().endswith(EXTENSIONES))
+    return sorted(rutas)
+
+def leer_checkpoint(salida):
+    """Claves ya terminadas en el fichero de salida (se ignoran las líneas con error o cortadas)."""
+    hechas = set()
+    if not os.path.exists(salida):
+        return hechas
+    with open(salida, "r", encoding="utf-8") as f:
+        for linea in f:
+            try:
+                registro = json.loads(linea)
+            except ValueError:
+                continue  # última línea a medias si el proceso murió escribiendo
+            if not registro.get("error"):
+                hechas.add(registro["clave"])
+    return hechas
+
+def clave(unidad, tipo):
+    return f"{unidad}\x00{tipo}"
+
+def extraer(rutas, uploader, max_workers, tamano_lote=64):
+    """
+    Extrae los archivos por lotes (para no abrir cientos de ficheros a la vez).
+    Retorna (errores, duplicados), con duplicados = {ruta: ruta del archivo
+    ya cargado con el mismo contenido}.
+    """
+    errores = 0
+    duplicados = {}
+    for i in range(0, len(rutas), tamano_lote):
+        with ExitStack() as pila:
+            ficheros = [pila.enter_context(open(r, "rb")) for r in rutas[i:i + tamano_lote]]
+            resultados = uploader.add_documents(ficheros, max_workers=max_workers)
+        cargados = set(uploader.nombres)
+        for nombre, error in resultados:
+            if error is not None:
+                errores += 1
+                print(f"Error al procesar {nombre}: {error}")
+            elif nombre not in cargados:
+                # Mismo contenido que otro archivo: DocumentUploader no lo vuelve a cargar
+                with open(nombre, "rb") as f:
+                    huella = huella_bytes(f.read())
+                if huella in uploader.hashes:
+                    duplicados[nombre] = uploader.nombres[uploader.hashes.index(huella)]
+    return errores, duplicados
+
+def contextos_por_archivo(manager, uploader, k):
+    """(unidad, contexto, chunk_ids): `k` chunks repartidos a lo largo de cada archivo."""
+    for info in uploader.get_documents_info():
+        chunks = manager.document_chunks(IndexStore.huella_documento(info["texto"]))
+        if not chunks:
+            yield info["nombre"], None, []
+            continue
+        paso = len(chunks) / min(k, len(chunks))
+        elegidos = [chunks[int(j * paso)] for j in range(min(k, len(chunks)))]
+        yield info["nombre"], "\n\n".join(c["text"] for c in elegidos), [c["id"] for c in elegidos]
+
+def contextos_por_tema(manager, temas, k):
+    """(unidad, contexto, chunk_ids): los `k` chunks más relevantes de cada tema."""
+    for tema in temas:
+        relevantes = manager.search_hybrid(tema, k=k, mmr=True)
+        yield tema, "\n\n".join(r["text"] for r in relevantes) or None, [r["id"] for r in relevantes]
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera preguntas para todos los documentos de un directorio")
+    parser.add_argument("directorio")
+    parser.add_argument("--salida", default="preguntas.jsonl", help="fichero JSONL (también es el checkpoint)")
+    parser.add_argument("--tipo", action="append", choices=TIPOS,
+                        help="tipo de preguntas (se puede repetir; por defecto todos)")
+    parser.add_argument("--temas", help="fichero con un tema por línea: un juego por tema en vez de por archivo")
+    parser.add_argument("--preguntas", type=int, default=5, help="preguntas por juego")
+    parser.add_argument("--k", type=int, default=3, help="chunks de contexto por juego")
+    parser.add_argument("--concurrencia", type=int, default=8,
+                        help="llamadas simultáneas a Bedrock (embeddings y Claude)")
+    parser.add_argument("--rate", type=float, default=0.0,
+                        help="llamadas a Claude por segundo (0 = sin límite: solo la concurrencia)")
+    parser.add_argument("--extraccion-workers", type=int, default=None, help="procesos de extracción")
+    parser.add_argument("--index-type", default="flat")
+    args = parser.parse_args()
+    servir_desde_entorno()
+    tipos = args.tipo or list(TIPOS)
+
+    inicio = time.perf_counter()
+    hechas = leer_checkpoint(args.salida)
+    rutas = buscar_archivos(args.directorio)
+    if args.temas:
+        with open(args.temas, "r", encoding="utf-8") as f:
+            temas = [t.strip() for t in f if t.strip()]
+        pendientes = rutas if any(clave(t, tipo) not in hechas for t in temas for tipo in tipos) else []
+    else:
+        temas = None
+        # Por archivo: solo hace falta extraer e indexar los que tienen algo pendiente
+        pendientes = [r for r in rutas if any(clave(r, tipo) not in hechas for tipo in tipos)]
+    print(f"{len(rutas)} archivos, {len(hechas)} juegos ya generados, "
+          f"{len(pendientes)} archivos por procesar.")
+    if not pendientes:
+        return
+
+    # 1) Extracción en paralelo (pool de procesos, con caché)
+    uploader = DocumentUploader()
+    errores, duplicados = extraer(pendientes, uploader, args.extraccion_workers)
+    print(f"Extracción: {len(uploader.documents)} documentos ({errores} con error, "
+          f"{uploader.duplicados} duplicados) en {time.perf_counter() - inicio:.1f} s.")
+
+    # 2) Índice (embeddings en paralelo con la concurrencia indicada)
+    manager = FAISSManager(max_workers=args.concurrencia, index_type=args.index_type)
+    claude_api = ClaudeAPI(bedrock_client=manager.bedrock_client, faiss_manager=manager, rate=args.rate)
+    manager.sync_documents(uploader.get_documents_info())
+    print(f"Índice: {len(manager.chunks)} chunks en {time.perf_counter() - inicio:.1f} s.")
+
+    # 3) Generación: fan-out acotado por la concurrencia de Bedrock
+    if temas:
+        contextos = contextos_por_tema(manager, temas, args.k)
+    else:
+        contextos = contextos_por_archivo(manager, uploader, args.k)
+    tareas = [
+        (unidad, contexto, chunk_ids, tipo)
+        for unidad, contexto, chunk_ids in contextos
+        for tipo in tipos if clave(unidad, tipo) not in hechas
+    ]
+    # Mismas llamadas con reintentos que el examen completo (y el límite de ritmo del ClaudeAPI)
+    generador = GeneradorExamen(claude_api, max_workers=args.concurrencia)
+    tema_prompt = (lambda unidad: f"el tema: {unidad}") if temas else (lambda unidad: "todo el contenido del documento")
+
+    def trabajo(unidad, contexto, chunk_ids, tipo):
+        t0 = time.perf_counter()
+        registro = {"clave": clave(unidad, tipo), "unidad": unidad, "tipo": tipo, "chunk_ids": chunk_ids}
+        if contexto is None:
+            registro.update(questions=[], answers=[], omitido="sin texto")
+        else:
+            try:
+                questions, answers = generador.llamar(contexto, tema_prompt(unidad), tipo, args.preguntas)
+                registro.update(questions=questions, answers=answers)
+            except Exception as e:
+                registro["error"] = str(e)
+        registro["segundos"] = round(time.perf_counter() - t0, 3)
+        return registro
+
+    generados = fallidos = 0
+    with open(args.salida, "a", encoding="utf-8") as salida, \
+            ThreadPoolExecutor(max_workers=args.concurrencia) as pool:
+        if not temas:
+            # Los archivos repetidos apuntan al original; así no se vuelven a extraer al relanzar
+            for ruta, original in duplicados.items():
+                for tipo in tipos:
+                    if clave(ruta, tipo) not in hechas:
+                        registro = {"clave": clave(ruta, tipo), "unidad": ruta, "tipo": tipo,
+                                    "duplicado_de": original, "questions": [], "answers": []}
+                        salida.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            salida.flush()
+        futuros = [pool.submit(trabajo, *t) for t in tareas]
+        for futuro in as_completed(futuros):
+            registro = futuro.result()
+            # Una línea por juego, escrita en cuanto termina: es el checkpoint
+            salida.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            salida.flush()
+            if registro.get("error"):
+                fallidos += 1
+                print(f"Error en {registro['unidad']} ({registro['tipo']}): {registro['error']}")
+            else:
+                generados += 1
+
+    segundos = time.perf_counter() - inicio
+    print(f"Generados {generados} juegos ({fallidos} con error, se reintentan al relanzar) "
+          f"en {segundos:.1f} s ({generados / segundos:.2f} juegos/s).")
+
+if __name__ == "__main__":
+    main()
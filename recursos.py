@@ -0,0 +1,58 @@
+# recursos.py
+
+import threading
+
+import boto3
+from botocore.config import Config
+
+from cache_respuestas import ResponseCache
+from embedding_cache import EmbeddingCache
+from metricas import METRICAS, recolector_cache
+
+# Recursos compartidos por todo el proceso: todas las sesiones de Streamlit
+# (y todos los reruns) usan el mismo cliente de Bedrock y la misma caché.
+_lock = threading.Lock()
+_clientes = {}
+_caches = {}
+_caches_respuestas = {}
+
+def get_bedrock_client(region_name="us-east-1", max_pool_connections=50):
+    """
+    Cliente de 'bedrock-runtime' compartido. Los clientes de boto3 son
+    thread-safe; con un pool de conexiones amplio y keep-alive se
+    reutilizan las conexiones HTTPS en vez de abrir una por petición.
+    """
+    clave = (region_name, max_pool_connections)
+    with _lock:
+        if clave not in _clientes:
+            config = Config(
+                max_pool_connections=max_pool_connections,
+                tcp_keepalive=True,
+                connect_timeout=10,
+                read_timeout=120,
+                retries={"max_attempts": 3, "mode": "adaptive"},
+            )
+            # Sesión propia: la sesión por defecto de boto3 no es thread-safe
+            session = boto3.session.Session()
+            _clientes[clave] = session.client("bedrock-runtime", region_name=region_name, config=config)
+            print("Cliente de Bedrock inicializado.")
+        return _clientes[clave]
+
+def get_embedding_cache(directorio=".cache/embeddings"):
+    """
+    Caché de embeddings compartida por directorio: dos instancias sobre los
+    mismos ficheros se pisarían el índice.
+    """
+    with _lock:
+        if directorio not in _caches:
+            _caches[directorio] = EmbeddingCache(directorio)
+            METRICAS.registrar_recolector(recolector_cache("embeddings", _caches[directorio]))
+        return _caches[directorio]
+
+def get_response_cache(directorio=".cache/respuestas"):
+    """Caché de respuestas de Claude compartida por directorio."""
+    with _lock:
+        if directorio not in _caches_respuestas:
+            _caches_respuestas[directorio] = ResponseCache(directorio)
+            METRICAS.registrar_recolector(recolector_cache("respuestas", _caches_respuestas[directorio]))
+        return _caches_respuestas[directorio]
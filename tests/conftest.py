@@ -0,0 +1,38 @@
+# conftest.py
+#
+# Las pruebas no usan la red: Bedrock se sustituye por fake_bedrock.FakeBedrockClient.
+# Los módulos están en la raíz del repositorio. Uso: python -m pytest -q
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datos_sinteticos import paginas_sinteticas
+from fake_bedrock import FakeBedrockClient
+from faiss_manager import FAISSManager
+
+@pytest.fixture
+def fake():
+    return FakeBedrockClient(dim=64, latencia=0.0)
+
+@pytest.fixture
+def manager(fake):
+    """FAISSManager sin cachés en disco sobre el Bedrock simulado."""
+    return FAISSManager(bedrock_client=fake, cache_dir=None, index_dir=None, rate=None,
+                        max_tokens=120, overlap_tokens=10)
+
+@pytest.fixture
+def documentos():
+    """Tres documentos sintéticos de 4 páginas, con sus límites de página."""
+    docs = []
+    for seed in range(3):
+        paginas = paginas_sinteticas(4, frases_por_pagina=12, seed=seed)
+        limites, offset = [], 0
+        for pagina in paginas:
+            limites.append(offset)
+            offset += len(pagina) + 1
+        docs.append({"nombre": f"doc{seed}.pdf", "texto": "\n".join(paginas), "paginas": limites})
+    return docs
@@ -0,0 +1,46 @@
+import asyncio
+import json
+
+import pytest
+
+from bedrock_async import AsyncBedrockClient
+from fake_bedrock import servir_stub
+
+BODY = json.dumps({"texts": ["hola"], "input_type": "search_query"})
+
+@pytest.fixture
+def stub(fake):
+    servidor = servir_stub(fake, puerto=0)
+    yield f"http://127.0.0.1:{servidor.server_address[1]}"
+    servidor.shutdown()
+
+def test_cambiar_de_loop_cierra_la_sesion_anterior(stub):
+    cliente = AsyncBedrockClient(endpoint_url=stub)
+
+    async def embeber():
+        respuesta = await cliente.invoke_model("cohere.embed-multilingual-v3", BODY)
+        return json.loads(respuesta["body"].read())["embeddings"]
+
+    assert asyncio.run(embeber())
+    primera = cliente._session
+    assert asyncio.run(embeber())
+
+    assert primera.closed and cliente._session is not primera
+    asyncio.run(cliente.close())
+
+def test_firma_dentro_del_semaforo(stub):
+    cliente = AsyncBedrockClient(endpoint_url=stub, max_concurrencia=1)
+    en_cola = []
+    firmar = cliente._firmar
+    def espia(*args):
+        en_cola.append(cliente._semaforo.locked())
+        return firmar(*args)
+    cliente._firmar = espia
+
+    async def varias():
+        async with cliente:
+            await asyncio.gather(*(cliente.invoke_model("cohere.embed-multilingual-v3", BODY)
+                                   for _ in range(4)))
+
+    asyncio.run(varias())
+    assert en_cola == [True] * 4
@@ -0,0 +1,44 @@
+from bm25 import BM25Index, reciprocal_rank_fusion, tokenizar
+
+def _indice():
+    bm25 = BM25Index()
+    bm25.add([1, 2, 3], [
+        "La célula eucariota tiene núcleo y mitocondrias.",
+        "El artículo 14 de la Constitución garantiza la igualdad.",
+        "Las mitocondrias producen energía en la célula.",
+    ])
+    return bm25
+
+def test_tokenizar_quita_tildes_y_palabras_vacias():
+    assert tokenizar("La Célula y el artículo 14") == ["celula", "articulo", "14"]
+
+def test_busca_por_terminos():
+    bm25 = _indice()
+    assert bm25.search("artículo 14")[0][0] == 2
+    assert [i for i, _ in bm25.search("mitocondrias celula")][:2] in ([1, 3], [3, 1])
+    assert bm25.search("inexistente") == []
+
+def test_remove_y_compactar():
+    bm25 = _indice()
+    bm25.remove([3])
+    assert 3 not in {i for i, _ in bm25.search("mitocondrias")}
+    bm25.remove([1])  # supera el 25 % de borrados: se compactan las listas
+    assert not bm25._borrados
+    assert bm25.search("mitocondrias") == []
+    assert len(bm25) == 1
+    bm25.add([3], ["mitocondrias otra vez"])
+    assert bm25.search("mitocondrias")[0][0] == 3
+
+def test_reciprocal_rank_fusion():
+    fusion = reciprocal_rank_fusion([[1, 2, 3], [3, 1]], k=60)
+    assert [i for i, _ in fusion] == [1, 3, 2]
+    assert fusion[0][1] == 1 / 61 + 1 / 62
+
+def test_guardar_como_arrays():
+    bm25 = _indice()
+    bm25.remove([2])
+    copia = BM25Index.desde_arrays(bm25.a_arrays())
+    assert len(copia) == 2
+    for consulta in ("mitocondrias celula", "artículo 14", "núcleo"):
+        assert copia.search(consulta) == bm25.search(consulta)
+    assert len(BM25Index.desde_arrays(BM25Index().a_arrays())) == 0
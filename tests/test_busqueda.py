@@ -0,0 +1,157 @@
+import asyncio
+
+from bedrock_async import AsyncBedrockClient
+from busqueda import ClaudeAPI, IncrementalQAParser
+from faiss_manager import FAISSManager
+from fake_bedrock import FakeBedrockClient, servir_stub
+
+RESPUESTA = (
+    "Aquí tienes las preguntas:\n"
+    "Pregunta: ¿Qué es una célula?\n"
+    "Respuesta: La unidad básica\n"
+    "de la vida.\n"
+    "Pregunta: ¿Qué produce la mitocondria?\n"
+    "Respuesta: Energía (ATP).\n"
+    "Pregunta: ¿Sin respuesta?\n"
+)
+
+def test_parser_incremental_coincide_con_el_completo(fake, manager):
+    claude_api = ClaudeAPI(bedrock_client=fake, faiss_manager=manager, cache_dir=None)
+    questions, answers = claude_api._parse_questions_and_answers(RESPUESTA)
+    assert len(questions) == len(answers) == 3
+    assert answers[-1] == ""
+
+    for tamano in (1, 7, 50, len(RESPUESTA)):
+        parser = IncrementalQAParser()
+        pares = []
+        for i in range(0, len(RESPUESTA), tamano):
+            pares.extend(parser.feed(RESPUESTA[i:i + tamano]))
+        pares.extend(parser.close())
+        assert [q for q, _ in pares] == questions
+        assert [a for _, a in pares] == answers
+
+def test_parser_devuelve_cada_par_al_empezar_el_siguiente():
+    parser = IncrementalQAParser()
+    assert parser.feed("Pregunta: uno\nRespuesta: a\n") == []
+    assert parser.feed("Pregunta: dos") == []
+    assert parser.feed("\n") == [("uno", "a")]
+    assert parser.close() == [("dos", "")]
+
+def test_generar_preguntas_con_el_fake(fake, manager, documentos):
+    claude_api = ClaudeAPI(bedrock_client=fake, faiss_manager=manager, cache_dir=None)
+    texto = "\n".join(d["texto"] for d in documentos)
+
+    questions, answers = claude_api.generar_preguntas(texto, "el tema: sistema", "desarrollo",
+                                                      documentos=documentos, consulta="sistema")
+
+    assert questions and len(questions) == len(answers)
+    assert manager.huella is not None
+
+def test_streaming_da_las_mismas_preguntas(fake, manager, documentos):
+    claude_api = ClaudeAPI(bedrock_client=fake, faiss_manager=manager, cache_dir=None)
+    texto = "\n".join(d["texto"] for d in documentos)
+    argumentos = dict(full_text=texto, tema="el tema: red", tipo="desarrollo",
+                      documentos=documentos, consulta="red")
+
+    pares = list(claude_api.generar_preguntas_stream(**argumentos))
+    questions, answers = claude_api.generar_preguntas(**argumentos)
+
+    assert [q for q, _ in pares] == questions
+    assert claude_api.tiempos_primera_pregunta
+
+def test_cache_solo_con_contexto_de_busqueda(fake, manager, documentos, tmp_path):
+    claude_api = ClaudeAPI(bedrock_client=fake, faiss_manager=manager, cache_dir=str(tmp_path))
+    llamadas = []
+    original = claude_api.generar_desde_contexto
+    claude_api.generar_desde_contexto = lambda *args: llamadas.append(args) or original(*args)
+    texto = "\n".join(d["texto"] for d in documentos)
+
+    # Contexto al azar (sin tema): cada vez se llama a Claude
+    for _ in range(2):
+        claude_api.generar_preguntas(texto, "todo", "desarrollo", documentos=documentos)
+    assert len(llamadas) == 2
+
+    # Con tema, la segunda vez sale de la caché
+    for _ in range(2):
+        claude_api.generar_preguntas(texto, "el tema: red", "desarrollo", documentos=documentos, consulta="red")
+    assert len(llamadas) == 3
+
+def test_streaming_desde_cache_no_cuenta_como_primera_pregunta(fake, manager, documentos, tmp_path):
+    claude_api = ClaudeAPI(bedrock_client=fake, faiss_manager=manager, cache_dir=str(tmp_path))
+    texto = "\n".join(d["texto"] for d in documentos)
+    argumentos = dict(full_text=texto, tema="el tema: red", tipo="desarrollo",
+                      documentos=documentos, consulta="red")
+
+    primera = list(claude_api.generar_preguntas_stream(**argumentos))
+    segunda = list(claude_api.generar_preguntas_stream(**argumentos))
+
+    assert segunda == primera
+    assert len(claude_api.tiempos_primera_pregunta) == 1
+
+def test_generacion_local_si_bedrock_no_responde(documentos):
+    caido = FakeBedrockClient(dim=64, latencia=0.0, tasa_errores=1.0)
+    servidor = servir_stub(caido, puerto=0)
+    cliente_async = AsyncBedrockClient(endpoint_url=f"http://127.0.0.1:{servidor.server_address[1]}",
+                                       max_retries=0)
+    manager = FAISSManager(bedrock_client=caido, cache_dir=None, index_dir=None, rate=None, max_tokens=120,
+                           async_client=cliente_async)
+    manager.embedding_pipeline.max_retries = 0
+    claude_api = ClaudeAPI(bedrock_client=caido, faiss_manager=manager, cache_dir=None)
+    texto = "\n".join(d["texto"] for d in documentos)
+    argumentos = dict(full_text=texto, tema="el tema: red", tipo="desarrollo",
+                      documentos=documentos, consulta="red")
+
+    questions, _ = claude_api.generar_preguntas(**argumentos)
+    assert questions and claude_api.ultimo_origen == "local"
+
+    claude_api.ultimo_origen = None
+    assert list(claude_api.generar_preguntas_stream(**argumentos))
+    assert claude_api.ultimo_origen == "local"
+
+    async def generar():
+        try:
+            return await claude_api.generar_preguntas_async(**argumentos)
+        finally:
+            await cliente_async.close()
+
+    claude_api.ultimo_origen = None
+    questions, _ = asyncio.run(generar())
+    servidor.shutdown()
+    assert questions and claude_api.ultimo_origen == "local"
+
+def test_generaciones_async_contra_el_stub(fake, documentos):
+    servidor = servir_stub(fake, puerto=0)
+    cliente_async = AsyncBedrockClient(endpoint_url=f"http://127.0.0.1:{servidor.server_address[1]}")
+    manager = FAISSManager(bedrock_client=fake, cache_dir=None, index_dir=None, rate=None, max_tokens=120,
+                           async_client=cliente_async)
+    # Las consultas no deben embeberse con el cliente síncrono (bloquearía el hilo)
+    consultas_sincronas = []
+    generate_embeddings = manager.generate_embeddings
+    def espia(texts, input_type="search_document"):
+        if input_type == "search_query":
+            consultas_sincronas.extend(texts)
+        return generate_embeddings(texts, input_type)
+    manager.generate_embeddings = espia
+    claude_api = ClaudeAPI(bedrock_client=fake, faiss_manager=manager, cache_dir=None)
+    texto = "\n".join(d["texto"] for d in documentos)
+
+    async def generar():
+        try:
+            # Varias a la vez: la primera sincroniza el índice y el resto busca en él
+            return await asyncio.gather(*(
+                claude_api.generar_preguntas_async(texto, f"el tema: {consulta}", "desarrollo",
+                                                   documentos=documentos, consulta=consulta)
+                for consulta in ("red", "célula", "energía", "mitocondria", "ATP")
+            ))
+        finally:
+            await cliente_async.close()
+
+    try:
+        resultados = asyncio.run(generar())
+    finally:
+        servidor.shutdown()
+
+    assert all(questions for questions, _ in resultados)
+    assert claude_api.ultimo_origen == "claude"
+    assert consultas_sincronas == []
+    assert len(manager.chunk_ids) == manager.index.ntotal
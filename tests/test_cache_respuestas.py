@@ -0,0 +1,49 @@
+import numpy as np
+
+from cache_respuestas import ResponseCache, normalizar_tema
+
+def test_normalizar_tema():
+    assert normalizar_tema("  La  Revolución, Francesa! ") == "la revolucion francesa"
+
+def test_acierto_exacto(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    cache.guardar("h", [1, 2], "desarrollo", "Tema", ["p"], ["r"])
+
+    assert cache.obtener("h", [1, 2], "desarrollo", "tema") == (["p"], ["r"])
+    assert cache.obtener("h", [1, 3], "desarrollo", "tema") is None
+    assert cache.obtener("h", [1, 2], "verdadero/falso", "tema") is None
+    assert cache.obtener("otra", [1, 2], "desarrollo", "tema") is None
+    # Sobrevive a reinicios (nivel en disco)
+    assert ResponseCache(str(tmp_path)).obtener("h", [1, 2], "desarrollo", "tema") == (["p"], ["r"])
+
+def test_acierto_semantico():
+    cache = ResponseCache(None, umbral=0.9)
+    vec = np.array([1.0, 0.0, 0.0], dtype=np.float32)
+    cache.guardar("h", [1], "desarrollo", "revolución francesa", ["p"], ["r"], tema_vec=vec)
+
+    parecido = np.array([0.95, 0.1, 0.0], dtype=np.float32)
+    distinto = np.array([0.0, 1.0, 0.0], dtype=np.float32)
+    assert cache.obtener("h", [7], "desarrollo", "la revolucion de 1789", parecido) == (["p"], ["r"])
+    assert cache.hits_semanticos == 1
+    assert cache.obtener("h", [7], "desarrollo", "mitocondrias", distinto) is None
+    assert cache.obtener("h", [7], "preguntas cortas", "la revolucion de 1789", parecido) is None
+
+def test_variantes_y_lru():
+    cache = ResponseCache(None, max_entradas=2, max_variantes=2)
+    for i in range(3):
+        cache.guardar("h", [1], "desarrollo", "tema", [f"p{i}"], [f"r{i}"])
+    variantes = cache._entradas[ResponseCache.clave("h", [1], "desarrollo", "tema")]["variantes"]
+    assert [v[0] for v in variantes] == [["p1"], ["p2"]]
+
+    cache.guardar("h", [2], "desarrollo", "tema", ["q"], ["s"])
+    cache.guardar("h", [3], "desarrollo", "tema", ["q"], ["s"])
+    assert cache.obtener("h", [1], "desarrollo", "tema") is None
+    assert cache.estadisticas()["entradas"] == 2
+
+def test_contexto_aleatorio_no_se_cachea():
+    cache = ResponseCache(None)
+    cache.guardar("h", None, "desarrollo", "tema", ["p"], ["r"])
+    assert cache.estadisticas()["entradas"] == 0
+
+    cache.guardar("h", [1], "desarrollo", "tema", ["p"], ["r"])
+    assert cache.obtener("h", None, "desarrollo", "tema") is None
@@ -0,0 +1,54 @@
+from chunker import chunk_documento, empaquetar_contexto, estimar_tokens, recortar_tokens
+from datos_sinteticos import paginas_sinteticas
+
+def test_chunks_respetan_el_presupuesto_y_cubren_el_texto():
+    texto = " ".join(paginas_sinteticas(3, frases_por_pagina=20))
+    chunks = chunk_documento(texto, max_tokens=80, overlap_tokens=10)
+
+    assert len(chunks) > 3
+    for inicio, fin, pagina in chunks:
+        assert 0 <= inicio < fin <= len(texto)
+        assert estimar_tokens(texto[inicio:fin]) <= 80
+        assert pagina == 0
+    # Sin huecos: cada chunk empieza antes de que acabe el anterior (o justo después)
+    for (_, fin_anterior, _), (inicio, _, _) in zip(chunks, chunks[1:]):
+        assert inicio <= fin_anterior + 1
+    assert chunks[-1][1] == len(texto.rstrip())
+
+def test_chunks_cortan_en_frases():
+    texto = "Primera frase con algo de texto. Segunda frase distinta. Tercera frase final."
+    chunks = chunk_documento(texto, max_tokens=7, overlap_tokens=0)
+    assert [texto[a:b] for a, b, _ in chunks] == [
+        "Primera frase con algo de texto.", "Segunda frase distinta.", "Tercera frase final."
+    ]
+
+def test_chunks_guardan_la_pagina():
+    paginas = paginas_sinteticas(3, frases_por_pagina=10)
+    texto = "\n".join(paginas)
+    limites = [0, len(paginas[0]) + 1, len(paginas[0]) + len(paginas[1]) + 2]
+    chunks = chunk_documento(texto, limites, max_tokens=60, overlap_tokens=0)
+
+    assert {p for _, _, p in chunks} == {0, 1, 2}
+    for inicio, fin, pagina in chunks:
+        assert limites[pagina] <= inicio
+
+def test_max_chars_parte_palabras_enormes():
+    texto = "x" * 5000
+    chunks = chunk_documento(texto, max_chars=2048)
+    assert all(fin - inicio <= 2048 for inicio, fin, _ in chunks)
+    assert "".join(texto[a:b] for a, b, _ in chunks) == texto
+
+def test_recortar_tokens():
+    assert recortar_tokens("uno dos tres cuatro", 2) == "uno dos"
+    assert recortar_tokens("uno, dos", 5) == "uno, dos"
+
+def test_empaquetar_contexto_salta_los_que_no_caben():
+    textos = ["uno dos tres", "cuatro " * 10, "cinco seis"]
+    contexto, usados = empaquetar_contexto(textos, presupuesto_tokens=6)
+    assert usados == [0, 2]
+    assert contexto == "uno dos tres\n\ncinco seis"
+
+def test_empaquetar_contexto_recorta_si_no_cabe_ninguno():
+    contexto, usados = empaquetar_contexto(["a b c d e f"], presupuesto_tokens=3)
+    assert (contexto, usados) == ("a b c", [0])
+    assert empaquetar_contexto([], 10) == ("", [])
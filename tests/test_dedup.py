@@ -0,0 +1,36 @@
+from datos_sinteticos import paginas_sinteticas
+from dedup import Deduplicador, shingles
+
+TEXTO = paginas_sinteticas(1, frases_por_pagina=8, seed=1)[0]
+OTRO = paginas_sinteticas(1, frases_por_pagina=8, seed=2)[0]
+
+def test_shingles():
+    assert shingles("") == set()
+    assert len(shingles("una palabra")) == 1
+    assert shingles("Célula eucariota animal vegetal") == shingles("celula EUCARIOTA animal vegetal")
+
+def test_detecta_casi_duplicados():
+    dedup = Deduplicador(umbral=0.8)
+    dedup.agregar(1, dedup.firma(TEXTO))
+    dedup.agregar(2, dedup.firma(OTRO))
+
+    # Una palabra cambiada al final: casi el mismo texto
+    variante = TEXTO.rsplit(" ", 2)[0] + " cambio final."
+    parecido = dedup.buscar(dedup.firma(variante))
+    assert parecido is not None and parecido[0] == 1 and parecido[1] >= 0.8
+    assert dedup.buscar(dedup.firma(TEXTO))[1] == 1.0
+    assert dedup.buscar(dedup.firma(paginas_sinteticas(1, 8, seed=3)[0])) is None
+
+def test_eliminar():
+    dedup = Deduplicador()
+    dedup.agregar(1, dedup.firma(TEXTO))
+    dedup.eliminar([1, 99])
+    assert len(dedup) == 0
+    assert dedup.buscar(dedup.firma(TEXTO)) is None
+    assert not dedup._cubos
+
+def test_textos_sin_palabras():
+    dedup = Deduplicador()
+    assert dedup.firma("... 1") is not None
+    assert dedup.firma("   ") is None
+    assert dedup.buscar(None) is None
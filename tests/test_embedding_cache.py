@@ -0,0 +1,51 @@
+import numpy as np
+
+from embedding_cache import EmbeddingCache
+
+def _clave(texto):
+    return EmbeddingCache.clave(texto, "modelo", "search_document")
+
+def _vector(valor, dim=4):
+    return np.full((1, dim), valor, dtype=np.float32)
+
+def test_guarda_y_recupera_tras_flush(tmp_path):
+    cache = EmbeddingCache(str(tmp_path))
+    cache.guardar([_clave("A"), _clave("B")], np.vstack([_vector(1), _vector(2)]))
+    cache.flush()
+
+    otra = EmbeddingCache(str(tmp_path))
+    a, b, c = otra.obtener([_clave("A"), _clave("B"), _clave("C")])
+    np.testing.assert_array_equal(a, _vector(1)[0])
+    np.testing.assert_array_equal(b, _vector(2)[0])
+    assert c is None
+
+def test_fila_reutilizada_sin_flush_no_devuelve_otro_vector(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_entradas=2)
+    cache.guardar([_clave("A"), _clave("B")], np.vstack([_vector(1), _vector(2)]))
+    cache.flush()
+    # C expulsa a A y ocupa su fila; el proceso "muere" antes del flush
+    cache.guardar([_clave("C")], _vector(3))
+
+    otra = EmbeddingCache(str(tmp_path), max_entradas=2)
+    a, b, c = otra.obtener([_clave("A"), _clave("B"), _clave("C")])
+    assert a is None
+    np.testing.assert_array_equal(b, _vector(2)[0])
+    np.testing.assert_array_equal(c, _vector(3)[0])
+
+def test_dos_procesos_comparten_el_directorio(tmp_path):
+    # Las dos se abren antes de que exista nada en disco
+    app = EmbeddingCache(str(tmp_path))
+    lote = EmbeddingCache(str(tmp_path))
+    app.guardar([_clave("A")], _vector(1))
+    lote.guardar([_clave("B")], _vector(2))
+
+    np.testing.assert_array_equal(app.obtener([_clave("A")])[0], _vector(1)[0])
+    # `lote` no pisa la fila de A: la adopta y usa otra
+    np.testing.assert_array_equal(lote.obtener([_clave("A")])[0], _vector(1)[0])
+    lote.flush()
+    app.flush()
+
+    nueva = EmbeddingCache(str(tmp_path))
+    a, b = nueva.obtener([_clave("A"), _clave("B")])
+    np.testing.assert_array_equal(a, _vector(1)[0])
+    np.testing.assert_array_equal(b, _vector(2)[0])
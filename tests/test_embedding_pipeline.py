@@ -0,0 +1,89 @@
+import time
+
+import numpy as np
+import pytest
+from botocore.exceptions import ClientError
+
+from embedding_pipeline import EmbeddingPipeline, TokenBucket, es_throttling
+from fake_bedrock import FakeBedrockClient
+from faiss_manager import FAISSManager
+
+def _pipeline(fake, **kwargs):
+    manager = FAISSManager(bedrock_client=fake, cache_dir=None, index_dir=None)
+    return EmbeddingPipeline(manager.generate_embeddings, **kwargs)
+
+def test_embed_conserva_el_orden():
+    # Latencias al azar: los lotes terminan desordenados
+    fake = FakeBedrockClient(dim=32, latencia=0.001, jitter=0.02)
+    pipeline = _pipeline(fake, batch_size=3, max_workers=6, rate=None)
+    textos = [f"texto número {i}" for i in range(40)]
+
+    vectores = pipeline.embed(textos)
+
+    esperados = np.stack([fake._vector(t) for t in textos])
+    np.testing.assert_allclose(vectores, esperados, rtol=1e-6)
+    assert pipeline.estadisticas()["lotes"] == 14
+
+def test_embed_escribe_en_el_array_reservado():
+    fake = FakeBedrockClient(dim=8, latencia=0.0)
+    pipeline = _pipeline(fake, batch_size=4, rate=None)
+    salida = np.zeros((10, 8), dtype=np.float32)
+
+    vectores = pipeline.embed([str(i) for i in range(10)], out=salida)
+
+    assert vectores is salida
+    assert np.all(np.linalg.norm(salida, axis=1) > 0.99)
+
+def test_reintenta_ante_throttling():
+    # Con más de una llamada a la vez el fake responde ThrottlingException
+    fake = FakeBedrockClient(dim=16, latencia=0.01, max_concurrencia=1)
+    pipeline = _pipeline(fake, batch_size=2, max_workers=4, rate=None, backoff_base=0.001)
+    textos = [f"t{i}" for i in range(16)]
+
+    vectores = pipeline.embed(textos)
+
+    assert fake.errores > 0
+    assert pipeline.reintentos == fake.errores
+    np.testing.assert_allclose(vectores, np.stack([fake._vector(t) for t in textos]), rtol=1e-6)
+
+def test_agota_los_reintentos():
+    fake = FakeBedrockClient(dim=16, latencia=0.0, tasa_errores=1.0)
+    pipeline = _pipeline(fake, batch_size=4, max_workers=1, rate=None, max_retries=2, backoff_base=0.001)
+
+    with pytest.raises(ClientError):
+        pipeline.embed(["a", "b"])
+    assert fake.llamadas == 3
+
+def test_no_reintenta_otros_errores():
+    llamadas = []
+
+    def falla(textos):
+        llamadas.append(textos)
+        raise ValueError("roto")
+
+    pipeline = EmbeddingPipeline(falla, rate=None, backoff_base=0.001)
+    with pytest.raises(ValueError):
+        pipeline.embed(["a"])
+    assert len(llamadas) == 1
+
+def test_es_throttling():
+    throttling = ClientError({"Error": {"Code": "ThrottlingException", "Message": ""}}, "InvokeModel")
+    acceso = ClientError({"Error": {"Code": "AccessDeniedException", "Message": ""}}, "InvokeModel")
+    assert es_throttling(throttling)
+    assert not es_throttling(acceso)
+    assert not es_throttling(ValueError())
+
+def test_token_bucket_limita_el_ritmo():
+    bucket = TokenBucket(rate=50, capacity=1)
+    inicio = time.monotonic()
+    for _ in range(11):
+        bucket.acquire()
+    # El primer token está disponible; los otros 10 llegan a 50/s
+    assert time.monotonic() - inicio >= 0.18
+
+def test_token_bucket_permite_rafagas():
+    bucket = TokenBucket(rate=1, capacity=5)
+    inicio = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    assert time.monotonic() - inicio < 0.1
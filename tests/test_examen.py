@@ -0,0 +1,83 @@
+from busqueda import ClaudeAPI
+from examen import GeneradorExamen
+
+def test_examen_completo(fake, manager, documentos):
+    claude_api = ClaudeAPI(bedrock_client=fake, faiss_manager=manager, cache_dir=None, rate=None)
+    generador = GeneradorExamen(claude_api, max_workers=4)
+
+    questions, answers = generador.generar_examen(documentos, "desarrollo", n_preguntas=10)
+
+    assert len(questions) == len(answers) == 10
+    assert len(set(questions)) == 10
+    assert generador.faltantes == 0 and generador.errores == 0
+
+def test_examen_avisa_si_faltan_preguntas(fake, manager, documentos):
+    claude_api = ClaudeAPI(bedrock_client=fake, faiss_manager=manager, cache_dir=None, rate=None)
+    generador = GeneradorExamen(claude_api, max_workers=4)
+    llamadas = []
+    original = generador._llamar
+    generador._llamar = lambda *args: llamadas.append(args) or original(*args)
+
+    # Más preguntas de las que dan los chunks del temario: se hacen varias rondas
+    questions, answers = generador.generar_examen(documentos, "desarrollo", n_preguntas=500, max_rondas=2)
+
+    assert len(llamadas) > len(manager.chunk_ids)
+    assert 0 < len(questions) < 500
+    assert generador.faltantes == 500 - len(questions)
+
+def test_limite_de_ritmo_compartido(fake, manager):
+    claude_api = ClaudeAPI(bedrock_client=fake, faiss_manager=manager, cache_dir=None, rate=5.0)
+    assert GeneradorExamen(claude_api).rate_limiter is claude_api.rate_limiter is not None
+
+def test_examen_usa_el_bloqueo_del_indice(fake, manager, documentos):
+    claude_api = ClaudeAPI(bedrock_client=fake, faiss_manager=manager, cache_dir=None, rate=None)
+    generador = GeneradorExamen(claude_api, max_workers=4)
+    bloqueado = []
+    for nombre in ("sync_documents", "search", "diverse_chunks"):
+        original = getattr(manager, nombre)
+        def espia(*args, _original=original, **kwargs):
+            lock = claude_api._lock_indice
+            bloqueado.append(lock._escribiendo or lock._lectores > 0)
+            return _original(*args, **kwargs)
+        setattr(manager, nombre, espia)
+
+    # La primera sincroniza (escritura); la segunda solo lee
+    generador.generar_examen(documentos, "desarrollo", n_preguntas=5)
+    generador.generar_examen(documentos, "desarrollo", n_preguntas=5, temas=["red", "memoria"])
+
+    assert len(bloqueado) >= 3 and all(bloqueado)
+
+def test_examen_por_temas_sin_embeddings_usa_bm25(documentos):
+    from faiss_manager import FAISSManager
+    from fake_bedrock import FakeBedrockClient
+
+    fake = FakeBedrockClient(dim=64, latencia=0.0)
+    manager = FAISSManager(bedrock_client=fake, cache_dir=None, index_dir=None, rate=None,
+                           max_tokens=120, espera_reintento=60.0)
+    manager.embedding_pipeline.max_retries = 0
+    claude_api = ClaudeAPI(bedrock_client=fake, faiss_manager=manager, cache_dir=None, rate=None)
+    generador = GeneradorExamen(claude_api, max_workers=4)
+    # Los embeddings fallan al indexar: los chunks quedan solo en BM25
+    fake.tasa_errores = 1.0
+    claude_api.con_indice(documentos, lambda: None)
+    fake.tasa_errores = 0.0
+    assert manager.index is None
+
+    contextos = generador._elegir_contextos(["sistema memoria"], n_llamadas=3)
+
+    assert len(contextos) == 3
+    assert all(tema == "el tema: sistema memoria" for _, tema in contextos)
+
+def test_examen_sin_deduplicar_si_fallan_los_embeddings(fake, manager, documentos):
+    claude_api = ClaudeAPI(bedrock_client=fake, faiss_manager=manager, cache_dir=None, rate=None)
+    generador = GeneradorExamen(claude_api, max_workers=4)
+    claude_api.con_indice(documentos, lambda: None)
+
+    def caido(*args, **kwargs):
+        raise ConnectionError("sin red")
+    manager.generate_embeddings = caido
+
+    questions, answers = generador.generar_examen(documentos, "desarrollo", n_preguntas=10)
+
+    assert len(questions) == len(answers) == 10
+    assert generador.errores == 0
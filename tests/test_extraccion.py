@@ -0,0 +1,81 @@
+import inspect
+import os
+import tempfile
+
+from datos_sinteticos import crear_pdf, paginas_sinteticas
+from extraccion import ExtractionCache, extraer_documentos, iter_paginas_pdf, limpiar_paginas
+
+def _pagina(n, cuerpo):
+    return "\n".join(["Apuntes de Biología - Tema 3"] + cuerpo + [f"Página {n} de 4"])
+
+def _cuerpo(n):
+    return paginas_sinteticas(1, frases_por_pagina=6, seed=n)[0].replace(". ", ".\n").split("\n")
+
+def test_quita_cabeceras_y_numeros_de_pagina():
+    paginas = [_pagina(n, _cuerpo(n)) for n in range(1, 5)]
+    limpias = limpiar_paginas(paginas)
+    for n, limpia in enumerate(limpias, start=1):
+        assert limpia.split("\n") == _cuerpo(n)
+
+def test_no_toca_documentos_cortos():
+    paginas = [_pagina(1, _cuerpo(1)), _pagina(2, _cuerpo(2))]
+    limpias = limpiar_paginas(paginas)
+    assert all("Apuntes de Biología" in limpia for limpia in limpias)
+
+def test_conserva_numeros_que_no_son_de_pagina():
+    # "2024" y "1." en el borde de una página: no avanzan con la página
+    cuerpos = [_cuerpo(n) for n in range(1, 5)]
+    cuerpos[1] = ["2024"] + cuerpos[1]
+    cuerpos[2] = cuerpos[2] + ["1."]
+    paginas = ["\n".join(cuerpo + [str(n)]) for n, cuerpo in enumerate(cuerpos, start=1)]
+    limpias = limpiar_paginas(paginas)
+    assert [limpia.split("\n") for limpia in limpias] == cuerpos
+
+def test_no_quita_titulos_repetidos_de_diapositivas():
+    diapositivas = ["Introducción\nLa célula", "Introducción\nEl núcleo",
+                    "Introducción\nLa membrana", "Mitocondria\nProduce ATP"]
+    assert limpiar_paginas(diapositivas) == diapositivas
+
+def test_extraer_documentos_reparte_pdf_por_rangos(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    paginas = paginas_sinteticas(5, frases_por_pagina=4, seed=7)
+    archivos = [("a.pdf", crear_pdf(paginas)), ("b.xyz", b"??"), ("c.pdf", crear_pdf(paginas[:1]))]
+    extraidos = extraer_documentos(archivos, max_workers=2, paginas_por_tarea=2)
+    assert inspect.isgenerator(extraidos)
+    resultados = list(extraidos)
+    assert [r[0] for r in resultados] == ["a.pdf", "b.xyz", "c.pdf"]
+    (_, unidades, error, _), (_, sin_unidades, fallo, _), (_, una, _, _) = resultados
+    assert error is None and len(unidades) == 5
+    assert [" ".join(u.split()) for u in unidades] == [" ".join(p.split()) for p in paginas]
+    assert sin_unidades is None and isinstance(fallo, ValueError)
+    assert len(una) == 1
+    # La copia temporal del PDF repartido se borra al terminar
+    assert list(tmp_path.iterdir()) == []
+
+def test_iter_paginas_pdf_desde_ruta(tmp_path):
+    paginas = paginas_sinteticas(3, frases_por_pagina=2, seed=1)
+    ruta = tmp_path / "apuntes.pdf"
+    ruta.write_bytes(crear_pdf(paginas))
+    assert len(list(iter_paginas_pdf(str(ruta), 1, 10))) == 2
+
+def test_cache_extraccion_crea_directorio_al_guardar(tmp_path):
+    directorio = tmp_path / "extraccion"
+    cache = ExtractionCache(str(directorio))
+    assert not directorio.exists()
+    assert cache.obtener("h") is None
+    cache.guardar("h", ["uno", "dos"], 0.5)
+    assert ExtractionCache(str(directorio)).obtener("h") == ["uno", "dos"]
+
+def test_cache_extraccion_limita_el_disco(tmp_path):
+    cache = ExtractionCache(str(tmp_path))
+    cache.guardar("a", ["x" * 100], 1.0)
+    cache.guardar("b", ["y" * 100], 1.0)
+    tamano = (tmp_path / "a.json").stat().st_size
+    os.utime(tmp_path / "a.json", (1000, 1000))
+    os.utime(tmp_path / "b.json", (2000, 2000))
+
+    cache = ExtractionCache(str(tmp_path), max_bytes_disco=2 * tamano + 10)
+    assert cache.obtener("a") == ["x" * 100]  # "a" pasa a ser el más reciente
+    cache.guardar("c", ["z" * 100], 1.0)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.json", "c.json"]
+    assert cache.estadisticas()["descartes_disco"] == 1
@@ -0,0 +1,211 @@
+import numpy as np
+import pytest
+
+from bm25 import BM25Index
+from datos_sinteticos import paginas_sinteticas
+from faiss_manager import FAISSManager
+from fake_bedrock import FakeBedrockClient
+from index_store import IndexStore
+
+def _huella(doc):
+    return IndexStore.huella_documento(doc["texto"])
+
+def test_add_search_y_remove(manager, documentos):
+    manager.add_documents(documentos)
+    n_chunks = len(manager.chunks)
+    assert manager.index.ntotal == n_chunks
+
+    resultados = manager.search("sistema memoria datos", k=3)
+    assert len(resultados) == 3
+    assert resultados[0]["metadata"]["documento"] in {d["nombre"] for d in documentos}
+    assert resultados[0]["text"] == manager.chunks[manager._pos_por_id[resultados[0]["id"]]]
+
+    inicio, fin = manager.doc_ranges[_huella(documentos[0])]
+    assert manager.remove_document(_huella(documentos[0]))
+    assert not manager.remove_document(_huella(documentos[0]))
+    assert manager.index.ntotal == len(manager.chunks) == n_chunks - (fin - inicio)
+    assert all(not inicio <= r["id"] < fin for r in manager.search("sistema memoria datos", k=10))
+
+def test_add_documents_ignora_los_ya_indexados(manager, documentos, fake):
+    manager.add_documents(documentos[:2])
+    llamadas = fake.llamadas
+    manager.add_documents(documentos[:2])
+    assert fake.llamadas == llamadas
+
+@pytest.mark.parametrize("index_type", ["hnsw", "ivf_flat"])
+def test_remove_en_otros_indices(fake, documentos, index_type):
+    manager = FAISSManager(bedrock_client=fake, cache_dir=None, index_dir=None, rate=None,
+                           max_tokens=60, index_type=index_type, nlist=4)
+    manager.add_documents(documentos)
+    manager.remove_document(_huella(documentos[1]))
+    assert manager.index.ntotal == len(manager.chunks)
+    assert manager.search("proceso", k=2)
+
+def test_search_hybrid_y_diverse_chunks(manager, documentos):
+    manager.add_documents(documentos)
+    hibrida = manager.search_hybrid("articulo ley derecho", k=4, mmr=True)
+    assert len(hibrida) == 4 and len({r["id"] for r in hibrida}) == 4
+    diversos = manager.diverse_chunks(5, seed=0)
+    assert len({c["id"] for c in diversos}) == 5
+
+def test_dedup_de_documentos_casi_iguales(manager, documentos, fake):
+    original = documentos[0]
+    # Otra versión: mismo texto con una frase cambiada al final
+    copia = dict(original, nombre="copia.pptx", texto=original["texto"] + " Frase nueva añadida al final.")
+    manager.add_documents([original])
+    n_chunks = len(manager.chunks)
+
+    manager.add_documents([copia])
+
+    stats = manager.dedup_stats
+    assert stats["duplicados"] >= n_chunks - 1
+    assert stats["llamadas_ahorradas"] >= 1 and stats["bytes_ahorrados"] > 0
+    assert len(manager.chunks) <= n_chunks + 1
+    primero = manager.doc_ranges[_huella(original)][0]
+    copias = manager.chunk_metadata(primero)["duplicados"]
+    assert copias[0]["documento"] == "copia.pptx"
+    # La copia sigue teniendo todos sus chunks, con su propia procedencia
+    de_la_copia = manager.document_chunks(_huella(copia))
+    assert {c["metadata"]["documento"] for c in de_la_copia} == {"copia.pptx"}
+
+    # Al quitar el original, los duplicados pasan a ser chunks normales sin volver a embeber
+    llamadas = fake.llamadas
+    manager.remove_document(_huella(original))
+    assert fake.llamadas == llamadas
+    assert not manager.duplicados
+    assert manager.index.ntotal == len(manager.chunks) == len(manager.document_chunks(_huella(copia)))
+    assert manager.search("sistema", k=1)[0]["metadata"]["documento"] == "copia.pptx"
+
+def test_sin_dedup(fake, documentos):
+    manager = FAISSManager(bedrock_client=fake, cache_dir=None, index_dir=None, rate=None,
+                           max_tokens=120, dedup_umbral=None)
+    manager.add_documents([documentos[0], dict(documentos[0], texto=documentos[0]["texto"] + " Otra.")])
+    assert not manager.duplicados
+
+def _documento(seed, paginas=10):
+    return {"nombre": f"largo{seed}.pdf", "texto": "\n".join(paginas_sinteticas(paginas, 12, seed=seed))}
+
+def test_ivf_se_reentrena_al_crecer(fake, documentos):
+    import faiss
+    from index_factory import base_index
+
+    manager = FAISSManager(bedrock_client=fake, cache_dir=None, index_dir=None, rate=None,
+                           max_tokens=40, index_type="ivf_flat", nlist=8)
+    manager.add_documents(documentos[:1])
+    # Pocos vectores para entrenar IVF: empieza en "flat"
+    assert isinstance(base_index(manager.index), faiss.IndexFlat)
+    antes = manager._n_entrenamiento
+
+    manager.add_documents([_documento(s) for s in range(10, 14)])
+
+    assert isinstance(base_index(manager.index), faiss.IndexIVF)
+    assert manager._n_entrenamiento == manager.index.ntotal > antes
+    assert manager.index.ntotal == len(manager.chunks)
+    mejor = manager.search(manager.chunks[5], k=1)[0]
+    assert mejor["id"] == manager.chunk_ids[5]
+
+@pytest.mark.parametrize("parametros", [
+    {"index_type": "ivf_flat"},
+    {"index_type": "ivf_flat", "storage": "sq8"},
+    {"index_type": "ivf_pq", "pq_m": 8},
+    {"pca_dim": 16},
+    {"index_type": "ivf_flat", "pca_dim": 16},
+    {"storage": "sq8"},
+    {"index_type": "hnsw", "storage": "sq8"},
+])
+def test_indice_cargado_de_disco_se_puede_editar(tmp_path, fake, parametros):
+    from index_factory import base_index
+
+    configuracion = dict(bedrock_client=fake, cache_dir=None, index_dir=str(tmp_path), rate=None,
+                         max_tokens=40, nlist=4, **parametros)
+    docs = [_documento(s) for s in range(3)]
+    FAISSManager(**configuracion).sync_documents(docs)
+
+    # Otro proceso lo lee de disco (mmap) y cambia los documentos
+    manager = FAISSManager(**configuracion)
+    manager.sync_documents(docs)
+    tipo = type(base_index(manager.index))
+    manager.sync_documents(docs[1:] + [_documento(9)])
+
+    assert type(base_index(manager.index)) is tipo
+    assert manager.index.ntotal == len(manager.chunk_ids) == len(manager.chunks)
+    resultados = manager.search(manager.chunks[-1], k=10)
+    assert resultados[0]["id"] == manager.chunk_ids[-1]
+    assert all(r["metadata"]["documento"] != docs[0]["nombre"] for r in resultados)
+
+def test_sin_embeddings_busca_con_bm25(documentos):
+    caido = FakeBedrockClient(dim=64, latencia=0.0, tasa_errores=1.0)
+    manager = FAISSManager(bedrock_client=caido, cache_dir=None, index_dir=None, rate=None,
+                           max_tokens=120, espera_reintento=0.0)
+    manager.embedding_pipeline.max_retries = 0
+
+    manager.sync_documents(documentos)
+    assert manager.index is None and manager.huella is None
+    assert len(manager.chunk_ids) > 0
+    resultados = manager.search_hybrid("sistema memoria", k=3, mmr=True)
+    assert len(resultados) == 3
+    assert resultados[0]["metadata"]["documento"] in {d["nombre"] for d in documentos}
+    assert len(manager.diverse_chunks(4)) == 4
+    assert manager.document_chunks(_huella(documentos[1]))
+
+    assert manager.remove_document(_huella(documentos[0]))
+    assert all(r["metadata"]["documento"] != documentos[0]["nombre"]
+               for r in manager.search_hybrid("sistema memoria", k=10))
+
+    # Bedrock vuelve: la siguiente sincronización embebe lo pendiente
+    caido.tasa_errores = 0.0
+    manager.sync_documents(documentos[1:])
+    assert manager.huella is not None
+    assert manager.index.ntotal == len(manager.chunk_ids)
+    assert manager.search("sistema memoria", k=3)
+
+def test_bm25_se_guarda_con_el_indice(tmp_path, fake, documentos, monkeypatch):
+    manager = FAISSManager(bedrock_client=fake, cache_dir=None, index_dir=str(tmp_path),
+                           rate=None, max_tokens=120)
+    manager.sync_documents(documentos)
+    esperado = manager.search_lexical("sistema memoria", k=5)
+
+    otro = FAISSManager(bedrock_client=fake, cache_dir=None, index_dir=str(tmp_path),
+                        rate=None, max_tokens=120)
+    otro.sync_documents(documentos)
+    # Se lee de disco sin volver a tokenizar los chunks
+    monkeypatch.setattr(BM25Index, "add", lambda *args: pytest.fail("BM25 reconstruido"))
+    assert otro.search_lexical("sistema memoria", k=5) == esperado
+
+@pytest.mark.parametrize("parametros", [{"storage": "sq8"}, {"pca_dim": 16}])
+def test_sq8_y_pca_se_reentrenan_al_crecer(fake, documentos, parametros):
+    import faiss
+
+    manager = FAISSManager(bedrock_client=fake, cache_dir=None, index_dir=None, rate=None,
+                           max_tokens=40, **parametros)
+    manager.add_documents(documentos[:1])
+    antes = manager._n_entrenamiento
+
+    manager.add_documents([_documento(s) for s in range(10, 14)])
+
+    assert manager._n_entrenamiento == manager.index.ntotal > antes
+    if "pca_dim" in parametros:
+        assert isinstance(manager.index, faiss.IndexPreTransform)
+    mejor = manager.search(manager.chunks[5], k=1)[0]
+    assert mejor["id"] == manager.chunk_ids[5]
+
+@pytest.mark.parametrize("parametros", [{"storage": "sq8"}, {"pca_dim": 16}])
+def test_hnsw_se_reconstruye_con_los_vectores_originales(fake, parametros):
+    import faiss
+
+    manager = FAISSManager(bedrock_client=fake, cache_dir=None, index_dir=None, rate=None,
+                           max_tokens=60, index_type="hnsw", **parametros)
+    documentos = [_documento(s, paginas=4) for s in range(8)]
+    manager.add_documents(documentos)
+    for doc in documentos[:7]:
+        manager.remove_document(_huella(doc))
+
+    originales = np.vstack([fake._vector(t) for t in manager.chunks])
+    faiss.normalize_L2(originales)
+    reconstruidos = np.vstack([manager.index.reconstruct(int(i)) for i in manager.chunk_ids])
+    # Tras varios borrados la pérdida es la de una sola cuantización/proyección,
+    # no la acumulada de reconstruir y volver a comprimir en cada uno
+    if "storage" in parametros:
+        assert np.abs(reconstruidos - originales).max() < 0.005
+    else:
+        assert (reconstruidos * originales).sum(axis=1).mean() > 0.8
@@ -0,0 +1,75 @@
+import faiss
+import numpy as np
+
+from faiss_manager import FAISSManager
+from index_store import IndexStore
+
+def _indice(ids):
+    index = faiss.IndexIDMap2(faiss.IndexFlatIP(4))
+    vectores = np.eye(4, dtype=np.float32)[:len(ids)]
+    index.add_with_ids(vectores, np.asarray(ids, dtype=np.int64))
+    return index
+
+def test_guardar_y_cargar(tmp_path):
+    store = IndexStore(str(tmp_path))
+    huella = IndexStore.huella(["doc a", "doc b"])
+    chunks = ["primero", "segundo con tilde: canción", ""]
+    paginas = np.array([0, 1, 1], dtype=np.int32)
+
+    store.guardar(huella, _indice([10, 11, 12]), chunks, [10, 11, 12],
+                  meta={"dim": 4}, arrays={"paginas": paginas})
+
+    assert store.existe(huella)
+    index, cargados, ids, meta, arrays = store.cargar(huella, mmap=False)
+    assert index.ntotal == 3
+    assert list(cargados) == chunks
+    assert cargados[-1] == "" and len(cargados) == 3
+    assert ids.tolist() == [10, 11, 12]
+    assert meta == {"dim": 4, "num_chunks": 3}
+    np.testing.assert_array_equal(arrays["paginas"], paginas)
+
+def test_guardar_no_sobrescribe(tmp_path):
+    store = IndexStore(str(tmp_path))
+    store.guardar("h", _indice([1]), ["uno"], [1])
+    store.guardar("h", _indice([1, 2]), ["uno", "dos"], [1, 2])
+    _, chunks, _, _, _ = store.cargar("h")
+    assert list(chunks) == ["uno"]
+
+def test_huella_no_depende_del_orden():
+    assert IndexStore.huella(["a", "b"]) == IndexStore.huella(["b", "a"])
+    assert IndexStore.huella(["a", "b"]) != IndexStore.huella(["a", "b"], extra="hnsw")
+    assert IndexStore.huella(["a"]) != IndexStore.huella(["a", "b"])
+
+def test_faiss_manager_carga_de_disco_sin_llamar_a_bedrock(tmp_path, fake, documentos):
+    manager = FAISSManager(bedrock_client=fake, cache_dir=None, index_dir=str(tmp_path),
+                           rate=None, max_tokens=120)
+    manager.sync_documents(documentos)
+    esperado = manager.search_lexical("sistema memoria", k=3)
+    llamadas = fake.llamadas
+
+    otro = FAISSManager(bedrock_client=fake, cache_dir=None, index_dir=str(tmp_path),
+                        rate=None, max_tokens=120)
+    otro.sync_documents(documentos)
+
+    assert otro.huella == manager.huella
+    assert otro.search_lexical("sistema memoria", k=3) == esperado
+    assert fake.llamadas == llamadas
+    assert otro.chunk_metadata(esperado[0]["id"]) == manager.chunk_metadata(esperado[0]["id"])
+
+def test_faiss_manager_no_reutiliza_indices_de_otra_configuracion(tmp_path, fake, documentos, monkeypatch):
+    manager = FAISSManager(bedrock_client=fake, cache_dir=None, index_dir=str(tmp_path),
+                           rate=None, max_tokens=120)
+    manager.sync_documents(documentos)
+    assert manager.index_store.cargar(manager.huella, mmap=False)[3]["formato"] == FAISSManager.FORMATO_INDICE
+
+    otro_troceado = FAISSManager(bedrock_client=fake, cache_dir=None, index_dir=str(tmp_path),
+                                 rate=None, max_tokens=120, overlap_tokens=20)
+    otro_troceado.sync_documents(documentos)
+    assert otro_troceado.huella != manager.huella
+
+    # Un índice guardado con un formato anterior no se carga
+    monkeypatch.setattr(FAISSManager, "FORMATO_INDICE", FAISSManager.FORMATO_INDICE - 1)
+    antiguo = FAISSManager(bedrock_client=fake, cache_dir=None, index_dir=str(tmp_path),
+                           rate=None, max_tokens=120)
+    antiguo.sync_documents(documentos)
+    assert antiguo.huella not in (manager.huella, otro_troceado.huella)
@@ -0,0 +1,33 @@
+import random
+
+from manager import ExamManager, SentenceIndex
+
+TEXTO = (
+    "La célula es la unidad básica de todos los seres vivos conocidos. "
+    "Corta. "
+    "En 1665 Robert Hooke observó células en una lámina de corcho con su microscopio. "
+    "Las mitocondrias producen la mayor parte de la energía química de la célula."
+)
+
+def test_sentence_index_segmenta_sin_copiar():
+    indice = SentenceIndex(TEXTO)
+    assert len(indice) == 3
+    assert indice.frase(0) == "La célula es la unidad básica de todos los seres vivos conocidos"
+    # Cifras y nombres propios puntúan más
+    assert indice.puntuaciones[1] > indice.puntuaciones[0]
+
+def test_muestrear_da_frases_distintas():
+    indice = SentenceIndex(TEXTO)
+    rng = random.Random(0)
+    muestra = indice.muestrear(2, rng)
+    assert len(muestra) == 2 and len(set(muestra)) == 2
+    assert sorted(indice.muestrear(10, rng)) == [0, 1, 2]
+
+def test_generar_lote_reutiliza_el_indice():
+    manager = ExamManager()
+    questions, answers = manager.generar_lote(TEXTO, "desarrollo", 2)
+    indice = manager._indice
+    assert len(questions) == len(answers) == 2
+    manager.generar_lote(TEXTO, "preguntas cortas", 2)
+    assert manager._indice is indice
+    assert manager.generar_lote(TEXTO, "otro tipo", 2) == ([], [])
@@ -0,0 +1,55 @@
+import urllib.request
+
+import metricas
+from metricas import Metricas
+
+def test_instrumentar_conserva_la_funcion():
+    m = Metricas()
+
+    @m.instrumentar("sumar")
+    def sumar(a, b):
+        """Suma dos números."""
+        return a + b
+
+    assert sumar(2, 3) == 5
+    assert sumar.__name__ == "sumar" and sumar.__doc__ == "Suma dos números."
+    assert sumar.__wrapped__(1, 1) == 2
+    assert m.ultimos_spans()[-1]["nombre"] == "sumar"
+
+def test_prometheus_declara_el_tipo_de_cada_metrica():
+    m = Metricas()
+    m.contador("llamadas_total", 2, modelo="a")
+    m.contador("llamadas_total", 1, modelo="b")
+    m.observar("claude_segundos", 0.3)
+    m.registrar_recolector(lambda: {'cache_aciertos_total{cache="x"}': 3, 'cache_tasa_aciertos{cache="x"}': 0.5})
+
+    lineas = m.prometheus().splitlines()
+    assert lineas.count("# TYPE llamadas_total counter") == 1
+    assert lineas.index("# TYPE llamadas_total counter") < lineas.index('llamadas_total{modelo="a"} 2')
+    assert "# TYPE claude_segundos histogram" in lineas
+    assert "# TYPE cache_aciertos_total counter" in lineas
+    assert "# TYPE cache_tasa_aciertos gauge" in lineas
+
+def test_recolector_roto_se_cuenta_sin_romper_la_exportacion():
+    m = Metricas()
+    m.registrar_recolector(lambda: 1 / 0)
+    m.registrar_recolector(lambda: {"cola_pendientes": 4})
+
+    assert m.resumen()["valores"] == {"cola_pendientes": 4}
+    assert "metricas_recolector_errores_total 1" in m.prometheus().splitlines()
+
+def test_servir_desde_entorno_una_vez_por_proceso(monkeypatch):
+    monkeypatch.setattr(metricas, "_servidor", None)
+    monkeypatch.setattr(metricas, "_servidor_iniciado", False)
+    monkeypatch.delenv("METRICAS_PUERTO", raising=False)
+    assert metricas.servir_desde_entorno() is None
+
+    monkeypatch.setenv("METRICAS_PUERTO", "0")
+    servidor = metricas.servir_desde_entorno()
+    try:
+        assert metricas.servir_desde_entorno() is servidor
+        puerto = servidor.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{puerto}/metrics") as respuesta:
+            assert respuesta.status == 200
+    finally:
+        servidor.shutdown()
@@ -0,0 +1,29 @@
+import json
+
+from datos_sinteticos import crear_pdf, paginas_sinteticas
+from documentos import DocumentUploader
+from procesar_directorio import buscar_archivos, clave, extraer, leer_checkpoint
+
+def test_extraer_anota_los_archivos_repetidos(tmp_path):
+    apuntes = crear_pdf(paginas_sinteticas(2, frases_por_pagina=3, seed=1))
+    (tmp_path / "a.pdf").write_bytes(apuntes)
+    (tmp_path / "copia.pdf").write_bytes(apuntes)
+    (tmp_path / "otro.pdf").write_bytes(crear_pdf(paginas_sinteticas(2, frases_por_pagina=3, seed=2)))
+    rutas = buscar_archivos(str(tmp_path))
+
+    uploader = DocumentUploader(cache=None)
+    errores, duplicados = extraer(rutas, uploader, max_workers=1)
+
+    assert errores == 0
+    assert len(uploader.documents) == 2
+    assert duplicados == {str(tmp_path / "copia.pdf"): str(tmp_path / "a.pdf")}
+
+def test_checkpoint_cuenta_los_duplicados_como_hechos(tmp_path):
+    salida = tmp_path / "preguntas.jsonl"
+    registros = [
+        {"clave": clave("copia.pdf", "desarrollo"), "unidad": "copia.pdf", "tipo": "desarrollo",
+         "duplicado_de": "a.pdf", "questions": [], "answers": []},
+        {"clave": clave("b.pdf", "desarrollo"), "unidad": "b.pdf", "tipo": "desarrollo", "error": "throttling"},
+    ]
+    salida.write_text("".join(json.dumps(r) + "\n" for r in registros), encoding="utf-8")
+    assert leer_checkpoint(str(salida)) == {clave("copia.pdf", "desarrollo")}